@@ -27,10 +27,12 @@ from .field import (  # noqa
     IntArray,
     Json,
     JsonArray,
+    LazyDecode,
     Numeric,
     Point,
     PrimaryKey,
     Serial,
+    ServerGenerated,
     String,
     StringArray,
     Time,
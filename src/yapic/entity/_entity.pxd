@@ -1,4 +1,5 @@
 import cython
+from libc.stdint cimport uint64_t, int64_t
 from cpython.object cimport PyObject
 
 from ._expression cimport AliasExpression, Expression
@@ -11,6 +12,13 @@ cdef class NOTSET:
     pass
 
 
+@cython.final
+cdef class LazyValue:
+    cdef readonly object raw
+    # StorageType, what decodes the raw value
+    cdef object type
+
+
 # TODO: _stage_resolving call resolve only when not resolved
 # ezt használni ahelyett, hogy van-e deferred field
 
@@ -25,23 +33,36 @@ ctypedef enum EntityStage:
 
 
 cdef class EntityType(type):
-    cdef readonly tuple __attrs__
-    cdef readonly tuple __fields__
-    cdef readonly tuple __props__
-    cdef readonly tuple __pk__
+    # readonly properties, what build the lazy entity
+    cdef tuple __attrs__
+    cdef tuple __fields__
+    cdef tuple __props__
+    cdef tuple __pk__
     # cdef readonly list __deferred__
     cdef public list __fix_entries__
     cdef public list __triggers__
-    cdef readonly dict __extgroups__
+    cdef dict __extgroups__
     cdef readonly EntityDependency __deps__
     cdef readonly Polymorph __polymorph__
 
     cdef ResolveContext resolve_ctx
     cdef EntityStage stage
+    # (base_entity, class dict) of lazy entity, until it is not built
+    cdef tuple lazy_args
+    # field index -> COMPACT_* kind / slot in EntityState.compact_values, when the entity has compact=True meta
+    cdef bytes compact_layout
+    cdef bytes compact_slots
+    cdef int compact_count
+    # attribute index -> indexes of the cached virtual attributes, what depends on it
+    cdef dict virtual_deps
     cdef PyObject* registry_ref
     cdef PyObject* meta
 
     cdef EntityType get_base_entity(self)
+    cdef object _init_attrs(self, EntityType base_entity, PolymorphDict polymorph, object attrs, list fields)
+    cdef object _set_lazy_attrs(self, object attrs)
+    cdef object _build(self)
+    cdef bint is_lazy(self)
     cdef Registry get_registry(self)
     cdef list _compute_attrs(self, EntityType base_entity, PolymorphDict polymorph_dict, object cls_dict)
     cdef list _compute_triggers(self)
@@ -166,6 +187,15 @@ cdef class EntityState:
     cdef tuple current
     cdef int field_count
     cdef readonly bint exists
+    # attributes changed since the last reset / attributes that can change in place
+    cdef uint64_t* dirty_bits
+    cdef uint64_t* volatile_bits
+    cdef int bit_words
+    # initial values of compact fields, see EntityType.compact_layout
+    cdef uint64_t* compact_bits
+    cdef int64_t* compact_values
+    # virtual attribute index -> computed value, see virtual(cache=True)
+    cdef dict virtual_cache
 
     # @staticmethod
     # cdef EntityState create_from_dict(EntityType entity, dict data)
@@ -176,8 +206,12 @@ cdef class EntityState:
     cdef object set_value(self, EntityAttribute attr, object value)
     cdef object set_initial_value(self, EntityAttribute attr, object value)
     cdef object get_initial_value(self, EntityAttribute attr)
+    cdef object set_lazy_initial_value(self, EntityAttribute attr, LazyValue value)
     cdef object get_value(self, EntityAttribute attr)
     cdef object del_value(self, EntityAttribute attr)
+    cdef object get_virtual_cache(self, EntityAttribute attr)
+    cdef object set_virtual_cache(self, EntityAttribute attr, object value)
+    cdef object _invalidate_virtual(self, int idx)
 
     cdef list data_for_insert(self)
     cdef list data_for_update(self)
@@ -188,6 +222,12 @@ cdef class EntityState:
     cdef reset_attr(self, EntityAttribute attr)
     cdef bint is_eq_reflected(self, EntityState other)
     cdef bint _is_empty(self)
+    cdef void _mark_dirty(self, int idx)
+    cdef void _reset_bits(self, int idx, bint is_volatile)
+    cdef list _check_indexes(self, int start)
+    cdef object _initial_value(self, int idx)
+    cdef object _set_initial(self, int idx, object value)
+    cdef object _decode_lazy(self, int idx, LazyValue lazy)
 
 
 @cython.final
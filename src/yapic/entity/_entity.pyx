@@ -7,6 +7,7 @@ from weakref import ReferenceType
 from collections.abc import ItemsView
 from operator import attrgetter
 
+from cpython.mem cimport PyMem_Calloc, PyMem_Free
 from cpython.object cimport PyObject
 from cpython.ref cimport Py_DECREF, Py_INCREF, Py_XDECREF, Py_XINCREF
 from cpython.tuple cimport PyTuple_SetItem, PyTuple_GetItem, PyTuple_New, PyTuple_GET_SIZE, PyTuple_SET_ITEM, PyTuple_GET_ITEM, PyTuple_Pack
@@ -15,7 +16,7 @@ from cpython.module cimport PyImport_Import, PyModule_GetDict
 from cpython.weakref cimport PyWeakref_NewRef, PyWeakref_GetObject
 
 from ._field cimport Field, PrimaryKey, ForeignKey
-from ._field_impl cimport AutoImpl
+from ._field_impl cimport AutoImpl, IntImpl, FloatImpl
 from ._relation cimport Relation, ManyToOne, RelatedItem, RelatedAttribute, RelationImpl
 from ._factory cimport Factory, get_type_hints, new_instance_from_forward, is_forward_decl
 from ._expression cimport Visitor, Expression
@@ -23,14 +24,48 @@ from ._expression import or_
 from ._registry cimport Registry
 from ._entity_serializer import EntitySerializer, SerializerCtx
 from ._virtual_attr cimport VirtualAttribute
-from ._trigger cimport PolymorphParentDeleteTrigger
+from ._trigger cimport PolymorphParentDeleteTrigger, ChangeNotifyTrigger
 
 
 cdef class NOTSET:
     pass
 
+
+@cython.final
+cdef class LazyValue:
+    """ Undecoded initial value, decoded at the first access, see ``EntityState._decode_lazy`` """
+
+    def __cinit__(self, object raw, object type):
+        self.raw = raw
+        self.type = type
+
+    def __repr__(self):
+        return "<LazyValue %r>" % (self.raw,)
+
 REGISTRY = Registry()
 
+# joined: LEFT JOIN every child table (default)
+# select-in: load the base rows, then one query per concrete subtype what present in the result
+# lazy-subtype: load the base rows only, see ``Connection.load_polymorph``
+POLYMORPH_LOADING = ("joined", "select-in", "lazy-subtype")
+
+
+@cython.final
+cdef class LazyAttribute:
+    """ Placeholder of the attributes of a lazy entity, the first access builds the entity """
+
+    cdef object entity_ref
+    cdef str name
+
+    def __cinit__(self, object entity_ref, str name):
+        self.entity_ref = entity_ref
+        self.name = name
+
+    def __get__(self, instance, owner):
+        cdef EntityType entity = <object>PyWeakref_GetObject(self.entity_ref)
+        entity._build()
+        return getattr(owner if instance is None else instance, self.name)
+
 
 cdef class EntityType(type):
     @staticmethod
@@ -69,6 +104,37 @@ cdef class EntityType(type):
                 polymorph = PolymorphDict(poly_dict)
                 self.set_meta("polymorph", polymorph)
 
+        poly_loading = self.get_meta("polymorph_loading", None)
+        if poly_loading is not None and poly_loading not in POLYMORPH_LOADING:
+            raise ValueError(f"Invalid polymorph loading strategy: {poly_loading!r}")
+
+        cdef list fields = kwargs.get("__fields__", [])
+        if fields:
+            for field in fields:
+                if not isinstance(field, Field):
+                    raise ValueError(f"__fields__ contains invalid value: {field}")
+
+        if _root is False:
+            if is_entity_alias(self) is False:
+                self.resolve_ctx = ResolveContext(self, sys._getframe(0))
+
+                # polymorph entities must be known by the base entity, so they can't be lazy
+                if not fields and polymorph is None and self.get_meta("lazy", False) is True:
+                    self.lazy_args = (base_entity, attrs)
+                    self._set_lazy_attrs(attrs)
+                else:
+                    self._init_attrs(base_entity, polymorph, attrs, fields)
+
+                self.get_registry().register(self)
+            else:
+                self._init_attrs(base_entity, polymorph, attrs, fields)
+                if self._stage_resolving() is False:
+                    raise RuntimeError(f"Can't resolve entity alias: {self} ({self.__deferred__})")
+                self._stage_resolved()
+        else:
+            self._init_attrs(base_entity, polymorph, attrs, fields)
+
+    cdef object _init_attrs(self, EntityType base_entity, PolymorphDict polymorph, object attrs, list fields):
         # determine attributes
         cdef EntityAttribute attr
         cdef list __attrs__ = None
@@ -77,11 +143,7 @@ cdef class EntityType(type):
         cdef list __pk__ = []
         cdef object self_ref
 
-        cdef list fields = kwargs.get("__fields__", [])
         if fields:
-            for field in fields:
-                if not isinstance(field, Field):
-                    raise ValueError(f"__fields__ contains invalid value: {field}")
             __attrs__ = fields
         else:
             __attrs__ = self._compute_attrs(base_entity, polymorph, attrs)
@@ -121,14 +183,44 @@ cdef class EntityType(type):
             self.__fields__ = tuple()
             self.__attrs__ = tuple()
 
-        if _root is False:
-            if is_entity_alias(self) is False:
-                self.resolve_ctx = ResolveContext(self, sys._getframe(0))
-                self.get_registry().register(self)
-            else:
-                if self._stage_resolving() is False:
-                    raise RuntimeError(f"Can't resolve entity alias: {self} ({self.__deferred__})")
-                self._stage_resolved()
+    cdef object _set_lazy_attrs(self, object attrs):
+        cdef object self_ref = <object>PyWeakref_NewRef(self, None)
+
+        for base in reversed(self.__mro__):
+            annotations = base.__dict__.get("__annotations__")
+            if not annotations:
+                continue
+
+            for name in annotations:
+                if not (name.startswith("__") and name.endswith("__")):
+                    setattr(self, name, LazyAttribute(self_ref, name))
+
+        # not annotated attributes, eg.: virtual
+        for name, value in (<dict>attrs).items():
+            if isinstance(value, EntityAttribute):
+                setattr(self, name, LazyAttribute(self_ref, name))
+
+    cdef object _build(self):
+        if self.lazy_args is None:
+            return
+
+        cdef EntityType base_entity = self.lazy_args[0]
+        cdef dict attrs = self.lazy_args[1]
+        self.lazy_args = None
+
+        # restore original class attributes, before compute the real ones
+        for name, value in list(self.__dict__.items()):
+            if isinstance(value, LazyAttribute):
+                if name in attrs:
+                    setattr(self, name, attrs[name])
+                else:
+                    delattr(self, name)
+
+        self._init_attrs(base_entity, None, attrs, None)
+        self.get_registry().resolve(self)
+
+    cdef bint is_lazy(self):
+        return self.lazy_args is not None
 
     cdef EntityType get_base_entity(self):
         # determine base entity
@@ -157,6 +249,10 @@ cdef class EntityType(type):
             else:
                 result.append(PolymorphParentDeleteTrigger(base_entity))
 
+        notify = self.get_meta("notify", False)
+        if notify and self.__pk__:
+            result.append(ChangeNotifyTrigger(None if notify is True else notify))
+
         return result
 
 
@@ -166,6 +262,8 @@ cdef class EntityType(type):
 
         cdef tuple hints = get_type_hints(self)
         cdef Factory factory
+        cdef Registry registry = self.get_registry()
+        cdef dict factories = registry.factories if registry is not None else None
         cdef EntityAttribute attr
         cdef list result = []
 
@@ -222,7 +320,7 @@ cdef class EntityType(type):
                     # raise ValueError(f"Can't overwrite polymorph base field: {name}")
                     continue
 
-                factory = Factory.create(type)
+                factory = Factory.cached(type, factories)
                 if factory is None:
                     continue
 
@@ -255,6 +353,31 @@ cdef class EntityType(type):
     def __meta__(self):
         return <object>self.meta
 
+    @property
+    def __attrs__(self):
+        self._build()
+        return self.__attrs__
+
+    @property
+    def __fields__(self):
+        self._build()
+        return self.__fields__
+
+    @property
+    def __props__(self):
+        self._build()
+        return self.__props__
+
+    @property
+    def __pk__(self):
+        self._build()
+        return self.__pk__
+
+    @property
+    def __extgroups__(self):
+        self._build()
+        return self.__extgroups__
+
     @property
     def __deferred__(self):
         cdef list result = []
@@ -403,6 +526,15 @@ cdef class EntityType(type):
             # TODO: maybe group.seal()
 
         self.__triggers__.extend(self._compute_triggers())
+
+        layout = compact_layout(self.__fields__) if self.get_meta("compact", False) is True else None
+        if layout is not None:
+            self.compact_layout, self.compact_slots, self.compact_count = layout
+        else:
+            self.compact_layout = None
+            self.compact_slots = None
+            self.compact_count = 0
+
         self.__entity_ready__()
         self.stage = EntityStage.RESOLVED
 
@@ -428,6 +560,7 @@ cdef class EntityType(type):
 
 cdef EntityAlias new_entity_alias(EntityType entity, str alias, EntityType poly_base, EntityType poly_skip):
     entity = get_alias_target(entity)
+    entity._build()
 
     if entity.is_deferred() is True:
         raise RuntimeError(f"Can't alias deferred entity: {entity} ({entity.__deferred__})")
@@ -934,29 +1067,107 @@ cdef class EntityAttributeImpl:
         return isinstance(self, type(other)) or isinstance(other, type(self))
 
 
-cdef inline state_set_value(PyObject* initial, PyObject* current, EntityAttribute attr, object value):
+cdef inline state_set_value(object iv, PyObject* current, EntityAttribute attr, object value):
     cdef int idx = attr._index_
-    cdef PyObject* iv = PyTuple_GET_ITEM(<object>initial, idx)
     cdef PyObject* cv = PyTuple_GET_ITEM(<object>current, idx)
     # cdef PyObject* nv = <PyObject*>((<EntityAttributeImpl>attr._impl_).state_set(<object>iv, <object>cv, value))
 
-    nv = (<EntityAttributeImpl>attr._impl_).state_set(<object>iv, <object>cv, value)
+    nv = (<EntityAttributeImpl>attr._impl_).state_set(iv, <object>cv, value)
     Py_INCREF(<object>nv)
     Py_XDECREF(cv)
     PyTuple_SET_ITEM(<object>current, idx, <object>nv)
 
 
+cdef enum CompactKind:
+    COMPACT_NONE = 0
+    COMPACT_INT = 1
+    COMPACT_FLOAT = 2
+
+
+cdef tuple compact_layout(tuple fields):
+    """ Returns ``(field index -> kind, field index -> slot, slot count)``, or None when nothing to compact.
+    Bools and None are singletons, boxing them costs nothing, so only ints and floats get a slot.
+    """
+    cdef Field field
+    cdef bytearray kinds = bytearray(len(fields))
+    cdef bytearray slots = bytearray(len(fields))
+    cdef int count = 0
+
+    for field in fields:
+        # slot index is stored in one byte
+        if count == 256:
+            break
+
+        if type(field._impl_) is IntImpl:
+            kinds[field._index_] = <unsigned char>COMPACT_INT
+        elif type(field._impl_) is FloatImpl:
+            kinds[field._index_] = <unsigned char>COMPACT_FLOAT
+        else:
+            continue
+
+        slots[field._index_] = <unsigned char>count
+        count += 1
+
+    if count == 0:
+        return None
+    return bytes(kinds), bytes(slots), count
+
+
+cdef dict _virtual_deps(EntityType entity):
+    # only the first part of the dependency path is tracked, eg.: "user.name" -> user
+    cdef dict result = {}
+    cdef EntityAttribute attr
+
+    for attr in entity.__attrs__:
+        if not attr._virtual_ or not getattr(attr, "_cache", False):
+            continue
+
+        deps = getattr(attr, "_deps", None)
+        if not deps:
+            result[-1] = result.get(-1, ()) + (attr._index_,)
+            continue
+
+        for dep in deps:
+            dep_attr = getattr(entity, dep.split(".", 1)[0], None)
+            if isinstance(dep_attr, EntityAttribute):
+                idx = (<EntityAttribute>dep_attr)._index_
+                result[idx] = result.get(idx, ()) + (attr._index_,)
+
+    return result
+
+
 @cython.final
 @cython.freelist(1000)
 cdef class EntityState:
 
     def __cinit__(self, EntityType entity):
         cdef int length = len(entity.__attrs__)
+        cdef int compact_count = entity.compact_count
         self.entity = entity
         self.initial = PyTuple_New(length)
         self.current = PyTuple_New(length)
         self.field_count = len(entity.__fields__)
 
+        # one block: dirty bits, volatile bits, compact bits, compact values (one word per compact field)
+        self.bit_words = (length >> 6) + 1
+        self.dirty_bits = <uint64_t*>PyMem_Calloc(self.bit_words * 3 + compact_count, sizeof(uint64_t))
+        if self.dirty_bits is NULL:
+            raise MemoryError()
+        self.volatile_bits = self.dirty_bits + self.bit_words
+
+        if compact_count != 0:
+            self.compact_bits = self.dirty_bits + self.bit_words * 2
+            self.compact_values = <int64_t*>(self.dirty_bits + self.bit_words * 3)
+        else:
+            self.compact_bits = NULL
+            self.compact_values = NULL
+
+    def __dealloc__(self):
+        PyMem_Free(self.dirty_bits)
+        self.dirty_bits = NULL
+        self.compact_bits = NULL
+        self.compact_values = NULL
+
     cdef object init(self):
         cdef int idx
         cdef EntityAttribute attr
@@ -973,13 +1184,123 @@ cdef class EntityState:
                 Py_INCREF(<object>cv)
                 PyTuple_SET_ITEM(<object>initial, idx, <object>cv)
 
-            iv = (<EntityAttributeImpl>attr._impl_).state_init(<object>cv)
+            if type(<object>cv) is LazyValue:
+                # not decoded, so not changed, current value is initialized in _decode_lazy
+                iv = NOTSET
+            else:
+                iv = (<EntityAttributeImpl>attr._impl_).state_init(self._initial_value(idx))
 
             Py_INCREF(<object>iv)
             cv = PyTuple_GET_ITEM(<object>current, idx)
             Py_XDECREF(cv)
             PyTuple_SET_ITEM(<object>current, idx, <object>iv)
 
+            self._reset_bits(idx, iv is not NOTSET or isinstance(attr, Relation))
+
+    cdef void _mark_dirty(self, int idx):
+        self.dirty_bits[idx >> 6] |= (<uint64_t>1) << (idx & 63)
+
+    cdef void _reset_bits(self, int idx, bint is_volatile):
+        # values what is initialized from the initial value (json, composite, list, ...) or
+        # references other entities (relations) can change without set_value, so always check them
+        cdef uint64_t bit = (<uint64_t>1) << (idx & 63)
+
+        self.dirty_bits[idx >> 6] &= ~bit
+        if is_volatile:
+            self.volatile_bits[idx >> 6] |= bit
+        else:
+            self.volatile_bits[idx >> 6] &= ~bit
+
+    cdef object _initial_value(self, int idx):
+        cdef PyObject* iv = PyTuple_GET_ITEM(<object>self.initial, idx)
+        cdef unsigned char slot
+
+        if type(<object>iv) is LazyValue:
+            return self._decode_lazy(idx, <LazyValue>iv)
+
+        if iv is <PyObject*>NOTSET \
+                and self.compact_bits is not NULL \
+                and self.compact_bits[idx >> 6] & ((<uint64_t>1) << (idx & 63)):
+            slot = self.entity.compact_slots[idx]
+            if self.entity.compact_layout[idx] == COMPACT_INT:
+                return self.compact_values[slot]
+            else:
+                return (<double*>self.compact_values)[slot]
+
+        return <object>iv
+
+    cdef object _set_initial(self, int idx, object value):
+        cdef PyObject* initial = <PyObject*>self.initial
+        cdef PyObject* iv = PyTuple_GET_ITEM(<object>initial, idx)
+        cdef uint64_t bit = (<uint64_t>1) << (idx & 63)
+        cdef unsigned char kind = COMPACT_NONE
+        cdef unsigned char slot = 0
+        cdef object nv = value
+
+        if self.compact_bits is not NULL and idx < len(self.entity.compact_layout):
+            kind = self.entity.compact_layout[idx]
+            slot = self.entity.compact_slots[idx]
+
+        if kind != COMPACT_NONE:
+            # only exact types, subclasses (IntEnum, ...) must be returned as is
+            if kind == COMPACT_INT and type(value) is int:
+                try:
+                    self.compact_values[slot] = <int64_t>value
+                except OverflowError:
+                    kind = COMPACT_NONE
+            elif kind == COMPACT_FLOAT and type(value) is float:
+                (<double*>self.compact_values)[slot] = <double>value
+            else:
+                kind = COMPACT_NONE
+
+            if kind == COMPACT_NONE:
+                self.compact_bits[idx >> 6] &= ~bit
+            else:
+                self.compact_bits[idx >> 6] |= bit
+                nv = NOTSET
+
+        Py_INCREF(nv)
+        Py_XDECREF(iv)
+        PyTuple_SET_ITEM(<object>initial, idx, nv)
+
+    cdef object _decode_lazy(self, int idx, LazyValue lazy):
+        cdef EntityAttribute attr = <EntityAttribute>self.entity.__attrs__[idx]
+        cdef PyObject* current = <PyObject*>self.current
+        cdef PyObject* cv
+
+        value = (<EntityAttributeImpl>attr._impl_).state_set(NOTSET, NOTSET, lazy.type.decode(lazy.raw))
+        self._set_initial(idx, value)
+
+        # same as init, but only when the current value is not changed
+        cv = PyTuple_GET_ITEM(<object>current, idx)
+        if cv is <PyObject*>NOTSET:
+            nv = (<EntityAttributeImpl>attr._impl_).state_init(value)
+            if nv is not NOTSET:
+                Py_INCREF(<object>nv)
+                Py_XDECREF(cv)
+                PyTuple_SET_ITEM(<object>current, idx, <object>nv)
+                self.volatile_bits[idx >> 6] |= (<uint64_t>1) << (idx & 63)
+
+        return value
+
+    cdef list _check_indexes(self, int start):
+        cdef list res = []
+        cdef int word_idx
+        cdef int idx
+        cdef uint64_t word
+
+        for word_idx in range(start >> 6, self.bit_words):
+            word = self.dirty_bits[word_idx] | self.volatile_bits[word_idx]
+            idx = word_idx << 6
+
+            while word:
+                if word & 1 and idx >= start:
+                    res.append(idx)
+                word >>= 1
+                idx += 1
+
+        return res
+
 
     cpdef object update(self, dict data, bint is_initial = False):
         cdef EntityAttribute attr
@@ -995,35 +1316,43 @@ cdef class EntityState:
                 self.set_value(attr, v)
 
     cdef object set_value(self, EntityAttribute attr, object value):
-        state_set_value(<PyObject*>self.initial, <PyObject*>self.current, attr, value)
+        state_set_value(self._initial_value(attr._index_), <PyObject*>self.current, attr, value)
+        self._mark_dirty(attr._index_)
+        if self.virtual_cache:
+            self._invalidate_virtual(attr._index_)
 
     cdef object set_initial_value(self, EntityAttribute attr, object value):
         cdef int idx = attr._index_
         cdef PyObject* initial = <PyObject*>self.initial
-        cdef PyObject* iv = PyTuple_GET_ITEM(<object>initial, idx)
         cdef EntityAttributeImpl impl = <EntityAttributeImpl>attr._impl_
 
-        if iv is NULL:
-            iv = <PyObject*>NOTSET
-            Py_INCREF(<object>iv)
+        if PyTuple_GET_ITEM(<object>initial, idx) is NULL:
+            iv = NOTSET
+        else:
+            iv = self._initial_value(idx)
 
-        nv = impl.state_set(<object>iv, <object>iv, value)
-        Py_INCREF(<object>nv)
-        Py_XDECREF(iv)
-        PyTuple_SET_ITEM(<object>initial, idx, <object>nv)
+        self._set_initial(idx, impl.state_set(iv, iv, value))
+        self._mark_dirty(idx)
+        if self.virtual_cache:
+            self._invalidate_virtual(idx)
+
+    cdef object set_lazy_initial_value(self, EntityAttribute attr, LazyValue value):
+        self._set_initial(attr._index_, value)
+        self._mark_dirty(attr._index_)
 
     cdef object get_initial_value(self, EntityAttribute attr):
-        cdef PyObject* initial = <PyObject*>self.initial
-        cdef PyObject* iv = PyTuple_GET_ITEM(<object>initial, attr._index_)
-        return <object>iv
+        return self._initial_value(attr._index_)
 
     cdef object get_value(self, EntityAttribute attr):
-        cdef PyObject* initial = <PyObject*>self.initial
         cdef PyObject* current = <PyObject*>self.current
         cdef PyObject* cv = PyTuple_GET_ITEM(<object>current, attr._index_)
 
         if cv is <PyObject*>NOTSET:
-            cv = PyTuple_GET_ITEM(<object>initial, attr._index_)
+            value = self._initial_value(attr._index_)
+            # decoding of lazy value initializes the current value
+            cv = PyTuple_GET_ITEM(<object>current, attr._index_)
+            if cv is <PyObject*>NOTSET:
+                return value
 
         return <object>cv
 
@@ -1034,6 +1363,31 @@ cdef class EntityState:
         Py_INCREF(<object>nv)
         Py_XDECREF(cv)
         PyTuple_SET_ITEM(<object>current, attr._index_, <object>nv)
+        self._mark_dirty(attr._index_)
+        if self.virtual_cache:
+            self._invalidate_virtual(attr._index_)
+
+    cdef object get_virtual_cache(self, EntityAttribute attr):
+        if self.virtual_cache is None:
+            return NOTSET
+        return self.virtual_cache.get(attr._index_, NOTSET)
+
+    cdef object set_virtual_cache(self, EntityAttribute attr, object value):
+        if self.virtual_cache is None:
+            self.virtual_cache = {}
+        self.virtual_cache[attr._index_] = value
+
+    cdef object _invalidate_virtual(self, int idx):
+        cdef dict deps = self.entity.virtual_deps
+        if deps is None:
+            deps = self.entity.virtual_deps = _virtual_deps(self.entity)
+
+        for vidx in deps.get(idx, ()):
+            self.virtual_cache.pop(vidx, None)
+
+        # cached virtual attributes without depends
+        for vidx in deps.get(-1, ()):
+            self.virtual_cache.pop(vidx, None)
 
     cdef list data_for_insert(self):
         cdef int idx
@@ -1048,16 +1402,19 @@ cdef class EntityState:
             idx = attr._index_
             cv = PyTuple_GET_ITEM(<object>current, idx)
             if cv is <PyObject*>NOTSET:
-                cv = PyTuple_GET_ITEM(<object>initial, idx)
-            if cv is <PyObject*>NOTSET:
+                value = self._initial_value(idx)
+            else:
+                value = <object>cv
+
+            if value is NOTSET:
                 # TODO: ez itt hülyeség, a PrimaryKey-nek is lehet default értéke
                 if not attr.get_ext(PrimaryKey):
-                    cv = <PyObject*>(attr._default_)
-                    if not isinstance(<object>cv, Expression) and callable(<object>cv):
-                        res.append((attr, (<object>cv)()))
+                    value = attr._default_
+                    if not isinstance(value, Expression) and callable(value):
+                        res.append((attr, value()))
                 continue
 
-            res.append((attr, <object>cv))
+            res.append((attr, value))
 
         return res
 
@@ -1071,12 +1428,11 @@ cdef class EntityState:
         cdef PyObject* cv
         cdef EntityAttribute attr
 
-        for attr in entity.__attrs__:
-            idx = attr._index_
+        for idx in self._check_indexes(0):
+            attr = <EntityAttribute>entity.__attrs__[idx]
 
-            iv = PyTuple_GET_ITEM(<object>initial, idx)
             cv = PyTuple_GET_ITEM(<object>current, idx)
-            nv = (<EntityAttributeImpl>attr._impl_).state_get_dirty(<object>iv, <object>cv)
+            nv = (<EntityAttributeImpl>attr._impl_).state_get_dirty(self._initial_value(idx), <object>cv)
 
             if nv is NOTSET:
                 continue
@@ -1097,29 +1453,25 @@ cdef class EntityState:
     def changes_with_previous(self):
         cdef dict res = {}
         cdef int idx
-        cdef tuple initial = self.initial
 
         for attr, value in self.data_for_update():
             idx = attr._index_
-            res[attr._name_] = (initial[idx], value)
+            res[attr._name_] = (self._initial_value(idx), value)
 
         return res
 
     cdef object attr_changes(self, EntityAttribute attr):
         cdef int idx = attr._index_
-        cdef PyObject* iv
         cdef PyObject* cv
-        cdef PyObject* initial = <PyObject*>self.initial
         cdef PyObject* current = <PyObject*>self.current
 
-        iv = PyTuple_GET_ITEM(<object>initial, idx)
         cv = PyTuple_GET_ITEM(<object>current, idx)
-        return (<EntityAttributeImpl>attr._impl_).state_get_dirty(<object>iv, <object>cv)
+        return (<EntityAttributeImpl>attr._impl_).state_get_dirty(self._initial_value(idx), <object>cv)
 
     @property
     def is_dirty(self):
-        for attr in self.entity.__attrs__:
-            if self.attr_changes(attr) is not NOTSET:
+        for idx in self._check_indexes(0):
+            if self.attr_changes(<EntityAttribute>self.entity.__attrs__[idx]) is not NOTSET:
                 return True
         return False
 
@@ -1142,6 +1494,9 @@ cdef class EntityState:
 
             if val is NULL or val is <PyObject*>NOTSET:
                 val = PyTuple_GET_ITEM(<object>initial, attr._index_)
+                if val is <PyObject*>NOTSET and self.compact_bits is not NULL:
+                    if self.compact_bits[attr._index_ >> 6] & ((<uint64_t>1) << (attr._index_ & 63)):
+                        return False
 
             if val is not NULL and val is not <PyObject*>NOTSET and val is not <PyObject*>None:
                 return False
@@ -1173,6 +1528,14 @@ cdef class EntityState:
 
         self.initial = self.current
         self.current = PyTuple_New(length)
+
+        # compact values what is not changed stays in place, and store the changed ones
+        if self.compact_bits is not NULL:
+            for idx in range(len(self.entity.compact_layout)):
+                iv = PyTuple_GET_ITEM(<object>self.initial, idx)
+                if iv is not <PyObject*>NOTSET:
+                    self._set_initial(idx, <object>iv)
+
         self.init()
 
     cdef reset_attr(self, EntityAttribute attr):
@@ -1186,10 +1549,7 @@ cdef class EntityState:
         if cv is <PyObject*>NOTSET:
             return
 
-        Py_INCREF(<object>cv)
-        iv = PyTuple_GET_ITEM(<object>initial, idx)
-        Py_XDECREF(iv)
-        PyTuple_SET_ITEM(<object>initial, idx, <object>cv)
+        self._set_initial(idx, <object>cv)
 
         val = (<EntityAttributeImpl>attr._impl_).state_init(<object>cv)
         cv = PyTuple_GET_ITEM(<object>current, idx)
@@ -1197,11 +1557,13 @@ cdef class EntityState:
         Py_INCREF(<object>val)
         PyTuple_SET_ITEM(<object>current, idx, <object>val)
 
+        self._reset_bits(idx, val is not NOTSET or isinstance(attr, Relation))
+
     def changed_realtions(self):
         cdef EntityAttribute attr
         cdef list result = []
 
-        for i in range(self.field_count, len(self.entity.__attrs__)):
+        for i in self._check_indexes(self.field_count):
             attr = self.entity.__attrs__[i]
             if isinstance(attr, Relation):
                 val = self.attr_changes(attr)
@@ -1272,6 +1634,9 @@ cdef class EntityBase:
     def __cinit__(self, state=None, **values):
         cdef EntityType model = type(self)
 
+        if model.lazy_args is not None:
+            model._build()
+
         if model.is_deferred():
             raise RuntimeError(f"Entity is not resolved, pending items: {model.__deferred__}")
 
@@ -1,5 +1,4 @@
 from enum import IntFlag
-from functools import cmp_to_key
 from operator import __and__, __eq__, __neg__, __pos__
 
 import cython
@@ -22,14 +21,18 @@ class EntityOperation(IntFlag):
 
 cpdef list save_operations(EntityBase entity):
     cdef DependencyList order = DependencyList()
+    cdef dict types = {}
     cdef list ops = []
 
-    _collect_entities(entity, order, ops, determine_entity_op(entity))
+    _collect_entities(entity, types, ops, determine_entity_op(entity))
+
+    for entity_t in types:
+        order.add(entity_t)
 
     # print("\n".join(map(repr, ops)))
     # print(order)
 
-    ops.sort(key=cmp_to_key(_comparator(order)))
+    ops.sort(key=_ranker(order))
     # import pprint; pprint.pprint(ops)
     return ops
 
@@ -39,34 +42,26 @@ cpdef list load_operations(EntityBase entity):
 
 
 @cython.final
-cdef class _comparator:
-    cdef DependencyList order
+cdef class _ranker:
+    cdef dict ranks
 
     def __cinit__(self, DependencyList order):
-        self.order = order
+        self.ranks = {}
+
+        for i, entity_t in enumerate(order.items):
+            if entity_t not in self.ranks:
+                self.ranks[entity_t] = i
 
-    def __call__(self, a, b):
-        a_op, a_val = a
-        b_op, b_val = b
+    def __call__(self, tuple item):
+        op, val = item
 
-        if a_op < EntityOperation.UPDATE_ATTR and b_op < EntityOperation.UPDATE_ATTR:
-            return self.order.index(type(a_val)) - self.order.index(type(b_val))
+        if op is EntityOperation.UPDATE_ATTR:
+            return max(self.ranks[val[1]._entity_], self.ranks[val[3]._entity_])
         else:
-            if a_op is EntityOperation.UPDATE_ATTR:
-                a_idx = max(self.order.index(a_val[1]._entity_), self.order.index(a_val[3]._entity_))
-                if b_op is EntityOperation.UPDATE_ATTR:
-                    return a_idx - max(self.order.index(b_val[1]._entity_), self.order.index(b_val[3]._entity_))
-                else:
-                    return a_idx - self.order.index(type(b_val))
-            else:
-                a_idx = self.order.index(type(a_val))
-                if b_op is EntityOperation.UPDATE_ATTR:
-                    return a_idx - max(self.order.index(b_val[1]._entity_), self.order.index(b_val[3]._entity_))
-                else:
-                    return a_idx - self.order.index(type(b_val))
+            return self.ranks[type(val)]
 
 
-cdef _collect_entities(EntityBase entity, DependencyList order, list ops, object op):
+cdef _collect_entities(EntityBase entity, dict types, list ops, object op):
     cdef EntityState state = entity.__state__
     cdef EntityAttribute attr
     cdef list add
@@ -80,21 +75,21 @@ cdef _collect_entities(EntityBase entity, DependencyList order, list ops, object
     for attr, (add, rem, chg) in state.changed_realtions():
         is_dirty = True
         for related in add:
-            set_related_attrs(<Relation>attr, entity, related, order, ops)
-            _collect_entities(related, order, ops, determine_entity_op(related))
+            set_related_attrs(<Relation>attr, entity, related, types, ops)
+            _collect_entities(related, types, ops, determine_entity_op(related))
 
         for related in rem:
             if related:
-                del_related_attrs(<Relation>attr, entity, related, order, ops)
-                _collect_entities(related, order, ops, determine_entity_op(related))
+                del_related_attrs(<Relation>attr, entity, related, types, ops)
+                _collect_entities(related, types, ops, determine_entity_op(related))
 
         for related in chg:
-            set_related_attrs(<Relation>attr, entity, related, order, ops)
-            _collect_entities(related, order, ops, determine_entity_op(related))
+            set_related_attrs(<Relation>attr, entity, related, types, ops)
+            _collect_entities(related, types, ops, determine_entity_op(related))
 
-    if (is_dirty or state.is_dirty or not state.exists) and entity not in ops:
+    if is_dirty or state.is_dirty or not state.exists:
         ops.append((op, entity))
-        order.add(type(entity))
+        types[type(entity)] = None
 
 
 cdef set_poly_id(EntityBase main):
@@ -111,7 +106,7 @@ cdef set_poly_id(EntityBase main):
             parent_entity.__pk__ = pk
 
 
-cdef set_related_attrs(Relation attr, EntityBase main, EntityBase related, DependencyList order, list ops):
+cdef set_related_attrs(Relation attr, EntityBase main, EntityBase related, dict types, list ops):
     if isinstance(attr._impl_, ManyToMany):
         across_alias = (<ManyToMany>attr._impl_).get_across_alias()
         across_entity = get_alias_target(across_alias)()
@@ -119,15 +114,15 @@ cdef set_related_attrs(Relation attr, EntityBase main, EntityBase related, Depen
         append_fields(across_entity, main, attr._impl_.across_join_expr, ops)
         append_fields(across_entity, related, attr._impl_.join_expr, ops)
 
-        _collect_entities(across_entity, order, ops, EntityOperation.INSERT_OR_UPDATE)
-        order.add(across_alias)
+        _collect_entities(across_entity, types, ops, EntityOperation.INSERT_OR_UPDATE)
+        types[across_alias] = None
     elif isinstance(attr._impl_, OneToMany):
         append_fields(related, main, attr._impl_.join_expr, ops)
     else:
         append_fields(main, related, attr._impl_.join_expr, ops)
 
 
-cdef del_related_attrs(Relation attr, EntityBase main, EntityBase related, DependencyList order, list ops):
+cdef del_related_attrs(Relation attr, EntityBase main, EntityBase related, dict types, list ops):
     pass
 
 
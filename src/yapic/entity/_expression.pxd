@@ -2,6 +2,10 @@ import cython
 
 
 cdef class Visitor:
+    # operator -> handler, shared between the instances of the same visitor type
+    cdef dict binary_handlers
+    cdef dict unary_handlers
+
     cpdef visit(self, Expression expr)
 
 
@@ -401,24 +401,92 @@ cdef class ExpressionPlaceholder(Expression):
 #         return f"<Multi {self.combinator} {self.expressions}>"
 
 
+# visitor type -> (binary handlers, unary handlers), where handlers is {operator: handler},
+# handler is the function defined in the visitor class, or the name of the handler,
+# when the class does not define it (resolved with __getattr__)
+cdef dict DISPATCH_TABLES = {}
+
+# operators of the expressions, the dispatch table is prefilled with these
+cdef tuple OPERATORS = (
+    operator.__lt__, operator.__le__, operator.__eq__, operator.__ne__, operator.__ge__, operator.__gt__,
+    operator.__add__, operator.__sub__, operator.__and__, operator.__or__, operator.__xor__,
+    operator.__lshift__, operator.__rshift__, operator.__mod__, operator.__mul__, operator.__truediv__,
+    operator.__pow__, operator.__invert__, operator.__neg__, operator.__pos__, operator.__abs__,
+)
+
+
+cdef tuple _dispatch_tables(object visitor_type):
+    try:
+        return <tuple>DISPATCH_TABLES[visitor_type]
+    except KeyError:
+        pass
+
+    cdef dict binary = {}
+    cdef dict unary = {}
+
+    for op in OPERATORS + (in_, startswith, endswith, contains, find):
+        handler = getattr(visitor_type, _handler_name(op, "visit_binary_"), None)
+        if handler is not None:
+            binary[op] = handler
+
+        handler = getattr(visitor_type, _handler_name(op, "visit_unary_"), None)
+        if handler is not None:
+            unary[op] = handler
+
+    result = DISPATCH_TABLES[visitor_type] = (binary, unary)
+    return result
+
+
+cdef object _missing_handler(dict handlers, object visitor_type, object op, str prefix):
+    name = _handler_name(op, prefix)
+    handler = getattr(visitor_type, name, None)
+    if handler is None:
+        handler = name
+
+    handlers[op] = handler
+    return handler
+
+
+cdef str _handler_name(object op, str prefix):
+    if op is operator.__or__:
+        return f"{prefix}or"
+    elif op is operator.__and__:
+        return f"{prefix}and"
+    elif op is in_:
+        return f"{prefix}in"
+    else:
+        return f"{prefix}{op.__name__}"
+
+
 cdef class Visitor:
+    def __cinit__(self, *args, **kwargs):
+        # cdef classes have no class creation hook, so the table is built at the first instantiation
+        cdef tuple tables = _dispatch_tables(type(self))
+        self.binary_handlers = <dict>tables[0]
+        self.unary_handlers = <dict>tables[1]
+
     cpdef visit(self, Expression expr):
         return expr.visit(self)
 
     def visit_binary(self, binary):
-        if binary.op is operator.__or__:
-            fn_name = "visit_binary_or"
-        elif binary.op is operator.__and__:
-            fn_name = "visit_binary_and"
-        elif binary.op is in_:
-            fn_name = "visit_binary_in"
-        else:
-            fn_name = f"visit_binary_{binary.op.__name__}"
-        return getattr(self, fn_name)(binary)
+        cdef object op = (<BinaryExpression>binary).op
+        handler = self.binary_handlers.get(op)
+        if handler is None:
+            handler = _missing_handler(self.binary_handlers, type(self), op, "visit_binary_")
+
+        if type(handler) is str:
+            return getattr(self, <str>handler)(binary)
+        return handler(self, binary)
 
     def visit_unary(self, unary):
-        fn_name = f"visit_unary_{unary.op.__name__}"
-        return getattr(self, fn_name)(unary)
+        cdef object op = (<UnaryExpression>unary).op
+        handler = self.unary_handlers.get(op)
+        if handler is None:
+            handler = _missing_handler(self.unary_handlers, type(self), op, "visit_unary_")
+
+        if type(handler) is str:
+            return getattr(self, <str>handler)(unary)
+        return handler(self, unary)
 
     def _visit_iterable(self, expr):
         if isinstance(expr, tuple):
@@ -45,6 +45,9 @@ cdef class Factory:
     cdef tuple hints
     cdef bint has_forward_ref
 
+    @staticmethod
+    cdef Factory cached(object t, dict cache)
+
     @staticmethod
     cdef Factory create(object t)
 
@@ -14,8 +14,41 @@ cdef tuple get_type_hints(object t):
     return typing_.TypeHints(t)
 
 
+cdef bint is_cacheable(object t):
+    if isinstance(t, (str, typing.ForwardRef)):
+        return False
+
+    # types with custom metaclass (entities, enums) can be defined locally, so don't keep them alive
+    if isinstance(t, type) and type(t) is not type:
+        return False
+
+    for arg in typing.get_args(t):
+        if not is_cacheable(arg):
+            return False
+    return True
+
+
 @cython.final
 cdef class Factory:
+    @staticmethod
+    cdef Factory cached(object t, dict cache):
+        # the same annotations (String, Int, One[User], ...) are used in many entities,
+        # so reuse the computed type hints, the cache is owned by the registry (``Registry.factories``)
+        if cache is None:
+            return Factory.create(t)
+
+        try:
+            return cache[t]
+        except KeyError:
+            pass
+        except TypeError:
+            return Factory.create(t)
+
+        cdef Factory result = Factory.create(t)
+        if not is_forward_decl(t) and is_cacheable(t):
+            cache[t] = result
+        return result
+
     @staticmethod
     cdef Factory create(object t):
         cdef bint has_forward_ref = False
@@ -39,6 +39,14 @@ cdef class PrimaryKey(FieldExtension):
     pass
 
 
+cdef class LazyDecode(FieldExtension):
+    pass
+
+
+cdef class ServerGenerated(FieldExtension):
+    pass
+
+
 cdef class AutoIncrement(FieldExtension):
     cdef object _seq_arg
     cdef readonly EntityType sequence
@@ -146,6 +146,16 @@ cdef class PrimaryKey(FieldExtension):
     pass
 
 
+cdef class LazyDecode(FieldExtension):
+    """ Decode the value at the first access, instead of when the row is loaded """
+    pass
+
+
+cdef class ServerGenerated(FieldExtension):
+    """ The value is set by the database (trigger, generated column), so it is returned after insert / update """
+    pass
+
+
 cdef class AutoIncrement(FieldExtension):
     def __cinit__(self, object sequence=None):
         self._seq_arg = sequence
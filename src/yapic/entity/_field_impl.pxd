@@ -64,6 +64,7 @@ cdef class JsonImpl(FieldImpl):
     cdef readonly EntityType _list_
     cdef bint _any_
 
+    cdef list dirty_paths(self, object initial, object current, int limit)
     cdef bint __check_dirty(self, object value)
     cdef object __list_item(self, object value)
 
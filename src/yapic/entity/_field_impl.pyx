@@ -5,7 +5,7 @@ from typing import List
 
 from cpython.weakref cimport PyWeakref_NewRef
 
-from ._entity cimport EntityType, EntityBase, EntityAttributeImpl, EntityAttribute, NOTSET
+from ._entity cimport EntityType, EntityBase, EntityAttributeImpl, EntityAttribute, EntityState, NOTSET
 from ._expression cimport PathExpression, CallExpression, RawExpression
 from ._field cimport StorageType, ForeignKey, Field
 from ._resolve cimport ResolveContext
@@ -230,6 +230,17 @@ cdef class JsonImpl(FieldImpl):
         return NOTSET
 
 
+    cdef list dirty_paths(self, object initial, object current, int limit):
+        # changes of the in place modified object as [(path, value)], or None when the whole value must be written
+        if self._object_ is None or initial is not current or not isinstance(current, EntityBase):
+            return None
+
+        cdef list result = []
+        if _json_dirty_paths(<EntityBase>current, (), result, limit):
+            return result
+        else:
+            return None
+
     def __repr__(self):
         return "Json"
 
@@ -249,6 +260,42 @@ cdef class JsonImpl(FieldImpl):
         else:
             return self._list_(value)
 
+cdef bint _json_dirty_paths(EntityBase value, tuple path, list result, int limit):
+    cdef EntityState state = value.__state__
+    cdef EntityType entity = type(value)
+    cdef EntityAttribute attr
+
+    for idx in state._check_indexes(0):
+        attr = <EntityAttribute>entity.__attrs__[idx]
+        if attr._key_ is None:
+            continue
+
+        iv = state.get_initial_value(attr)
+        cv = state.get_value(attr)
+
+        if iv is cv \
+                and isinstance(cv, EntityBase) \
+                and isinstance(attr._impl_, JsonImpl) \
+                and (<JsonImpl>attr._impl_)._object_ is not None:
+            if not _json_dirty_paths(<EntityBase>cv, path + (attr._key_,), result, limit):
+                return False
+        elif state.attr_changes(attr) is not NOTSET:
+            result.append((path + (attr._key_,), _json_value(cv)))
+            if len(result) > limit:
+                return False
+
+    return True
+
+
+cdef object _json_value(object value):
+    if isinstance(value, EntityBase):
+        return value.as_dict()
+    elif isinstance(value, list):
+        return [_json_value(v) for v in value]
+    else:
+        return value
+
+
 cdef bint json_eq(object a, object b):
     if isinstance(a, list) and isinstance(b, list):
         a_len = len((<list>a))
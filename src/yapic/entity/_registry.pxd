@@ -7,7 +7,28 @@ cdef class Registry:
     cdef object __weakref__
     cdef readonly object entities
     cdef readonly ScopeDict locals
-    cdef readonly object deferred
+
+    # unresolved entities in registration order
+    cdef dict pending
+    # entities waiting for resolving attempt
+    cdef object queue
+    # name -> entities, which are failed to resolve because of missing name
+    cdef dict waiting
+    # entities which are failed to resolve without missing name
+    cdef list stalled
+    # forward definitions shared between entities, defined in the same scope
+    cdef dict scopes
+    cdef int wake_budget
+    # entity -> registration order
+    cdef dict order
+    # registered, but not built lazy entities
+    cdef dict lazy
+    # (referenced entity, column name) -> {entity: [field keys]}
+    cdef dict fk_refs
+    # (referenced entity, column name) -> {entity: [foreign key groups]}
+    cdef dict fk_groups
+    # annotation -> Factory, see Factory.cached
+    cdef dict factories
 
     cdef list resolved
     # cdef set resolving
@@ -15,12 +36,21 @@ cdef class Registry:
     cdef bint is_draft
 
     cdef object register(self, EntityType entity)
+    cdef object resolve(self, EntityType entity)
+    cdef ScopeDict forward_scope(self, dict globals, dict locals)
     cdef _finalize_entities(self)
+    cdef _resolve_queue(self)
+    cdef _wake(self, str name)
+    cdef bint _wake_available(self)
+    cdef _index_foreign_keys(self, EntityType entity)
+    cdef _unindex_foreign_keys(self, EntityType entity)
 
     cpdef keys(self)
     cpdef values(self)
     cpdef items(self)
     # cpdef filter(self, fn)
+    cpdef remove(self, EntityType entity)
+    cpdef finalize(self)
     cpdef list get_foreign_key_refs(self, EntityAttribute column)
     cpdef list get_referenced_foreign_keys(self, EntityAttribute column)
 
@@ -38,3 +68,4 @@ cdef class RegistryDiff:
 @cython.final
 cdef class ScopeDict(dict):
     cdef set_path(self, str path, object value)
+    cdef del_path(self, str path, object value)
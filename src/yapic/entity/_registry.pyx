@@ -5,6 +5,7 @@ from collections import deque
 from ._entity cimport DependencyList, EntityBase, EntityType, EntityAttribute, EntityAttributeExt, EntityAttributeExtGroup, EntityAttributeImpl, NOTSET, entity_is_builtin, entity_is_virtual
 from ._entity_diff cimport EntityDiff
 from ._field cimport ForeignKey, Field
+from ._resolve cimport ResolveContext
 
 
 # TODO: inherit from dict
@@ -13,8 +14,18 @@ cdef class Registry:
     def __cinit__(self):
         self.entities = {}
         self.locals = ScopeDict()
-        self.deferred = deque()
+        self.pending = {}
+        self.queue = deque()
+        self.waiting = {}
+        self.stalled = []
+        self.scopes = {}
         self.resolved = []
+        self.wake_budget = 0
+        self.order = {}
+        self.lazy = {}
+        self.fk_refs = {}
+        self.fk_groups = {}
+        self.factories = {}
         # self.resolving = set()
         self.is_draft = False
         self.in_resolving = False
@@ -25,27 +36,69 @@ cdef class Registry:
             raise ValueError("entity already registered: %r" % entity)
         else:
             # TODO: ha az in_resolving != 0 akkor egy új resolving contextet kezdjen
+            self.order[entity] = len(self.order)
+            self.entities[name] = entity
 
-            if entity.is_empty():
-                self.entities[name] = entity
+            if entity.is_lazy() is False and entity.is_empty():
                 if entity._stage_resolving() is False:
                     raise RuntimeError("Empty entity resolving failed")
                 entity._stage_resolved()
-            else:
-                self.entities[name] = entity
+                return
 
+            if self.is_draft is False:
+                self.locals.set_path(name, entity)
+                if entity.resolve_ctx is not None:
+                    entity.resolve_ctx.forward_def[entity.__name__] = entity
 
-                if self.is_draft is False:
-                    self.locals.set_path(name, entity)
-                    for d in self.deferred:
-                        if (<EntityType>d).resolve_ctx is not None:
-                            (<EntityType>d).resolve_ctx.add_forward(entity)
+                self._wake(entity.__name__)
+                self._wake(name)
+                self._wake(name.split(".", 1)[0])
 
-                    self.deferred.append(entity)
+            if entity.is_lazy() is True:
+                self.lazy[entity] = None
+                if self.is_draft is False:
                     self._finalize_entities()
-                else:
-                    self.deferred.append(entity)
+            else:
+                self.resolve(entity)
+
+    cdef object resolve(self, EntityType entity):
+        self.lazy.pop(entity, None)
+
+        if entity.is_empty():
+            if entity._stage_resolving() is False:
+                raise RuntimeError("Empty entity resolving failed")
+            entity._stage_resolved()
+        else:
+            self.pending[entity] = None
+            self.queue.append(entity)
+            if self.is_draft is False:
+                self._finalize_entities()
+
+    cpdef finalize(self):
+        """ Builds all lazy entities and resolves them """
+        cdef EntityType entity
+
+        while self.lazy:
+            entity = next(iter(self.lazy))
+            del self.lazy[entity]
+            entity._build()
+
+        self.wake_budget = len(self.waiting)
+        self._finalize_entities()
 
+    @property
+    def deferred(self):
+        return list(self.pending)
+
+    cdef ScopeDict forward_scope(self, dict globals, dict locals):
+        cdef tuple key = (id(globals), id(locals))
+        try:
+            return (<tuple>self.scopes[key])[2]
+        except KeyError:
+            scope = ScopeDict()
+            # keep references to dicts, so the id based key can't be reused
+            self.scopes[key] = (globals, locals, scope)
+            return scope
 
     def __getitem__(self, str name):
         return self.entities[name]
@@ -62,93 +115,160 @@ cdef class Registry:
     cpdef items(self):
         return self.entities.items()
 
+    cpdef remove(self, EntityType entity):
+        cdef str name = entity.__qname__
+        if self.entities.get(name) is not entity:
+            raise ValueError("entity is not registered: %r" % entity)
+
+        del self.entities[name]
+        self.order.pop(entity, None)
+        self.lazy.pop(entity, None)
+        self.pending.pop(entity, None)
+        self.locals.del_path(name, entity)
+        self._unindex_foreign_keys(entity)
+
     # TODO: remove, and replace with get_referenced_foreign_keys
     cpdef list get_foreign_key_refs(self, EntityAttribute column):
-        cdef list result = []
-        cdef list per_entity
-        cdef EntityType entity
-        cdef EntityAttribute field
-        cdef EntityAttributeExt ext
-        cdef ForeignKey fk
+        # only the built entities are indexed
+        if self.lazy:
+            self.finalize()
 
-        for entity in self.entities.values():
-            per_entity = []
+        cdef dict refs = self.fk_refs.get((column.get_entity(), column._name_))
+        if not refs:
+            return []
+        return [(entity, list(keys)) for entity, keys in sorted(refs.items(), key=self._order_key)]
 
-            for field in entity.__fields__:
-                for ext in field._exts_:
-                    if isinstance(ext, ForeignKey):
-                        fk = <ForeignKey>ext
-                        if fk.ref.get_entity() is column.get_entity() and fk.ref._name_ == column._name_:
-                            per_entity.append(field._key_)
+    cpdef list get_referenced_foreign_keys(self, EntityAttribute column):
+        if self.lazy:
+            self.finalize()
 
-            if len(per_entity) != 0:
-                result.append((entity, per_entity))
+        cdef dict refs = self.fk_groups.get((column.get_entity(), column._name_))
+        if not refs:
+            return []
+        return [(entity, list(groups)) for entity, groups in sorted(refs.items(), key=self._order_key)]
 
-        return result
+    def _order_key(self, tuple item):
+        return self.order.get(item[0], -1)
 
-    cpdef list get_referenced_foreign_keys(self, EntityAttribute column):
-        cdef list result = []
-        cdef list per_entity
-        cdef EntityType entity
+    cdef _index_foreign_keys(self, EntityType entity):
         cdef EntityAttribute field
         cdef EntityAttributeExt ext
         cdef EntityAttributeExtGroup group
         cdef ForeignKey fk
+        cdef list per_entity
 
-        for entity in self.entities.values():
-            per_entity = []
-
-            for group in entity.__extgroups__.values():
-                if group in per_entity:
-                    continue
-                elif group.type is ForeignKey:
-                    for fk in group.items:
-                        if fk.ref.get_entity() is column.get_entity() and fk.ref._name_ == column._name_:
-                            per_entity.append(group)
-
-            if len(per_entity) != 0:
-                result.append((entity, per_entity))
-
-        return result
+        for field in entity.__fields__:
+            for ext in field._exts_:
+                if isinstance(ext, ForeignKey):
+                    fk = <ForeignKey>ext
+                    key = (fk.ref.get_entity(), fk.ref._name_)
+                    (<dict>self.fk_refs.setdefault(key, {})).setdefault(entity, []).append(field._key_)
+
+        for group in entity.__extgroups__.values():
+            if group.type is ForeignKey:
+                for fk in group.items:
+                    key = (fk.ref.get_entity(), fk.ref._name_)
+                    per_entity = (<dict>self.fk_groups.setdefault(key, {})).setdefault(entity, [])
+                    if group not in per_entity:
+                        per_entity.append(group)
+
+    cdef _unindex_foreign_keys(self, EntityType entity):
+        for index in (self.fk_refs, self.fk_groups):
+            for key, refs in list((<dict>index).items()):
+                if (<dict>refs).pop(entity, None) is not None and not refs:
+                    del (<dict>index)[key]
+            # drop references to the removed entity columns
+            for key in [k for k in (<dict>index) if k[0] is entity]:
+                del (<dict>index)[key]
 
-    # TODO: optimize
     cdef _finalize_entities(self):
         if self.in_resolving is True:
             return
         self.in_resolving = True
 
         cdef EntityType entity
-        cdef object deferred = self.deferred
-        cdef object nextq = deque()
-        cdef int length = len(deferred)
-        cdef int last_length = 0
-
-        while last_length != length:
-            last_length = length
 
+        try:
             while True:
-                entity = <EntityType>deferred.pop()
+                self._resolve_queue()
+
+                # names that are not entities (eg.: alias in module globals) can appear any time,
+                # so check them only after as many registrations as waiting names
+                if self.waiting and self.wake_budget >= len(self.waiting):
+                    self.wake_budget = 0
+                    if self._wake_available():
+                        continue
+                break
+        finally:
+            self.in_resolving = False
+
+        if len(self.pending) == 0:
+            for entity in self.resolved:
+                entity._stage_resolved()
+                self._index_foreign_keys(entity)
+            self.resolved = []
+            self.waiting = {}
+            self.wake_budget = 0
+            # lazy entities may use the shared forward definitions later
+            if not self.lazy:
+                self.scopes = {}
+        else:
+            self.wake_budget += 1
+
+    cdef _resolve_queue(self):
+        cdef EntityType entity
+        cdef ResolveContext ctx
+        cdef bint progress = False
+
+        while True:
+            while self.queue:
+                entity = <EntityType>self.queue.popleft()
+                if entity not in self.pending:
+                    continue
+
+                ctx = entity.resolve_ctx
+                if ctx is not None:
+                    ctx.missing.clear()
+
                 if entity._stage_resolving() is True:
+                    del self.pending[entity]
                     self.resolved.append(entity)
+                    progress = True
+                elif self.is_draft is False and ctx is not None and ctx.missing and ctx.missing.isdisjoint(self.locals):
+                    # wait until the missing name is registered
+                    for name in ctx.missing:
+                        try:
+                            (<dict>self.waiting[name])[entity] = None
+                        except KeyError:
+                            self.waiting[name] = {entity: None}
                 else:
-                    nextq.append(entity)
-                if len(deferred) == 0:
-                    break
+                    self.stalled.append(entity)
 
-            deferred = nextq
-            length = len(deferred)
-            if length == 0:
-                break
+            # entities which are not waiting for a name, may be resolved after any progress
+            if progress and self.stalled:
+                progress = False
+                self.queue.extend(self.stalled)
+                self.stalled = []
             else:
-                nextq = deque()
+                break
 
-        self.deferred = deferred
-        if len(deferred) == 0:
-            for entity in self.resolved:
-                entity._stage_resolved()
-            self.resolved = []
+    cdef _wake(self, str name):
+        cdef dict waiters = self.waiting.pop(name, None)
+        if waiters is not None:
+            self.queue.extend(waiters)
 
-        self.in_resolving = False
+    cdef bint _wake_available(self):
+        cdef EntityType entity
+        cdef bint woken = False
+
+        for name, waiters in list(self.waiting.items()):
+            for entity in waiters:
+                if entity.resolve_ctx is not None and entity.resolve_ctx.has_name(name):
+                    self._wake(name)
+                    woken = True
+                    break
+
+        return woken
 
 
 class RegistryDiffKind(Enum):
@@ -164,6 +284,9 @@ class RegistryDiffKind(Enum):
 @cython.final
 cdef class RegistryDiff:
     def __cinit__(self, Registry a, Registry b, object entity_diff, bint compare_field_position):
+        a.finalize()
+        b.finalize()
+
         self.a = a
         self.b = b
         self.changes = []
@@ -295,7 +418,7 @@ cdef class ScopeDict(dict):
         try:
             return self[key]
         except KeyError:
-            raise NameError(f"No such attribute: {key}")
+            raise NameError(f"No such attribute: {key}", name=key)
 
     cdef set_path(self, str path, object value):
         cdef list parts = path.split(".")
@@ -314,3 +437,17 @@ cdef class ScopeDict(dict):
                     raise ValueError(f"Can't set '{path}' on {self}")
 
         container[last_part] = value
+
+    cdef del_path(self, str path, object value):
+        cdef list parts = path.split(".")
+        cdef str last_part = parts.pop()
+        cdef dict container = <dict>self
+
+        for p in parts:
+            try:
+                container = <dict>container[p]
+            except (KeyError, TypeError):
+                return
+
+        if container.get(last_part) is value:
+            del container[last_part]
@@ -465,16 +465,22 @@ cdef class RelatedList(ValueStore):
         if initial is NOTSET:
             add.extend(current)
         else:
-            for ent in current:
-                if ent in initial:
-                    if ent.__state__.is_dirty:
-                        chg.append(ent)
-                else:
-                    add.append(ent)
-
-            for ent in initial:
-                if ent not in current:
-                    rem.append(ent)
+            try:
+                _related_list_diff(<list>initial, <list>current, add, rem, chg)
+            except TypeError:
+                # unhashable primary key
+                del add[:], rem[:], chg[:]
+
+                for ent in current:
+                    if ent in initial:
+                        if ent.__state__.is_dirty:
+                            chg.append(ent)
+                    else:
+                        add.append(ent)
+
+                for ent in initial:
+                    if ent not in current:
+                        rem.append(ent)
 
         if add or rem or chg:
             return (add, rem, chg)
@@ -486,6 +492,26 @@ cdef class RelatedDict(ValueStore):
     pass
 
 
+cdef _related_list_diff(list initial, list current, list add, list rem, list chg):
+    # EntityBase.__eq__ compares primary keys, so index both sides by pk once
+    cdef EntityBase ent
+    cdef list initial_pks = [ent.__pk__ for ent in initial]
+    cdef list current_pks = [ent.__pk__ for ent in current]
+    cdef set initial_set = set(initial_pks)
+    cdef set current_set = set(current_pks)
+
+    for ent, pk in zip(current, current_pks):
+        if pk in initial_set:
+            if ent.__state__.is_dirty:
+                chg.append(ent)
+        else:
+            add.append(ent)
+
+    for ent, pk in zip(initial, initial_pks):
+        if pk not in current_set:
+            rem.append(ent)
+
+
 cdef class Loading(EntityAttributeExt):
     def __cinit__(self, *, bint always=False, list fields=None):
         self.always = always
@@ -11,10 +11,12 @@ cdef class ResolveContext:
     cdef dict globals
     cdef ScopeDict forward_def
     cdef EntityType entity
+    cdef set missing
 
     cdef object forward_ref(self, object forward_ref)
-    cdef object add_forward(self, EntityType entity)
     cdef object eval(self, str expr, dict locals)
+    cdef object _add_missing(self, object error)
+    cdef bint has_name(self, str name)
     cdef object _compile(self, str expr)
     cdef object _eval(self, object code, dict locals)
     cdef object _fast_path(self, str expr, dict locals)
@@ -32,34 +32,52 @@ cdef class ResolveContext:
     def __cinit__(self, EntityType entity, object frame):
         self.entity = entity
         self.registry = entity.get_registry()
-        self.forward_def = ScopeDict()
+        self.missing = set()
 
         cdef dict locals
         cdef dict globals
         if frame is not None:
             self.locals = frame.f_locals
             self.globals = frame.f_globals
+            # entities defined in the same scope share the forward definitions
+            self.forward_def = self.registry.forward_scope(self.globals, self.locals)
         else:
             self.locals = {}
             self.globals = {}
+            self.forward_def = ScopeDict()
 
     cdef object forward_ref(self, object forward_ref):
         cdef dict extra = ScopeDict(self.forward_def)
         extra.update(self.registry.locals)
         extra[self.entity.__name__] = self.entity
-        return new_instance_from_forward(forward_ref, extra)
-
-    cdef object add_forward(self, EntityType entity):
-        cdef ResolveContext other = entity.resolve_ctx
-        if other is not None:
-            if self.globals is other.globals and self.locals is other.locals:
-                self.forward_def[entity.__name__] = entity
+        try:
+            return new_instance_from_forward(forward_ref, extra)
+        except NameError as e:
+            self._add_missing(e)
+            raise
 
     cdef object eval(self, str expr, dict locals):
-        if IS_FAST_PATH(expr):
-            return self._fast_path(expr, locals)
-        else:
-            return self._eval(self._compile(expr), locals)
+        try:
+            if IS_FAST_PATH(expr):
+                return self._fast_path(expr, locals)
+            else:
+                return self._eval(self._compile(expr), locals)
+        except NameError as e:
+            self._add_missing(e)
+            raise
+
+    cdef object _add_missing(self, object error):
+        name = getattr(error, "name", None)
+        if name:
+            self.missing.add(name)
+
+    cdef bint has_name(self, str name):
+        return name == self.entity.__name__ \
+            or name in self.locals \
+            or name in self.registry.locals \
+            or name in self.globals \
+            or name in self.forward_def \
+            or name in BUILTINS
 
     cdef object _compile(self, str expr):
         try:
@@ -129,7 +147,7 @@ cdef class ResolveContext:
         except KeyError:
             pass
 
-        raise NameError(f"'{key}' not found in resolve context")
+        raise NameError(f"'{key}' not found in resolve context", name=key)
 
     def __getitem__(self, key):
         return self.get_item(key)
@@ -25,3 +25,7 @@ cdef class OnUpdateTrigger(Trigger):
 
 cdef class PolymorphParentDeleteTrigger(Trigger):
     cdef readonly EntityType parent_entity
+
+
+cdef class ChangeNotifyTrigger(Trigger):
+    cdef readonly str channel
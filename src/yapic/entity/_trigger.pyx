@@ -74,6 +74,27 @@ cdef class PolymorphParentDeleteTrigger(Trigger):
         return f"YT-{entity.__name__}-{self.name}"
 
 
+CHANGE_NOTIFY_CHANNEL = "entity_changes"
+
+
+cdef class ChangeNotifyTrigger(Trigger):
+    """ Sends the primary key of the changed rows to the given channel, enabled with ``notify`` entity meta """
+
+    def __init__(self, str channel=None):
+        super().__init__(
+            name="notify",
+            after="INSERT OR UPDATE OR DELETE",
+            for_each="ROW"
+        )
+        self.channel = channel or CHANGE_NOTIFY_CHANNEL
+
+    cdef str get_unique_name(self, EntityType entity):
+        if self.unique_name:
+            return self.unique_name
+        pk = ",".join([attr._name_ for attr in entity.__pk__])
+        return f"YT-{entity.__name__}-{self.name}-{short_hash(self.channel + '|' + pk)}"
+
+
 cdef str long_hash(str val):
     md5 = hashlib.md5(val.encode("UTF-8"))
     return md5.hexdigest()
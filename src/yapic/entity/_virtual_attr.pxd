@@ -10,6 +10,7 @@ cdef class VirtualAttribute(EntityAttribute):
     cdef readonly object _val
     cdef readonly object _order
     cdef readonly tuple _deps
+    cdef readonly bint _cache
     cdef object _source
 
     cdef Expression get_value_expr(self, object query)
@@ -1,12 +1,13 @@
 import operator
 
-from ._entity cimport EntityAttribute, EntityAttributeImpl, EntityBase, NOTSET
+from ._entity cimport EntityAttribute, EntityAttributeImpl, EntityBase, EntityState, NOTSET
 from ._expression cimport Expression, Visitor, BinaryExpression, ConstExpression, OrderExpression
 from ._expression import asc, desc
 
 
 cdef class VirtualAttribute(EntityAttribute):
-    def __cinit__(self, *args, get, set=None, delete=None, compare=None, value=None, order=None, depends=None):
+    def __cinit__(self, *args, get, set=None, delete=None, compare=None, value=None, order=None, depends=None,
+                  bint cache=False):
         self._get = get
         self._set = set
         self._del = delete
@@ -14,14 +15,24 @@ cdef class VirtualAttribute(EntityAttribute):
         self._val = value
         self._order = order
         self._deps = depends
+        self._cache = cache
         self._virtual_ = True
 
     def __get__(self, instance, owner):
+        cdef EntityState state
+
         if instance is None:
             return self
         elif isinstance(instance, EntityBase):
-            res = (<EntityBase>instance).__state__.get_value(self)
+            state = (<EntityBase>instance).__state__
+            res = state.get_value(self)
             if res is NOTSET:
+                if self._cache:
+                    res = state.get_virtual_cache(self)
+                    if res is NOTSET:
+                        res = self._get(instance)
+                        state.set_virtual_cache(self, res)
+                    return res
                 return self._get(instance)
             else:
                 return res
@@ -48,7 +59,8 @@ cdef class VirtualAttribute(EntityAttribute):
             compare=self._cmp,
             value=self._val,
             order=self._order,
-            depends=self._deps)
+            depends=self._deps,
+            cache=self._cache)
 
     def compare(self, fn):
         self._cmp = fn
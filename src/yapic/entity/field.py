@@ -11,7 +11,7 @@ from ._entity import Entity, EntityAttribute, EntityAttributeExt
 from ._expression import const
 from ._field import AutoIncrement, Check, Unique
 from ._field import Field as _Field
-from ._field import ForeignKey, Index, PrimaryKey, ForeignKeyList
+from ._field import ForeignKey, Index, LazyDecode, PrimaryKey, ForeignKeyList, ServerGenerated
 from ._field_impl import ArrayImpl as _ArrayImpl
 from ._field_impl import AutoImpl, BoolImpl, BytesImpl
 from ._field_impl import ChoiceImpl as _ChoiceImpl
@@ -194,10 +194,10 @@ class _UpdatedTimeExt(EntityAttributeExt):
 class UpdatedTime(Field[DateTimeTzImpl, datetime, datetime]):
     def __new__(cls, *args, **kwargs):
         field = Field.__new__(cls, *args, **kwargs)
-        return field // _UpdatedTimeExt()
+        return field // _UpdatedTimeExt() // ServerGenerated()
 
 
-def virtual(fn=None, *, depends: Optional[Union[list, tuple, str]] = None) -> VirtualAttribute:
+def virtual(fn=None, *, depends: Optional[Union[list, tuple, str]] = None, cache: bool = False) -> VirtualAttribute:
     if fn is not None:
         return VirtualAttribute(VirtualAttributeImpl(), get=fn)
     else:
@@ -208,6 +208,6 @@ def virtual(fn=None, *, depends: Optional[Union[list, tuple, str]] = None) -> Vi
                 depends = tuple(depends)
 
         def factory(fn):
-            return VirtualAttribute(VirtualAttributeImpl(), get=fn, depends=depends)
+            return VirtualAttribute(VirtualAttributeImpl(), get=fn, depends=depends, cache=cache)
 
         return factory
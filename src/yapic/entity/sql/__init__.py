@@ -5,4 +5,9 @@ from .pgsql._query_compiler import PostgreQueryCompiler  # noqa
 from .pgsql._trigger import PostgreTrigger  # noqa
 from .pgsql._connection import PostgreConnection  # noqa
 from ._sync import sync  # noqa
+from .pgsql._migration import MigrationPlan, MigrationStep, plan_migration  # noqa
 from ._query import *  # noqa
+from ._observer import QueryEvent, QueryObserver  # noqa
+from ._explain import AutoExplain, ExplainResult, PlanNode  # noqa
+from ._query_cache import QueryCache  # noqa
+from ._router import Router  # noqa
@@ -1,26 +1,79 @@
+from typing import Any, Iterable, List, Literal, Optional, Sequence, Union
+
 from ._query import Query
 from ._query_context import QueryContext
+from ._observer import QueryObserver
+from ._explain import AutoExplain, ExplainResult
+from ._query_cache import QueryCache
 from .._entity import EntityBase, EntityType, Entity
 from .._registry import Registry, RegistryDiff
+from .._field import Field
+
+Returning = Optional[Union[Literal["all"], Literal["generated"], Literal["none"], Sequence[Union[str, Field]]]]
 
 
 class Connection:
-    def select(self, q: Query, *, prefetch=None, timeout=None) -> QueryContext:
+    read_isolation: str
+
+    def add_observer(self, observer: QueryObserver) -> None:
+        pass
+
+    def remove_observer(self, observer: QueryObserver) -> None:
+        pass
+
+    def enable_auto_explain(self, threshold: float, *, size: int = 100, analyze: bool = False,
+                            buffers: bool = False) -> AutoExplain:
+        pass
+
+    def disable_auto_explain(self) -> None:
+        pass
+
+    def enable_query_cache(self, cache: Optional[QueryCache] = None, *, size: int = 1000,
+                           ttl: Optional[float] = None) -> QueryCache:
+        pass
+
+    def disable_query_cache(self) -> None:
+        pass
+
+    async def explain(self, q: Query, analyze: bool = False, buffers: bool = False) -> ExplainResult:
         pass
 
-    async def insert(self, entity: EntityBase) -> bool:
+    async def load_polymorph(self, entities: Iterable[EntityBase]) -> list[EntityBase]:
+        """
+        Replaces the polymorph entities with the instance of its concrete type
+        """
+
+    def select(self, q: Query, *, prefetch=None, timeout=None, cache: Union[bool, float] = False) -> QueryContext:
         pass
 
-    async def insert_or_update(self, entity: EntityBase) -> bool:
+    async def select_many(self, *queries: Query, timeout=None) -> List[List[Any]]:
+        """
+        Execute independent queries in one round trip (and in one snapshot),
+        returns the list of rows for each query
+        """
+
+    async def insert(self, entity: EntityBase, *, returning: Returning = None) -> bool:
         pass
 
-    async def update(self, entity: EntityBase) -> bool:
+    async def insert_or_update(self, entity: EntityBase, *, returning: Returning = None) -> bool:
+        pass
+
+    async def upsert_many(self, entities: Iterable[EntityBase], *,
+                          conflict: Optional[Sequence[Union[str, Field]]] = None,
+                          update: Union[Literal["all"], Literal["none"], Sequence[Union[str, Field]]] = "all",
+                          returning: Returning = None) -> list[EntityBase]:
+        """
+        Insert or update many entities with multi-row ``INSERT ... ON CONFLICT`` statements,
+        returns the skipped entities (``DO NOTHING``)
+        """
+
+    async def update(self, entity: EntityBase, *, returning: Returning = None) -> bool:
         pass
 
     async def delete(self, entity: EntityBase) -> bool:
         pass
 
-    async def save(self, entity: EntityBase) -> bool:
+    async def save(self, entity: EntityBase, *, returning: Returning = None) -> bool:
         pass
 
     async def reflect(self, base: EntityType = Entity) -> Registry:
@@ -5,15 +5,19 @@ from yapic.entity._entity cimport EntityType, EntityAttribute, NOTSET
 from yapic.entity._entity_diff cimport EntityDiff
 from yapic.entity._entity_operation cimport save_operations
 from yapic.entity._entity_operation import EntityOperation
-from yapic.entity._entity cimport EntityType, EntityBase, EntityState
+from yapic.entity._entity cimport EntityType, EntityBase, EntityState, Polymorph
 from yapic.entity._entity import Entity
 from yapic.entity._registry cimport Registry, RegistryDiff
 from yapic.entity._field cimport Field, StorageType, PrimaryKey
-from yapic.entity._field_impl cimport CompositeImpl, NamedTupleImpl
+from yapic.entity._field_impl cimport CompositeImpl, NamedTupleImpl, JsonImpl
 from yapic.entity._expression cimport Expression, PathExpression, RawExpression
+from yapic.entity._expression import and_, or_
 
-from ._query cimport Query, QueryCompiler
+from ._query cimport Query, QueryCompiler, QueryLoad
 from ._query_context cimport QueryContext
+from ._observer cimport QueryEvent
+from ._explain import AutoExplain
+from ._query_cache import QueryCache, CachedResult, cache_key
 from ._dialect cimport Dialect
 
 
@@ -22,14 +26,144 @@ insert_logger = getLogger("yapic.entity.sql.insert")
 update_logger = getLogger("yapic.entity.sql.update")
 delete_logger = getLogger("yapic.entity.sql.delete")
 
+# above this number of changed paths, the whole json document is written
+JSON_PATCH_MAX_PATHS = 16
+
+# maximum number of bind parameters in one statement (postgres protocol limit)
+UPSERT_MAX_PARAMS = 32767
+
 
 class Connection:
     def __init__(self, dialect):
         self.dialect = dialect
-
-    def select(self, Query q, *, prefetch=None, timeout=None):
+        self._observers = None
+        self._auto_explain = None
+        self._query_cache = None
+        # entities written in the current transaction, invalidated again at the end of the transaction
+        self._xact_invalidated = None
+        # isolation level of the read only transaction, what wraps the selects outside of a transaction
+        self.read_isolation = "serializable"
+
+    def add_observer(self, observer):
+        """ Register a ``QueryObserver``, what called after every query with the query timings """
+        if self._observers is None:
+            self._observers = (observer,)
+        elif observer not in self._observers:
+            self._observers = self._observers + (observer,)
+
+    def remove_observer(self, observer):
+        if self._observers is not None and observer in self._observers:
+            self._observers = tuple(o for o in self._observers if o is not observer) or None
+
+    def enable_auto_explain(self, threshold, *, size=100, analyze=False, buffers=False):
+        """ Capture the plan of the selects, what slower than ``threshold`` seconds into ``AutoExplain.entries`` """
+        self.disable_auto_explain()
+        self._auto_explain = AutoExplain(threshold, size=size, analyze=analyze, buffers=buffers)
+        self.add_observer(self._auto_explain)
+        return self._auto_explain
+
+    def disable_auto_explain(self):
+        if self._auto_explain is not None:
+            self.remove_observer(self._auto_explain)
+            self._auto_explain = None
+
+    def enable_query_cache(self, cache=None, *, size=1000, ttl=None):
+        """ Cache the result of the selects, what called with ``cache=True``,
+        the cache can be shared between connections
+        """
+        if cache is None:
+            cache = QueryCache(size, ttl)
+        self._query_cache = cache
+        return cache
+
+    def disable_query_cache(self):
+        self._query_cache = None
+
+    def _invalidate_query_cache(self, EntityType ent):
+        if self._query_cache is not None:
+            self._query_cache.invalidate(ent)
+            # until the commit other connections can read and cache the old rows
+            if self._top_xact is not None:
+                if self._xact_invalidated is None:
+                    self._xact_invalidated = {ent}
+                else:
+                    self._xact_invalidated.add(ent)
+
+    def _transaction_finished(self):
+        """ Called after commit / rollback of any transaction """
+        if self._xact_invalidated is not None and self._top_xact is None:
+            entities = self._xact_invalidated
+            self._xact_invalidated = None
+            if self._query_cache is not None:
+                self._query_cache.invalidate(*entities)
+
+    async def explain(self, Query q, analyze=False, buffers=False):
         cdef QueryCompiler qc = self.dialect.create_query_compiler()
         sql, params = qc.compile_select(q)
+        return await self._explain(sql, params, qc.query, analyze, buffers)
+
+    async def load_polymorph(self, entities):
+        """ Replaces the polymorph entities with the instance of its concrete type,
+        eg. after select with ``lazy-subtype`` polymorph loading
+        """
+        return await self._load_polymorph(list(entities), None, None)
+
+    async def _load_polymorph(self, list entities, QueryLoad load, set reducer):
+        cdef dict groups = {}
+        cdef dict by_pk
+        cdef EntityType concrete
+        cdef Query q
+
+        for i, entity in enumerate(entities):
+            concrete = _concrete_type(entity, reducer)
+            if concrete is None:
+                continue
+
+            pk = entity.__pk__
+            if not pk:
+                continue
+
+            try:
+                by_pk = groups[concrete]
+            except KeyError:
+                by_pk = groups[concrete] = {}
+
+            try:
+                by_pk[pk].append(i)
+            except KeyError:
+                by_pk[pk] = [i]
+
+        # one query per concrete type, the rows of the concrete type has no more children
+        for concrete, by_pk in groups.items():
+            q = Query(concrete).where(_pk_in(concrete, list(by_pk))).polymorph_loading("lazy-subtype")
+            if load:
+                q._load = load.clone()
+
+            for loaded in await self.select(q):
+                for i in by_pk.get(loaded.__pk__, ()):
+                    entities[i] = loaded
+
+        return entities
+
+    async def _explain(self, str sql, params, Query q, bint analyze, bint buffers):
+        raise NotImplementedError()
+
+    def select(self, Query q, *, prefetch=None, timeout=None, cache=False):
+        cdef QueryCompiler qc = self.dialect.create_query_compiler()
+        cdef QueryEvent event = None
+
+        cdef tuple polymorph = None
+        cursor = None
+
+        if self._observers is None:
+            sql, params = qc.compile_select(q)
+        else:
+            event = QueryEvent("select", self._observers)
+            q = q.finalize(qc)[0]
+            event.finalized()
+            sql, params = qc.compile_select(q)
+            event.compiled(sql, params, tuple(ent for ent in q._select_from if isinstance(ent, EntityType)))
+            event.query = q
 
         if select_logger.isEnabledFor(DEBUG):
             select_logger.debug(f"{sql} {params}")
@@ -42,22 +176,83 @@ class Connection:
         # pprint(qc.rcos_list)
         # print("=" * 50)
 
+        if qc.query._poly_select_in is not None:
+            polymorph = (tuple(qc.query._poly_select_in), qc.query._load, qc.query._reduce_children)
+
+        # locking selects and the selects in transaction (uncommitted rows) are never cached
+        if cache is not False and self._query_cache is not None and qc.query._lock is None and self._top_xact is None:
+            key = cache_key(sql, params)
+            if key is not None:
+                cursor = CachedResult(self, self._query_cache, key, qc.query, sql, params,
+                                      None if cache is True else cache, timeout)
+
+        if cursor is None:
+            cursor = self.cursor(sql, *params, prefetch=prefetch, timeout=timeout)
+
         return QueryContext(
             self,
-            self.cursor(sql, *params, prefetch=prefetch, timeout=timeout),
-            qc.rcos_list
+            cursor,
+            qc.rcos_list,
+            event,
+            polymorph
         )
 
+    async def select_many(self, *queries, timeout=None):
+        """ Execute independent queries in one round trip (and in one snapshot),
+        returns the list of rows for each query
+        """
+        cdef QueryCompiler qc = self.dialect.create_query_compiler()
+        cdef QueryCompiler sub
+        cdef QueryContext ctx
+        cdef QueryEvent event = None
+        cdef tuple polymorph
+        cdef list result = []
+
+        if not queries:
+            return result
+
+        if self._observers is not None:
+            event = QueryEvent("select", self._observers)
+
+        sql, params, compilers = qc.compile_select_many(list(queries))
+
+        if select_logger.isEnabledFor(DEBUG):
+            select_logger.debug(f"{sql} {params}")
+
+        if event is None:
+            record = await self.fetchrow(sql, *params, timeout=timeout)
+        else:
+            # compile_time contains the finalization of the queries
+            event.compiled(sql, params, tuple(ent for sub in compilers for ent in sub.query._select_from if isinstance(ent, EntityType)))
+            record = await event.observe(self.fetchrow(sql, *params, timeout=timeout))
+
+        for i, sub in enumerate(compilers):
+            polymorph = None
+            if sub.query._poly_select_in is not None:
+                polymorph = (tuple(sub.query._poly_select_in), sub.query._load, sub.query._reduce_children)
+
+            ctx = QueryContext(self, None, sub.rcos_list, None, polymorph)
+            rows = [ctx.convert_row(row) for row in record[i]]
+            if polymorph is not None and rows:
+                rows = await ctx._resolve_polymorph(rows)
+            result.append(rows)
+
+        return result
+
     # async def create_entity(self, EntityType ent, *, drop=False):
     #     raise NotImplementedError()
 
-    async def insert(self, EntityBase entity):
+    async def insert(self, EntityBase entity, *, returning=None):
         cdef EntityType ent = type(entity)
         cdef Dialect dialect = self.dialect
         cdef list attrs = []
         cdef list names = []
         cdef list values = []
         cdef list where = []
+        cdef QueryEvent event = None
+
+        if self._observers is not None:
+            event = QueryEvent("insert", self._observers)
 
         await _collect_attrs(dialect, entity, True, attrs, names, values, where, None)
 
@@ -70,15 +265,26 @@ class Connection:
         if insert_logger.isEnabledFor(DEBUG):
             insert_logger.debug(f"{q} {p}")
 
-        return await self._exec_iou(q, p, entity, ent)
+        try:
+            if event is None:
+                return await self._exec_iou(q, p, entity, ent, returning)
+            else:
+                event.compiled(q, p, (ent,))
+                return await event.observe(self._exec_iou(q, p, entity, ent, returning))
+        finally:
+            self._invalidate_query_cache(ent)
 
-    async def insert_or_update(self, EntityBase entity):
+    async def insert_or_update(self, EntityBase entity, *, returning=None):
         cdef EntityType ent = type(entity)
         cdef Dialect dialect = self.dialect
         cdef list attrs = []
         cdef list names = []
         cdef list values = []
         cdef list where = []
+        cdef QueryEvent event = None
+
+        if self._observers is not None:
+            event = QueryEvent("insert_or_update", self._observers)
 
         await _collect_attrs(dialect, entity, True, attrs, names, values, where, None)
 
@@ -93,15 +299,106 @@ class Connection:
         elif update_logger.isEnabledFor(DEBUG):
             update_logger.debug(f"{q} {p}")
 
-        return await self._exec_iou(q, p, entity, ent)
+        try:
+            if event is None:
+                return await self._exec_iou(q, p, entity, ent, returning)
+            else:
+                event.compiled(q, p, (ent,))
+                return await event.observe(self._exec_iou(q, p, entity, ent, returning))
+        finally:
+            self._invalidate_query_cache(ent)
+
+    async def upsert_many(self, entities, *, conflict=None, update="all", returning=None):
+        """ Insert or update many entities with multi-row ``INSERT ... ON CONFLICT`` statements,
+        returns the skipped entities (``DO NOTHING``)
+        """
+        cdef Dialect dialect = self.dialect
+        cdef dict groups = {}
+        cdef list skipped = []
+        cdef list attrs
+        cdef list names
+        cdef list values
+        cdef list conflict_attrs
+        cdef list conflict_names
+        cdef list updates
+        cdef list rows
+        cdef list group
+        cdef EntityType ent
+        cdef QueryEvent event
+        cdef int chunk
+        cdef int start
+
+        for entity in entities:
+            attrs = []
+            names = []
+            values = []
+            await _collect_attrs(dialect, <EntityBase>entity, True, attrs, names, values, [], None)
+
+            # rows of one statement must have the same columns
+            key = (type(entity), tuple(names))
+            try:
+                group = groups[key]
+            except KeyError:
+                group = groups[key] = [attrs, names, [], []]
+            (<list>group[2]).append(entity)
+            (<list>group[3]).append(values)
+
+        for key, group in groups.items():
+            ent = <EntityType>key[0]
+            attrs = <list>group[0]
+            names = <list>group[1]
+            rows = <list>group[3]
+
+            if not names:
+                raise ValueError(f"Nothing to upsert: {ent!r}")
+
+            conflict_attrs = _upsert_conflict(ent, conflict, attrs)
+            conflict_names = [dialect.quote_ident((<Field>f)._name_) for f in conflict_attrs]
+            updates = _upsert_updates(dialect, ent, update, attrs, conflict_attrs)
+            # upper bound, expression values may use more or less parameters
+            chunk = max(1, UPSERT_MAX_PARAMS // len(names))
+
+            for round_entities, rows in _upsert_rounds(<list>group[2], rows, conflict_attrs):
+                start = 0
+                while start < len(rows):
+                    event = None
+                    if self._observers is not None:
+                        event = QueryEvent("insert_or_update", self._observers)
+
+                    while True:
+                        q, p = dialect.create_query_compiler() \
+                            .compile_upsert(ent, names, rows[start:start + chunk], conflict_names, updates)
+                        if len(p) <= UPSERT_MAX_PARAMS or chunk == 1:
+                            break
+                        chunk = max(1, chunk * UPSERT_MAX_PARAMS // len(p))
+
+                    if insert_logger.isEnabledFor(DEBUG):
+                        insert_logger.debug(f"{q} {p}")
+
+                    coro = self._exec_upsert(q, p, round_entities[start:start + chunk], ent, conflict_attrs, returning)
+                    start += chunk
+                    try:
+                        if event is None:
+                            skipped.extend(await coro)
+                        else:
+                            event.compiled(q, p, (ent,))
+                            skipped.extend(await event.observe(coro))
+                    finally:
+                        self._invalidate_query_cache(ent)
+
+        return skipped
 
-    async def update(self, EntityBase entity):
+    async def update(self, EntityBase entity, *, returning=None):
         cdef EntityType ent = type(entity)
         cdef Dialect dialect = self.dialect
         cdef list attrs = []
         cdef list names = []
         cdef list values = []
         cdef list where = []
+        cdef QueryEvent event = None
+
+        if self._observers is not None:
+            event = QueryEvent("update", self._observers)
 
         await _collect_attrs(dialect, entity, False, attrs, names, values, where, None)
 
@@ -114,7 +411,14 @@ class Connection:
         if update_logger.isEnabledFor(DEBUG):
             update_logger.debug(f"{q} {p}")
 
-        return await self._exec_iou(q, p, entity, ent)
+        try:
+            if event is None:
+                return await self._exec_iou(q, p, entity, ent, returning)
+            else:
+                event.compiled(q, p, (ent,))
+                return await event.observe(self._exec_iou(q, p, entity, ent, returning))
+        finally:
+            self._invalidate_query_cache(ent)
 
     async def delete(self, EntityBase entity):
         cdef EntityType ent = type(entity)
@@ -123,6 +427,10 @@ class Connection:
         cdef list names = []
         cdef list values = []
         cdef list where = []
+        cdef QueryEvent event = None
+
+        if self._observers is not None:
+            event = QueryEvent("delete", self._observers)
 
         await _collect_attrs(dialect, entity, False, attrs, names, values, where, None)
 
@@ -135,15 +443,25 @@ class Connection:
         if delete_logger.isEnabledFor(DEBUG):
             delete_logger.debug(f"{q} {p}")
 
-        return bool(await self._exec_del(q, p))
+        try:
+            if event is None:
+                return bool(await self._exec_del(q, p))
+            else:
+                event.compiled(q, p, (ent,))
+                return bool(await event.observe(self._exec_del(q, p)))
+        finally:
+            self._invalidate_query_cache(ent)
 
-    async def _exec_iou(self, str q, params, EntityBase entity, EntityType entity_t):
+    async def _exec_iou(self, str q, params, EntityBase entity, EntityType entity_t, returning=None):
         raise NotImplementedError()
 
     async def _exec_del(self, str q, params):
         raise NotImplementedError()
 
-    async def save(self, EntityBase entity):
+    async def _exec_upsert(self, str q, params, list entities, EntityType entity_t, list conflict, returning=None):
+        raise NotImplementedError()
+
+    async def save(self, EntityBase entity, *, returning=None):
         cdef EntityBase target
         cdef EntityBase src
         cdef bint res = False
@@ -152,11 +470,11 @@ class Connection:
             if op is EntityOperation.REMOVE:
                 res = await self.delete(param)
             elif op is EntityOperation.UPDATE:
-                res = await self.update(param)
+                res = await self.update(param, returning=_returning_for(param, entity, returning))
             elif op is EntityOperation.INSERT:
-                res = await self.insert(param)
+                res = await self.insert(param, returning=_returning_for(param, entity, returning))
             elif op is EntityOperation.INSERT_OR_UPDATE:
-                res = await self.insert_or_update(param)
+                res = await self.insert_or_update(param, returning=_returning_for(param, entity, returning))
             elif op is EntityOperation.UPDATE_ATTR:
                 target = param[0]
                 src = param[2]
@@ -195,6 +513,114 @@ class Connection:
 
 
 
+cdef list _upsert_conflict(EntityType ent, object conflict, list attrs):
+    cdef list result = []
+
+    if conflict is None:
+        conflict = ent.__pk__
+
+    for item in conflict:
+        field = _upsert_field(ent, item)
+        if not any(a is field for a in attrs):
+            raise ValueError(f"Missing value of conflict field: {(<Field>field)._key_!r}")
+        result.append(field)
+
+    if not result:
+        raise ValueError(f"Missing conflict fields: {ent!r}")
+    return result
+
+
+cdef list _upsert_rounds(list entities, list rows, list conflict):
+    """ Splits the rows, so one statement does not contain the same conflict key twice
+    (``ON CONFLICT DO UPDATE command cannot affect row a second time``), the repeated
+    keys are moved to the next statement, in the original order
+    """
+    cdef list result = []
+    cdef dict seen = {}
+    cdef int idx
+
+    for i, entity in enumerate(entities):
+        key = tuple([getattr(entity, (<Field>f)._key_) for f in conflict])
+        idx = seen.get(key, 0)
+        seen[key] = idx + 1
+        if idx == len(result):
+            result.append(([], []))
+        (<list>result[idx][0]).append(entity)
+        (<list>result[idx][1]).append(rows[i])
+
+    return result
+
+
+cdef list _upsert_updates(Dialect dialect, EntityType ent, object update, list attrs, list conflict):
+    cdef list result = []
+
+    if update == "none":
+        return result
+    elif update == "all":
+        fields = [f for f in ent.__fields__ if any(a is f for a in attrs)]
+    elif isinstance(update, str):
+        raise ValueError(f"Invalid update: {update!r}")
+    else:
+        # fields without value in this group are not updated, EXCLUDED contains its default
+        fields = [f for f in (_upsert_field(ent, item) for item in update) if any(a is f for a in attrs)]
+
+    for field in fields:
+        if not any(c is field for c in conflict):
+            result.append(dialect.quote_ident((<Field>field)._name_))
+    return result
+
+
+cdef Field _upsert_field(EntityType ent, object item):
+    if isinstance(item, Field):
+        return <Field>item
+
+    field = getattr(ent, item, None)
+    if not isinstance(field, Field):
+        raise ValueError(f"Unknown field: {item!r}")
+    return <Field>field
+
+
+cdef inline object _returning_for(EntityBase param, EntityBase entity, object returning):
+    # list of fields is only applicable for the saved entity, the related ones use its default
+    if returning is None or isinstance(returning, str) or type(param) is type(entity):
+        return returning
+    return None
+
+
+cdef EntityType _concrete_type(object entity, set reducer):
+    if not isinstance(entity, EntityBase):
+        return None
+
+    cdef EntityType ent = type(entity)
+    cdef Polymorph poly = ent.__polymorph__
+    cdef EntityType concrete
+
+    if poly is None or not poly.children:
+        return None
+
+    poly_id = tuple(getattr(entity, name) for name in poly.info.id_fields)
+    if reducer is not None and poly_id not in reducer:
+        return None
+
+    try:
+        concrete = poly.get_entity(poly_id)
+    except KeyError:
+        return None
+
+    if concrete is None or concrete is ent or not issubclass(concrete, ent):
+        return None
+    return concrete
+
+
+cdef Expression _pk_in(EntityType ent, list pks):
+    cdef tuple pk_fields = ent.__pk__
+
+    if len(pk_fields) == 1:
+        return pk_fields[0].in_([pk[0] for pk in pks])
+    else:
+        return or_(*[and_(*[f == pk[i] for i, f in enumerate(pk_fields)]) for pk in pks])
+
+
 async def _collect_attrs(Dialect dialect, EntityBase entity, bint for_insert, list attrs, list names, list values, list where, Expression path):
     cdef EntityType entity_type = type(entity)
     cdef EntityState state = entity.__state__
@@ -217,7 +643,8 @@ async def _collect_attrs(Dialect dialect, EntityBase entity, bint for_insert, li
                     if not isinstance(value, EntityBase):
                         value = (<CompositeImpl>(<Field>attr)._impl_)._entity_(value)
 
-                    value = (<CompositeImpl>(<Field>attr)._impl_).data_for_write(value, for_insert)
+                    if not dialect.has_binary_codec(<Field>attr):
+                        value = (<CompositeImpl>(<Field>attr)._impl_).data_for_write(value, for_insert)
 
                     if isinstance(value, EntityBase):
                         if path is None:
@@ -232,6 +659,9 @@ async def _collect_attrs(Dialect dialect, EntityBase entity, bint for_insert, li
                         await _collect_attrs(dialect, value, True, attrs, names, values, where, spath)
                         continue
 
+                if not for_insert and path is None and isinstance(attr._impl_, JsonImpl):
+                    value = _json_patch(dialect, <Field>attr, state, value)
+
                 values.append(dialect.encode_value(attr, value))
 
             attrs.append(attr)
@@ -289,6 +719,18 @@ async def _collect_attrs(Dialect dialect, EntityBase entity, bint for_insert, li
                     values.pop(existing_pk_idx)
 
 
+cdef object _json_patch(Dialect dialect, Field field, EntityState state, object value):
+    cdef list changes = (<JsonImpl>field._impl_).dirty_paths(state.get_initial_value(field), value, JSON_PATCH_MAX_PATHS)
+    if not changes:
+        return value
+
+    patch = dialect.encode_json_patch(field, dialect.quote_ident(field._name_), changes)
+    if patch is None:
+        return value
+    else:
+        return patch
+
+
 cdef str _compile_path(Dialect dialect, PathExpression path):
     cdef list res = []
 
@@ -18,6 +18,9 @@ cdef class Dialect:
     cpdef list unquote_ident(self, str ident)
     cpdef object quote_value(self, object value)
     cpdef object encode_value(self, Field field, object value)
+    cpdef object encode_json_patch(self, Field field, str name, list changes)
+    cpdef bint has_binary_codec(self, Field field)
+    cpdef object finalize_key(self)
     cpdef str table_qname(self, EntityType entity)
     cpdef StorageType get_field_type(self, Field field)
     cpdef bint expression_eq(self, Expression a, Expression b)
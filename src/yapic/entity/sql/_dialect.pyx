@@ -46,6 +46,22 @@ cdef class Dialect:
         except TypeError as e:
             raise TypeError(f"Can't encode '{field._name_}' value '{value}': {str(e)}")
 
+    cpdef object encode_json_patch(self, Field field, str name, list changes):
+        """ Returns an expression, what applies the changes (see ``JsonImpl.dirty_paths``) on the json column,
+        or None when partial update is not supported
+        """
+        return None
+
+    cpdef bint has_binary_codec(self, Field field):
+        """ Composite field, what can be written and read as a single value """
+        return False
+
+    cpdef object finalize_key(self):
+        """ Queries finalized by dialects with equal keys are interchangeable,
+        every connection has its own dialect instance, so the key must not be the instance itself
+        """
+        return type(self)
+
     cpdef bint expression_eq(self, Expression a, Expression b):
         qc = self.create_query_compiler()
         return qc.visit(a) == qc.visit(b)
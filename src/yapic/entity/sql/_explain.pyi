@@ -0,0 +1,53 @@
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from .._relation import Relation
+from ._observer import QueryEvent, QueryObserver
+
+
+class PlanNode:
+    data: Dict[str, Any]
+    node_type: str
+    relation_name: Optional[str]
+    alias: Optional[str]
+    parent_relationship: Optional[str]
+    subplan_name: Optional[str]
+    startup_cost: float
+    total_cost: float
+    plan_rows: int
+    actual_startup_time: Optional[float]
+    actual_total_time: Optional[float]
+    actual_rows: Optional[int]
+    actual_loops: Optional[int]
+    relation: Optional[Relation]
+    children: List["PlanNode"]
+
+    def walk(self) -> Iterator["PlanNode"]:
+        pass
+
+
+class ExplainResult:
+    sql: str
+    params: Any
+    data: Dict[str, Any]
+    planning_time: Optional[float]
+    execution_time: Optional[float]
+    plan: PlanNode
+
+    def walk(self) -> Iterator[PlanNode]:
+        pass
+
+    def relation_nodes(self, relation: Relation) -> List[PlanNode]:
+        pass
+
+
+class AutoExplainEntry:
+    event: QueryEvent
+    result: Optional[ExplainResult]
+    error: Optional[Exception]
+
+
+class AutoExplain(QueryObserver):
+    threshold: float
+    analyze: bool
+    buffers: bool
+    entries: Deque[AutoExplainEntry]
@@ -0,0 +1,173 @@
+from collections import deque
+
+from yapic.entity._entity cimport EntityType
+from yapic.entity._expression cimport AliasExpression
+
+from ._query cimport Query
+from ._observer cimport QueryObserver, QueryEvent
+
+
+SUBPLAN_RELATIONSHIPS = ("SubPlan", "InitPlan")
+
+
+class PlanNode:
+    """ One node of the ``EXPLAIN (FORMAT JSON)`` output """
+
+    def __init__(self, dict data):
+        self.data = data
+        self.node_type = data.get("Node Type")
+        self.relation_name = data.get("Relation Name")
+        self.alias = data.get("Alias")
+        self.parent_relationship = data.get("Parent Relationship")
+        self.subplan_name = data.get("Subplan Name")
+        self.startup_cost = data.get("Startup Cost")
+        self.total_cost = data.get("Total Cost")
+        self.plan_rows = data.get("Plan Rows")
+        self.actual_startup_time = data.get("Actual Startup Time")
+        self.actual_total_time = data.get("Actual Total Time")
+        self.actual_rows = data.get("Actual Rows")
+        self.actual_loops = data.get("Actual Loops")
+        # relation (One / Many), what loaded by this node, or None when the node belongs to the main query
+        self.relation = None
+        self.children = [PlanNode(child) for child in data.get("Plans", ())]
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def __repr__(self):
+        name = self.node_type
+        if self.relation_name:
+            name = f"{name} on {self.relation_name}"
+        if self.alias:
+            name = f"{name} {self.alias}"
+        if self.relation is not None:
+            name = f"{name} ({self.relation})"
+        return f"<PlanNode {name} cost={self.startup_cost}..{self.total_cost} rows={self.plan_rows}>"
+
+
+class ExplainResult:
+    def __init__(self, str sql, object params, dict data, dict relation_aliases):
+        self.sql = sql
+        self.params = params
+        self.data = data
+        self.planning_time = data.get("Planning Time")
+        self.execution_time = data.get("Execution Time")
+        self.plan = PlanNode(data["Plan"])
+        _attribute_relations(self.plan, relation_aliases, None)
+
+    def walk(self):
+        return self.plan.walk()
+
+    def relation_nodes(self, relation):
+        """ Plan nodes, what produced by the given relation """
+        return [node for node in self.plan.walk() if node.relation is relation]
+
+    def __repr__(self):
+        return f"<ExplainResult cost={self.plan.total_cost} planning={self.planning_time} execution={self.execution_time}>"
+
+
+class AutoExplainEntry:
+    def __init__(self, QueryEvent event, object result, object error):
+        self.event = event
+        self.result = result
+        self.error = error
+
+    def __repr__(self):
+        return f"<AutoExplainEntry {self.event!r} {self.result or self.error!r}>"
+
+
+class AutoExplain(QueryObserver):
+    """ Captures the plan of the selects, what slower than ``threshold`` seconds,
+    see ``Connection.enable_auto_explain``
+    """
+
+    def __init__(self, double threshold, *, int size=100, bint analyze=False, bint buffers=False):
+        self.threshold = threshold
+        self.analyze = analyze
+        self.buffers = buffers
+        self.entries = deque(maxlen=size)
+
+    def is_slow(self, QueryEvent event):
+        return event.kind == "select" and event.error is None and event.total_time >= self.threshold
+
+    async def capture(self, conn, QueryEvent event):
+        try:
+            result = await conn._explain(event.sql, event.params, event.query, self.analyze, self.buffers)
+        except Exception as e:
+            self.entries.append(AutoExplainEntry(event, None, e))
+        else:
+            self.entries.append(AutoExplainEntry(event, result, None))
+
+
+def relation_aliases(Query q, dict result=None):
+    """ Collect aliases of the relation loading subqueries from a compiled query,
+    so the plan nodes can be attributed to the relation
+    """
+    cdef AliasExpression column
+    cdef AliasExpression subq_alias
+    cdef Query col_query
+
+    if result is None:
+        result = {}
+
+    if q._relation_columns is None:
+        return result
+
+    for col in q._columns:
+        if not isinstance(col, AliasExpression):
+            continue
+
+        column = <AliasExpression>col
+        relation = q._relation_columns.get(column.value)
+        if relation is None or not isinstance(column.expr, Query):
+            continue
+
+        col_query = <Query>column.expr
+        result[column.value] = relation
+        _query_aliases(col_query, relation, result)
+
+        for src in col_query._select_from:
+            if isinstance(src, AliasExpression) and isinstance((<AliasExpression>src).expr, Query):
+                # ARRAY_AGG over the aliased subquery (Many relation)
+                subq_alias = <AliasExpression>src
+                result[subq_alias.value] = relation
+                _query_aliases(<Query>subq_alias.expr, relation, result)
+                relation_aliases(<Query>subq_alias.expr, result)
+
+        relation_aliases(col_query, result)
+
+    return result
+
+
+cdef _query_aliases(Query q, object relation, dict result):
+    if q._select_from:
+        for src in q._select_from:
+            if isinstance(src, EntityType):
+                result.setdefault(q.get_expr_alias(src), relation)
+
+    if q._joins:
+        for joined in q._joins.values():
+            if isinstance(joined[0], EntityType):
+                result.setdefault(q.get_expr_alias(joined[0]), relation)
+
+
+def _attribute_relations(node, dict aliases, object relation):
+    own = aliases.get(node.alias) if node.alias else None
+    if own is not None:
+        relation = own
+    elif node.parent_relationship in SUBPLAN_RELATIONSHIPS:
+        # ARRAY_AGG / ROW subplan, the relation known only from the scans below
+        relation = _find_relation(node, aliases) or relation
+
+    node.relation = relation
+    for child in node.children:
+        _attribute_relations(child, aliases, relation)
+
+
+def _find_relation(node, dict aliases):
+    for child in node.walk():
+        if child.alias and child.alias in aliases:
+            return aliases[child.alias]
+    return None
@@ -0,0 +1,33 @@
+import cython
+
+
+@cython.final
+cdef class QueryEvent:
+    cdef readonly str kind
+    cdef readonly str sql
+    cdef readonly object params
+    cdef readonly tuple entities
+    cdef readonly object query
+    cdef readonly double finalize_time
+    cdef readonly double compile_time
+    cdef readonly double execute_time
+    cdef readonly double first_row_time
+    cdef readonly double convert_time
+    cdef readonly double total_time
+    cdef readonly int rows
+    cdef readonly object error
+    cdef tuple observers
+    cdef double started
+    cdef double mark
+    cdef str _fingerprint
+
+    cdef object finalized(self)
+    cdef object compiled(self, str sql, object params, tuple entities)
+    cdef object executed(self)
+    cdef double convert_start(self)
+    cdef object convert_end(self, double start)
+    cdef object finish(self, object error)
+
+
+cdef class QueryObserver:
+    pass
@@ -0,0 +1,25 @@
+from typing import Any, Optional, Tuple
+
+from .._entity import EntityType
+
+
+class QueryEvent:
+    kind: str
+    sql: Optional[str]
+    params: Any
+    fingerprint: Optional[str]
+    entities: Tuple[EntityType, ...]
+    query: Any
+    finalize_time: float
+    compile_time: float
+    execute_time: float
+    first_row_time: float
+    convert_time: float
+    total_time: float
+    rows: int
+    error: Optional[BaseException]
+
+
+class QueryObserver:
+    def on_query(self, event: QueryEvent) -> None:
+        pass
@@ -0,0 +1,104 @@
+import re
+from hashlib import sha1
+from logging import getLogger
+from time import perf_counter
+
+import cython
+
+
+PARAMS_LIST = re.compile(r"\$\d+(?:\s*,\s*\$\d+)*")
+
+logger = getLogger("yapic.entity.sql.observer")
+
+
+cdef class QueryObserver:
+    """ Receives an event for every query executed on the connection,
+    see ``Connection.add_observer``
+    """
+
+    def on_query(self, QueryEvent event):
+        pass
+
+
+@cython.final
+cdef class QueryEvent:
+    """ Timings of a single query, in seconds """
+
+    def __cinit__(self, str kind, tuple observers):
+        self.kind = kind
+        self.observers = observers
+        self.entities = ()
+        self.started = perf_counter()
+        self.mark = self.started
+
+    @property
+    def fingerprint(self):
+        """ Hash of the sql, where parameter lists are collapsed, so queries with different number of
+        parameters (eg. IN lists) have the same fingerprint
+        """
+        if self._fingerprint is None and self.sql is not None:
+            self._fingerprint = sha1(PARAMS_LIST.sub("$?", self.sql).encode("utf-8")).hexdigest()[:16]
+        return self._fingerprint
+
+    cdef object finalized(self):
+        cdef double now = perf_counter()
+        self.finalize_time = now - self.mark
+        self.mark = now
+
+    cdef object compiled(self, str sql, object params, tuple entities):
+        cdef double now = perf_counter()
+        self.compile_time = now - self.mark
+        self.mark = now
+        self.sql = sql
+        self.params = params
+        self.entities = entities
+
+    cdef object executed(self):
+        cdef double now = perf_counter()
+        self.execute_time = now - self.mark
+        self.mark = now
+
+    cdef double convert_start(self):
+        cdef double start = perf_counter()
+
+        if self.rows == 0:
+            # measured from the end of execution, or from the end of compilation when
+            # the execution and the first fetch is not separable (iteration)
+            self.first_row_time = start - self.mark
+
+        self.rows += 1
+        return start
+
+    cdef object convert_end(self, double start):
+        self.convert_time += perf_counter() - start
+
+    cdef object finish(self, object error):
+        if self.observers is None:
+            return
+
+        cdef tuple observers = self.observers
+        self.observers = None
+        self.error = error
+        self.total_time = perf_counter() - self.started
+
+        for observer in observers:
+            # the failure of an observer must not change the result of the query
+            try:
+                observer.on_query(self)
+            except Exception:
+                logger.exception("Query observer failed: %r", observer)
+
+    async def observe(self, object awaitable):
+        try:
+            result = await awaitable
+        except BaseException as e:
+            self.finish(e)
+            raise
+
+        self.executed()
+        self.rows = 1 if result else 0
+        self.finish(None)
+        return result
+
+    def __repr__(self):
+        return "<QueryEvent %s %s rows=%s total=%.6f>" % (self.kind, self.fingerprint, self.rows, self.total_time)
@@ -25,13 +25,21 @@ cdef class Query(Expression):
     cdef readonly bint _as_row
     cdef readonly bint _as_json
     cdef readonly Query _parent
+    cdef readonly dict _relation_columns
+    cdef readonly str _poly_loading
+    cdef readonly list _poly_select_in
     cdef dict __expr_alias
     cdef int __alias_c
     cdef bint _allow_clone
     cdef list _rcos
     cdef list _pending_joins
+    cdef readonly bint _frozen
+    cdef tuple _finalized
 
     cpdef Query clone(self)
+    cdef Query _fork(self)
+    cdef Query _add_prefix(self, tuple prefix)
+    cdef object _join(self, object what, object condition, object type)
     cdef tuple finalize(self, QueryCompiler compiler)
     cdef str get_expr_alias(self, object expr)
     cdef EntityType _find_entity(self, EntityType entity, bint allow_parent)
@@ -89,8 +97,10 @@ cdef class QueryCompiler(Visitor):
     cdef readonly list rcos_list
 
     cpdef compile_select(self, Query query)
+    cpdef compile_select_many(self, list queries)
     cpdef compile_insert(self, EntityType entity, list attrs, list names, list values, bint inline_values=*)
     cpdef compile_insert_or_update(self, EntityType entity, list attrs, list names, list values, bint inline_values=*)
+    cpdef compile_upsert(self, EntityType entity, list names, list rows, list conflict, list updates)
     cpdef compile_update(self, EntityType entity, list attrs, list names, list values, list where, bint inline_values=*)
     cpdef compile_delete(self, EntityType entity, list attrs, list names, list values, list where, bint inline_values=*)
 
@@ -195,6 +205,10 @@ ctypedef enum RCO:
     # (GET_RECORD, record_index)
     GET_RECORD = 10
 
+    # Same as SET_ATTR_RECORD, but the value is decoded at the first access (LazyDecode)
+    # (SET_ATTR_RECORD_LAZY, EntityAttribute, record_index)
+    SET_ATTR_RECORD_LAZY = 11
+
 
 @cython.final
 @cython.freelist(1000)
@@ -94,10 +94,25 @@ class Query(Generic[ENT], Expression):
         Reduce polymorph children query by polymorph ids
         """
 
+    def polymorph_loading(
+            self, strategy: Union[Literal["joined"], Literal["select-in"], Literal["lazy-subtype"]]) -> "Query[ENT]":
+        """
+        Overrides the ``polymorph_loading`` meta of the selected polymorph entities
+        """
+
     def exclude(self, *exclude) -> "Query[ENT]":
         pass
 
     def clone(self) -> "Query[ENT]":
         pass
 
+    def freeze(self) -> "Query[ENT]":
+        """
+        Returns an immutable copy, the builder methods of the frozen query returns a new query
+        """
+
+    @property
+    def frozen(self) -> bool:
+        pass
+
 
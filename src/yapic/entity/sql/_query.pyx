@@ -2,12 +2,13 @@ import operator
 import cython
 
 from yapic.entity._entity cimport EntityType, EntityAttribute, Polymorph, get_alias_target, is_entity_alias
-from yapic.entity._field cimport Field, field_eq
+from yapic.entity._field cimport Field, LazyDecode, field_eq
 from yapic.entity._field_impl cimport CompositeImpl
 from yapic.entity._expression cimport (Expression, AliasExpression, ColumnRefExpression, OrderExpression, Visitor,
     BinaryExpression, UnaryExpression, CastExpression, CallExpression, RawExpression, PathExpression,
     ConstExpression, OverExpression)
 from yapic.entity._expression import and_
+from yapic.entity._entity import POLYMORPH_LOADING
 from yapic.entity._relation cimport Relation, RelationImpl, ManyToOne, ManyToMany, RelatedAttribute, determine_join_expr, Loading
 from yapic.entity._error cimport JoinError
 from yapic.entity._visitors cimport extract_fields, replace_fields, replace_entity, ReplacerBase
@@ -35,22 +36,36 @@ cdef class Query(Expression):
         return visitor.visit_query(self)
 
     def select_from(self, from_):
-        if self._select_from is None:
-            self._select_from = []
+        cdef Query q = self._fork()
+
+        if q._select_from is None:
+            q._select_from = []
+        elif q is not self:
+            q._select_from = list(q._select_from)
 
-        if from_ not in self._select_from:
-            self._select_from.append(from_)
+        if from_ not in q._select_from:
+            q._select_from.append(from_)
 
         if isinstance(from_, EntityType):
-            self._entities.add(from_)
+            (<EntityType>from_)._build()
+            if q is not self:
+                q._entities = set(q._entities)
+            q._entities.add(from_)
 
-        return self
+        return q
 
     def columns(self, *columns):
-        if self._columns is None:
-            self._columns = []
+        cdef Query q = self._fork()
+
+        if q._columns is None:
+            q._columns = []
+        elif q is not self:
+            q._columns = list(q._columns)
 
         for col in columns:
+            if isinstance(col, EntityType):
+                (<EntityType>col)._build()
+
             if isinstance(col, EntityType) \
                     or isinstance(col, Field) \
                     or isinstance(col, AliasExpression) \
@@ -61,103 +76,131 @@ cdef class Query(Expression):
                     or isinstance(col, OverExpression) \
                     or isinstance(col, CastExpression) \
                     or isinstance(col, Query):
-                self._columns.append(col)
+                q._columns.append(col)
             else:
                 raise ValueError("Invalid value for column: %r" % col)
 
-        return self
+        return q
 
     def where(self, *expr, **eq):
-        if self._where is None:
-            self._where = []
-
-        self._where.append(and_(*expr))
         if eq:
             raise NotImplementedError()
-        return self
+
+        cdef Query q = self._fork()
+
+        if q._where is None:
+            q._where = []
+        elif q is not self:
+            q._where = list(q._where)
+
+        q._where.append(and_(*expr))
+        return q
 
 
     def order(self, *expr):
-        if self._order is None:
-            self._order = []
+        cdef Query q = self._fork()
+
+        if q._order is None:
+            q._order = []
+        elif q is not self:
+            q._order = list(q._order)
 
         for item in expr:
             if isinstance(item, (OrderExpression, RawExpression)):
-                self._order.append(item)
+                q._order.append(item)
             elif isinstance(item, Expression):
-                self._order.append((<Expression>item).asc())
+                q._order.append((<Expression>item).asc())
             else:
                 raise ValueError("Invalid value for order: %r" % item)
 
-        return self
+        return q
 
     def group(self, *expr):
-        if self._group is None:
-            self._group = []
+        cdef Query q = self._fork()
+
+        if q._group is None:
+            q._group = []
+        elif q is not self:
+            q._group = list(q._group)
 
         for item in expr:
             if not isinstance(item, Expression):
                 raise ValueError("Invalid value for group: %r" % item)
             else:
-                self._group.append(item)
+                q._group.append(item)
 
-        return self
+        return q
 
     def having(self, *expr, **eq):
-        if self._having is None:
-            self._having = []
-
-        self._having.append(and_(*expr))
         if eq:
             raise NotImplementedError()
-        return self
+
+        cdef Query q = self._fork()
+
+        if q._having is None:
+            q._having = []
+        elif q is not self:
+            q._having = list(q._having)
+
+        q._having.append(and_(*expr))
+        return q
 
     def distinct(self, *expr):
-        if self._distinct is None:
-            self._distinct = []
+        cdef Query q = self._fork()
+
+        if q._distinct is None:
+            q._distinct = []
 
         if expr:
-            try:
-                self._prefix.remove("DISTINCT")
-            except:
-                pass
+            if q._prefix:
+                q._prefix = [p for p in q._prefix if p != "DISTINCT"]
+            return q
         else:
-            self.prefix("DISTINCT")
-        return self
+            return q._add_prefix(("DISTINCT",))
 
     def prefix(self, *prefix):
-        if self._prefix is None:
-            self._prefix = []
-
-        for p in prefix:
-            if p not in self._prefix:
-                self._prefix.append(p)
-
-        return self
+        return self._fork()._add_prefix(prefix)
 
     def suffix(self, *suffix):
-        if self._suffix is None:
-            self._suffix = []
+        cdef Query q = self._fork()
+
+        if q._suffix is None:
+            q._suffix = []
+        elif q is not self:
+            q._suffix = list(q._suffix)
 
         for s in suffix:
-            if s not in self._suffix:
-                self._suffix.append(s)
+            if s not in q._suffix:
+                q._suffix.append(s)
 
-        return self
+        return q
 
     def as_row(self, bint val=True):
-        self._as_row = val
-        if self._as_json is True and val is True:
-            self._as_json = False
-        return self
+        cdef Query q = self._fork()
+        q._as_row = val
+        if q._as_json is True and val is True:
+            q._as_json = False
+        return q
 
     def as_json(self, bint val=True):
-        self._as_json = val
-        if self._as_row is True and val is True:
-            self._as_row = False
-        return self
+        cdef Query q = self._fork()
+        q._as_json = val
+        if q._as_row is True and val is True:
+            q._as_row = False
+        return q
 
     def join(self, what, condition = None, type = "INNER"):
+        cdef Query q = self._fork()
+        if q is not self:
+            # copy-on-write, the joins of the frozen query left untouched
+            q._joins = dict(q._joins) if q._joins is not None else None
+            q._entities = set(q._entities)
+            q._pending_joins = list(q._pending_joins)
+
+        q._join(what, condition, type)
+        return q
+
+    cdef object _join(self, object what, object condition, object type):
         cdef RelationImpl impl
         cdef EntityType joined
 
@@ -170,11 +213,11 @@ cdef class Query(Expression):
             joined = impl.get_joined_alias()
 
             if joined in self._entities:
-                return self
+                return
 
             if (<Relation>what).get_entity() not in self._entities:
                 self._pending_joins.append((what, condition, type))
-                return self
+                return
 
             if isinstance(impl, ManyToMany):
                 cross_condition = (<ManyToMany>impl).across_join_expr
@@ -189,7 +232,7 @@ cdef class Query(Expression):
                     self._joins[cross_what_id] = [cross_what, cross_condition, type]
                 else:
                     if type.upper().startswith("INNER"):
-                        existing[2] = type
+                        self._joins[cross_what_id] = [existing[0], existing[1], type]
                 type = "INNER"
 
             if joined is None:
@@ -200,9 +243,10 @@ cdef class Query(Expression):
 
         elif isinstance(what, EntityType):
             joined = <EntityType>what
+            joined._build()
 
             if joined in self._entities:
-                return self
+                return
 
             if condition is None:
                 condition = determine_join(self, joined)
@@ -222,83 +266,165 @@ cdef class Query(Expression):
             self._joins[joined_id] = [joined, condition, type]
         else:
             if type.upper().startswith("INNER"):
-                existing[2] = type
-
-        return self
+                # the entry may be shared with a frozen query, so replace instead of modify
+                self._joins[joined_id] = [existing[0], existing[1], type]
 
     def limit(self, int count):
-        if self._range is None:
-            self._range = slice(0, count)
+        cdef Query q = self._fork()
+        if q._range is None:
+            q._range = slice(0, count)
         else:
-            self._range = slice(self._range.start, self._range.start + count)
-        return self
+            q._range = slice(q._range.start, q._range.start + count)
+        return q
 
     def offset(self, int offset):
-        if self._range is None:
-            self._range = slice(offset, None)
+        cdef Query q = self._fork()
+        if q._range is None:
+            q._range = slice(offset, None)
         else:
-            if self._range.stop:
-                count = self._range.stop - self._range.start
+            if q._range.stop:
+                count = q._range.stop - q._range.start
                 stop = offset + count
             else:
                 stop = None
 
-            self._range = slice(offset, stop)
-        return self
+            q._range = slice(offset, stop)
+        return q
 
     def for_update(self, *refs, bint nowait=False, bint skip=False):
-        self._lock = QueryLock(QUERY_LOCK_TYPE.UPDATE, refs, nowait, skip)
-        return self
+        cdef Query q = self._fork()
+        q._lock = QueryLock(QUERY_LOCK_TYPE.UPDATE, refs, nowait, skip)
+        return q
 
     def for_no_key_update(self, *refs, bint nowait=False, bint skip=False):
-        self._lock = QueryLock(QUERY_LOCK_TYPE.NO_KEY_UPDATE, refs, nowait, skip)
-        return self
+        cdef Query q = self._fork()
+        q._lock = QueryLock(QUERY_LOCK_TYPE.NO_KEY_UPDATE, refs, nowait, skip)
+        return q
 
     def for_share(self, *refs, bint nowait=False, bint skip=False):
-        self._lock = QueryLock(QUERY_LOCK_TYPE.SHARE, refs, nowait, skip)
-        return self
+        cdef Query q = self._fork()
+        q._lock = QueryLock(QUERY_LOCK_TYPE.SHARE, refs, nowait, skip)
+        return q
 
     def for_key_share(self, *refs, bint nowait=False, bint skip=False):
-        self._lock = QueryLock(QUERY_LOCK_TYPE.KEY_SHARE, refs, nowait, skip)
-        return self
+        cdef Query q = self._fork()
+        q._lock = QueryLock(QUERY_LOCK_TYPE.KEY_SHARE, refs, nowait, skip)
+        return q
 
     def reset_columns(self):
-        self._columns = None
-        return self
+        cdef Query q = self._fork()
+        q._columns = None
+        return q
 
     def reset_where(self):
-        self._where = None
-        return self
+        cdef Query q = self._fork()
+        q._where = None
+        return q
 
     def reset_order(self):
-        self._order = None
-        return self
+        cdef Query q = self._fork()
+        q._order = None
+        return q
 
     def reset_group(self):
-        self._group = None
-        return self
+        cdef Query q = self._fork()
+        q._group = None
+        return q
 
     def reset_range(self):
-        self._range = None
-        return self
+        cdef Query q = self._fork()
+        q._range = None
+        return q
 
     def reset_load(self):
-        self._load = QueryLoad()
-        return self
+        cdef Query q = self._fork()
+        q._load = QueryLoad()
+        return q
 
     def reset_lock(self):
-        self._lock = None
-        return self
+        cdef Query q = self._fork()
+        q._lock = None
+        return q
 
     def load(self, *load):
-        self._load.add(load)
-        return self
+        cdef Query q = self._fork()
+        if q is not self:
+            q._load = q._load.clone()
+        q._load.add(load)
+        return q
 
     def reduce_children(self, set entities):
-        if self._reduce_children is None:
-            self._reduce_children = entities
+        cdef Query q = self._fork()
+        if q._reduce_children is None:
+            q._reduce_children = entities
+        elif q is not self:
+            q._reduce_children = q._reduce_children | entities
         else:
-            self._reduce_children |= entities
+            q._reduce_children |= entities
+        return q
+
+    def polymorph_loading(self, str strategy):
+        """ Overrides the ``polymorph_loading`` meta of the selected polymorph entities """
+        if strategy not in POLYMORPH_LOADING:
+            raise ValueError(f"Invalid polymorph loading strategy: {strategy!r}")
+
+        cdef Query q = self._fork()
+        q._poly_loading = strategy
+        return q
+
+    def freeze(self):
+        """ Returns an immutable copy of this query, the builder methods of the frozen query
+        returns a new query, which shares the unchanged parts with the original one
+        """
+        if self._frozen:
+            return self
+
+        cdef Query q = self.clone()
+        q._frozen = True
+        return q
+
+    @property
+    def frozen(self):
+        return self._frozen
+
+    cdef Query _fork(self):
+        if not self._frozen:
+            return self
+
+        cdef Query q = Query.__new__(Query)
+        q._select_from = self._select_from
+        q._columns = self._columns
+        q._where = self._where
+        q._order = self._order
+        q._group = self._group
+        q._having = self._having
+        q._distinct = self._distinct
+        q._prefix = self._prefix
+        q._suffix = self._suffix
+        q._joins = self._joins
+        q._range = self._range
+        q._lock = self._lock
+        q._entities = self._entities
+        q._reduce_children = self._reduce_children
+        q._poly_loading = self._poly_loading
+        q._load = self._load
+        q._as_row = self._as_row
+        q._as_json = self._as_json
+        q._parent = self._parent
+        q._pending_joins = self._pending_joins
+        q._frozen = True
+        return q
+
+    cdef Query _add_prefix(self, tuple prefix):
+        if self._prefix is None:
+            self._prefix = []
+        elif self._frozen:
+            self._prefix = list(self._prefix)
+
+        for p in prefix:
+            if p not in self._prefix:
+                self._prefix.append(p)
+
         return self
 
     cpdef Query clone(self):
@@ -329,6 +455,7 @@ cdef class Query(Expression):
 
         q._as_row = self._as_row
         q._as_json = self._as_json
+        q._poly_loading = self._poly_loading
 
         return q
 
@@ -336,6 +463,9 @@ cdef class Query(Expression):
         if self._rcos:
             return self, self._rcos
 
+        if self._finalized is not None and self._finalized[0] == compiler.dialect.finalize_key():
+            return self._finalized[1], (<Query>self._finalized[1])._rcos
+
         if self._select_from is None:
             if self._where:
                 raise ValueError("Where not allowed when missing FROM")
@@ -356,6 +486,9 @@ cdef class Query(Expression):
             res._allow_clone = False
 
         QueryFinalizer(compiler, res).finalize()
+        if self._frozen:
+            # frozen query never changes, so the finalized query can be reused
+            self._finalized = (compiler.dialect.finalize_key(), res)
         return res, res._rcos
 
     cdef str get_expr_alias(Query self, object expr):
@@ -580,6 +713,7 @@ cdef class RowConvertOp:
         elif self.op == RCO.SET_ATTR: name = "SET_ATTR"
         elif self.op == RCO.SET_ATTR_RECORD: name = "SET_ATTR_RECORD"
         elif self.op == RCO.GET_RECORD: name = "GET_RECORD"
+        elif self.op == RCO.SET_ATTR_RECORD_LAZY: name = "SET_ATTR_RECORD_LAZY"
 
         return "<RCO:%s %r %r>" % (name, self.param1, self.param2)
 
@@ -593,6 +727,13 @@ class VirtualFallback(Exception):
         self.attr = attr
 
 
+cdef inline RowConvertOp _rco_set_attr_record(Field field, int idx):
+    if field.get_ext(LazyDecode) is not None:
+        return RowConvertOp(RCO.SET_ATTR_RECORD_LAZY, field, idx)
+    else:
+        return RowConvertOp(RCO.SET_ATTR_RECORD, field, idx)
+
+
 cdef class QueryFinalizer(Visitor):
     def __cinit__(self, QueryCompiler compiler, Query q):
         self.q = q
@@ -823,6 +964,10 @@ cdef class QueryFinalizer(Visitor):
 
         for expr in expr_list:
             if isinstance(expr, EntityType):
+                if self._poly_loading(<EntityType>expr) == "select-in":
+                    if self.q._poly_select_in is None:
+                        self.q._poly_select_in = []
+                    self.q._poly_select_in.append(len(self.rcos))
                 self.rcos.append(self._rco_for_entity(<EntityType>expr))
             elif isinstance(expr, PathExpression):
                 path = <PathExpression>expr
@@ -904,7 +1049,7 @@ cdef class QueryFinalizer(Visitor):
             if isinstance(attr, Field):
                 field = <Field>attr
 
-                if isinstance(field._impl_, CompositeImpl):
+                if isinstance(field._impl_, CompositeImpl) and not self.compiler.dialect.has_binary_codec(field):
                     rco[0:0] = self._rco_for_composite(field, (<CompositeImpl>field._impl_)._entity_)
                     rco.append(_RCO_POP)
                     rco.append(RowConvertOp(RCO.SET_ATTR, aliased.__fields__[field._index_]))
@@ -919,7 +1064,7 @@ cdef class QueryFinalizer(Visitor):
                             self.q._columns.append(field)
                             existing[field._uid_] = idx
 
-                    rco.append(RowConvertOp(RCO.SET_ATTR_RECORD, aliased.__fields__[field._index_], idx))
+                    rco.append(_rco_set_attr_record(aliased.__fields__[field._index_], idx))
             elif isinstance(attr, Relation):
                 # must have explicit load for relations
                 if load_source & (QLS.EXPLICIT | QLS.ALWAYS):
@@ -1036,6 +1181,9 @@ cdef class QueryFinalizer(Visitor):
 
         rco.extend(self._rco_for_normal_entity(entity, fields, before_create))
 
+        if self._poly_loading(entity) != "joined":
+            return rco
+
         cdef dict create_poly = self._add_poly_child(entity, fields, pk_fields)
         if create_poly:
             rco.append(_RCO_PUSH)
@@ -1108,7 +1256,7 @@ cdef class QueryFinalizer(Visitor):
             else:
                 idx = len(self.q._columns)
                 self.q._columns.append(getattr(src, f._name_))
-                rco.append(RowConvertOp(RCO.SET_ATTR_RECORD, f, idx))
+                rco.append(_rco_set_attr_record(f, idx))
 
         rco.append(RowConvertOp(RCO.CREATE_ENTITY, entity, True))
         rco.append(_RCO_PUSH)
@@ -1126,6 +1274,7 @@ cdef class QueryFinalizer(Visitor):
         cdef AliasExpression column_alias = self.visit(col_query.alias(column_name))
         cdef Query column = column_alias.expr
 
+        self._add_relation_column(column_name, relation)
         col_idx = len(self.q._columns)
         self.q._columns.append(column_alias)
 
@@ -1156,11 +1305,31 @@ cdef class QueryFinalizer(Visitor):
         cdef AliasExpression subq_alias = column._select_from[0]
         cdef Query subq = subq_alias.expr
 
+        self._add_relation_column(column_name, relation)
         col_idx = len(self.q._columns)
         self.q._columns.append(column_alias)
 
         return [RowConvertOp(RCO.CONVERT_SUB_ENTITIES, col_idx, subq._rcos), _RCO_PUSH]
 
+    def _poly_loading(self, EntityType entity):
+        if entity.__polymorph__ is None or not entity.__polymorph__.children:
+            return "joined"
+
+        # relations are loaded in subqueries, so they can only be joined
+        if self.q._parent is not None:
+            return "joined"
+
+        if self.q._poly_loading is not None:
+            return self.q._poly_loading
+
+        return get_alias_target(entity).get_meta("polymorph_loading", "joined")
+
+    def _add_relation_column(self, str column_name, Relation relation):
+        # column -> relation, what loaded by this column (used by explain)
+        if self.q._relation_columns is None:
+            self.q._relation_columns = {}
+        self.q._relation_columns[column_name] = relation
+
     def _find_column_index(self, EntityAttribute field):
         for i, c in enumerate(self.q._columns):
             if isinstance(c, EntityAttribute) and (<EntityAttribute>c)._uid_ is field._uid_:
@@ -1226,12 +1395,18 @@ cdef class QueryCompiler:
     cpdef compile_select(self, Query query):
         raise NotImplementedError()
 
+    cpdef compile_select_many(self, list queries):
+        raise NotImplementedError()
+
     cpdef compile_insert(self, EntityType entity, list attrs, list names, list values, bint inline_values=False):
         raise NotImplementedError()
 
     cpdef compile_insert_or_update(self, EntityType entity, list attrs, list names, list values, bint inline_values=False):
         raise NotImplementedError()
 
+    cpdef compile_upsert(self, EntityType entity, list names, list rows, list conflict, list updates):
+        raise NotImplementedError()
+
     cpdef compile_update(self, EntityType entity, list attrs, list names, list values, list where, bint inline_values=False):
         raise NotImplementedError()
 
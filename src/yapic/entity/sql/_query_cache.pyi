@@ -0,0 +1,32 @@
+from typing import Any, AsyncIterable, Dict, Hashable, Optional, Set, Union
+
+from .._entity import EntityType
+
+
+class QueryCache:
+    size: int
+    ttl: Optional[float]
+    hits: int
+    misses: int
+
+    def __init__(self, size: int = 1000, ttl: Optional[float] = None) -> None:
+        pass
+
+    def get(self, key: Hashable) -> Optional[list]:
+        pass
+
+    def set(self, key: Hashable, tags: Set[str], records: list, ttl: Optional[float] = None,
+            started: Optional[int] = None) -> None:
+        pass
+
+    def invalidate(self, *tags: Union[EntityType, str]) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    async def follow(self, changes: AsyncIterable[Any]) -> None:
+        pass
+
+    def __len__(self) -> int:
+        pass
@@ -0,0 +1,265 @@
+import time
+from collections import OrderedDict
+
+from yapic.entity._entity cimport EntityType, EntityAttribute, get_alias_target
+from yapic.entity._expression cimport Expression, AliasExpression, ConstExpression, RawExpression
+from yapic.entity._relation cimport Relation, RelationImpl, RelatedAttribute
+from yapic.entity._visitors cimport Walk
+
+from ._query cimport Query
+
+
+class QueryCache:
+    """ LRU cache of the select results, see ``Connection.enable_query_cache``
+
+    The raw records are stored, and converted on every hit, so the returned entities are not shared.
+    Entries are tagged with the qualified name of the queried tables.
+    """
+
+    def __init__(self, int size=1000, ttl=None):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # key -> (expires, tags, records)
+        self.entries = OrderedDict()
+        # tag -> keys
+        self.tags = {}
+        # tag -> generation of the last invalidation
+        self.invalidated = {}
+        self.generation = 0
+        self.cleared = 0
+
+    def get(self, key):
+        try:
+            expires, tags, records = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        if expires is not None and expires <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return records
+
+    def set(self, key, tags, records, ttl=None, started=None):
+        """ Store the result, unless any of its tags invalidated since ``started`` generation """
+        if started is not None:
+            if started < self.cleared:
+                return
+            for tag in tags:
+                if self.invalidated.get(tag, -1) >= started:
+                    return
+
+        if ttl is None:
+            ttl = self.ttl
+
+        self._remove(key)
+        self.entries[key] = (time.monotonic() + ttl if ttl else None, tags, records)
+        for tag in tags:
+            try:
+                self.tags[tag].add(key)
+            except KeyError:
+                self.tags[tag] = {key}
+
+        while len(self.entries) > self.size:
+            self._remove(next(iter(self.entries)))
+
+    def invalidate(self, *tags):
+        """ Remove the entries, what depends on the given entities or table names """
+        for tag in tags:
+            if isinstance(tag, EntityType):
+                tag = get_alias_target(<EntityType>tag).__qname__
+
+            self.invalidated[tag] = self.generation
+            for key in list(self.tags.get(tag, ())):
+                self._remove(key)
+        self.generation += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.tags.clear()
+        self.invalidated.clear()
+        self.generation += 1
+        self.cleared = self.generation
+
+    async def follow(self, changes):
+        """ Invalidate by an external signal, e.g.: ``await cache.follow(conn.listen_changes(User))``,
+        ``changes`` is an async iterable of entity types, table names or ``(entity_type, op, pk)`` tuples
+        """
+        async for change in changes:
+            if isinstance(change, tuple):
+                change = change[0]
+            self.invalidate(change)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+
+        for tag in entry[1]:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return f"<QueryCache size={len(self.entries)}/{self.size} hits={self.hits} misses={self.misses}>"
+
+
+class CachedResult:
+    """ Cursor factory of ``QueryContext``, what reads the result from the cache, or fetch and store all rows """
+
+    def __init__(self, conn, cache, key, Query q, str sql, list params, ttl, timeout):
+        self.conn = conn
+        self.cache = cache
+        self.key = key
+        self.q = q
+        self.sql = sql
+        self.params = params
+        self.ttl = ttl
+        self.timeout = timeout
+
+    async def _load(self):
+        records = self.cache.get(self.key)
+        if records is None:
+            started = self.cache.generation
+            records = await self.conn.fetch(self.sql, *self.params, timeout=self.timeout)
+            self.cache.set(self.key, frozenset(query_tables(self.q, set())), records, self.ttl, started)
+        return CachedCursor(records)
+
+    def __await__(self):
+        return self._load().__await__()
+
+    async def __aiter__(self):
+        cursor = await self._load()
+        for record in cursor.records:
+            yield record
+
+
+class CachedCursor:
+    def __init__(self, list records):
+        self.records = records
+        self.pos = 0
+
+    async def fetchrow(self, *, timeout=None):
+        if self.pos < len(self.records):
+            self.pos += 1
+            return self.records[self.pos - 1]
+        return None
+
+    async def fetch(self, n, *, timeout=None):
+        result = self.records[self.pos:self.pos + n]
+        self.pos += len(result)
+        return result
+
+    async def forward(self, n, *, timeout=None):
+        start = self.pos
+        self.pos = min(self.pos + n, len(self.records))
+        return self.pos - start
+
+
+def cache_key(str sql, list params):
+    """ Hashable key of the query, or ``None`` when some parameter is not hashable """
+    key = (sql, _freeze(params))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+cdef object _freeze(object value):
+    if isinstance(value, (list, tuple)):
+        return tuple([_freeze(v) for v in value])
+    return value
+
+
+cdef set query_tables(Query q, set result):
+    cdef EntityType entity
+    cdef TableCollector collector = TableCollector(result)
+
+    for entity in q._entities:
+        result.add(get_alias_target(entity).__qname__)
+
+    # relation loading and from subqueries
+    for expr in q._select_from:
+        _expr_tables(expr, result)
+
+    if q._joins:
+        for joined, condition, _ in q._joins.values():
+            _expr_tables(joined, result)
+            if condition is not None:
+                collector.visit(condition)
+
+    # subqueries of the conditions, e.g.: X.id.in_(Query(Y)...), func.EXISTS(Query(Y)...)
+    for exprs in (q._columns, q._where, q._having, q._order, q._group):
+        if exprs:
+            for expr in exprs:
+                if isinstance(expr, Expression):
+                    collector.visit(<Expression>expr)
+
+    return result
+
+
+cdef _expr_tables(object expr, set result):
+    if isinstance(expr, AliasExpression):
+        expr = (<AliasExpression>expr).expr
+
+    if isinstance(expr, Query):
+        query_tables(<Query>expr, result)
+    elif isinstance(expr, EntityType):
+        result.add(get_alias_target(<EntityType>expr).__qname__)
+
+
+cdef class TableCollector(Walk):
+    """ Collects the tables of every entity and subquery in the visited expression """
+
+    cdef set tables
+
+    def __cinit__(self, set tables):
+        self.tables = tables
+
+    def visit_query(self, Query q):
+        query_tables(q, self.tables)
+
+    def visit_field(self, EntityAttribute attr):
+        entity = attr.get_entity()
+        if entity is not None:
+            self.tables.add(get_alias_target(entity).__qname__)
+
+    def visit_relation(self, Relation relation):
+        self.visit_field(relation)
+        self.tables.add(get_alias_target((<RelationImpl>relation._impl_).get_joined_entity()).__qname__)
+
+    def visit_related_attribute(self, RelatedAttribute attr):
+        self.visit_relation(attr.__relation__)
+
+    def visit_raw(self, RawExpression expr):
+        for e in expr.exprs:
+            if isinstance(e, Expression):
+                self.visit(<Expression>e)
+
+    def visit_const(self, ConstExpression expr):
+        # in_ list
+        if isinstance(expr.value, tuple):
+            for e in expr.value:
+                if isinstance(e, Expression):
+                    self.visit(<Expression>e)
+
+    def visit_param(self, expr):
+        pass
+
+    def visit_column_ref(self, expr):
+        pass
+
+    def visit_placeholder(self, expr):
+        pass
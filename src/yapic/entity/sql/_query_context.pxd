@@ -1,4 +1,5 @@
 from ._record_converter cimport RCState
+from ._observer cimport QueryEvent
 
 
 cdef class QueryContext:
@@ -6,5 +7,11 @@ cdef class QueryContext:
     cdef object cursor_factory
     cdef list rcos_list
     cdef RCState rc_state
+    cdef QueryEvent event
+    cdef tuple polymorph
+    cdef bint cached
 
     cdef convert_row(self, object row)
+    cdef object _cursor(self)
+    cdef object _transaction(self)
+    cdef object _finish(self, object error)
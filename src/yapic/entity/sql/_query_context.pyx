@@ -11,17 +11,26 @@ from yapic.entity._error cimport MultipleRows, MissingRow
 from ._dialect cimport Dialect
 from ._record_converter cimport RCState
 from ._record_converter import convert_record
+from ._query_cache import CachedResult
 
 
 # TODO: ne kérdezze le egyszerre az összes rekordot, hanem csak X-enként
 # https://github.com/MagicStack/asyncpg/issues/738
 
+# number of rows, what resolved together with select-in polymorph loading
+POLYMORPH_BATCH_SIZE = 100
+
+
 cdef class QueryContext:
-    def __cinit__(self, conn, cursor_factory, list rcos_list):
+    def __cinit__(self, conn, cursor_factory, list rcos_list, QueryEvent event=None, tuple polymorph=None):
         self.conn = conn
         self.cursor_factory = cursor_factory
         self.rcos_list = rcos_list
         self.rc_state = RCState(conn)
+        self.event = event
+        self.polymorph = polymorph
+        # cached result is read without transaction
+        self.cached = isinstance(cursor_factory, CachedResult)
 
     async def fetch(self, num=None, *, timeout=None):
         cdef list rows = []
@@ -30,63 +39,214 @@ cdef class QueryContext:
         return rows
 
     async def fetchrow(self, *, timeout=None):
-        async with ensure_transaction(self.conn):
-            cursor = await self.cursor_factory
-            row = await cursor.fetchrow(timeout=timeout)
-            if row:
-                return self.convert_row(row)
-            else:
-                return None
+        try:
+            async with self._transaction():
+                cursor = await self._cursor()
+                row = await cursor.fetchrow(timeout=timeout)
+                if row:
+                    result = self.convert_row(row)
+                    if self.polymorph is not None:
+                        result = (await self._resolve_polymorph([result]))[0]
+                else:
+                    result = None
+        except BaseException as e:
+            self._finish(e)
+            raise
+
+        pending = self._finish(None)
+        if pending is not None:
+            await pending
+        return result
 
     async def forward(self, num, *, timeout=None):
-        async with ensure_transaction(self.conn):
-            cursor = await self.cursor_factory
-            return await cursor.forward(num, timeout=timeout)
+        try:
+            async with self._transaction():
+                cursor = await self._cursor()
+                result = await cursor.forward(num, timeout=timeout)
+        except BaseException as e:
+            self._finish(e)
+            raise
+
+        pending = self._finish(None)
+        if pending is not None:
+            await pending
+        return result
 
     async def fetchval(self, column=0, *, timeout=None):
-        async with ensure_transaction(self.conn):
-            cursor = await self.cursor_factory
-            row = await cursor.fetchrow(timeout=timeout)
-            return row[column]
+        try:
+            async with self._transaction():
+                cursor = await self._cursor()
+                row = await cursor.fetchrow(timeout=timeout)
+                result = row[column]
+        except BaseException as e:
+            self._finish(e)
+            raise
+
+        pending = self._finish(None)
+        if pending is not None:
+            await pending
+        return result
 
     async def first(self, *, timeout=None):
-        async with ensure_transaction(self.conn):
-            cursor = await self.cursor_factory
-            row = await cursor.fetchrow(timeout=timeout)
-            if row is not None:
-                return self.convert_row(row)
-            else:
-                return None
+        try:
+            async with self._transaction():
+                cursor = await self._cursor()
+                row = await cursor.fetchrow(timeout=timeout)
+                if row is not None:
+                    result = self.convert_row(row)
+                    if self.polymorph is not None:
+                        result = (await self._resolve_polymorph([result]))[0]
+                else:
+                    result = None
+        except BaseException as e:
+            self._finish(e)
+            raise
+
+        pending = self._finish(None)
+        if pending is not None:
+            await pending
+        return result
 
     async def one(self, *, timeout=None):
         cdef list row
         cdef int rl
-        async with ensure_transaction(self.conn):
-            cursor = await self.cursor_factory
-            row = await cursor.fetch(2, timeout=timeout)
-            rl = len(row)
-            if rl == 1:
-                return self.convert_row(row[0])
-            elif rl == 0:
-                raise MissingRow("Not found any row for the given criteria")
-            else:
-                raise MultipleRows("Multiple rows found for the given criteria")
+
+        try:
+            async with self._transaction():
+                cursor = await self._cursor()
+                row = await cursor.fetch(2, timeout=timeout)
+                rl = len(row)
+                if rl == 1:
+                    result = self.convert_row(row[0])
+                    if self.polymorph is not None:
+                        result = (await self._resolve_polymorph([result]))[0]
+                elif rl == 0:
+                    raise MissingRow("Not found any row for the given criteria")
+                else:
+                    raise MultipleRows("Multiple rows found for the given criteria")
+        except BaseException as e:
+            self._finish(e)
+            raise
+
+        pending = self._finish(None)
+        if pending is not None:
+            await pending
+        return result
 
     cdef convert_row(self, object row):
-        return convert_record(row, self.rcos_list, self.rc_state)
+        cdef double start
+
+        if self.event is None:
+            return convert_record(row, self.rcos_list, self.rc_state)
+        else:
+            start = self.event.convert_start()
+            result = convert_record(row, self.rcos_list, self.rc_state)
+            self.event.convert_end(start)
+            return result
+
+    cdef object _cursor(self):
+        if self.event is None:
+            return self.cursor_factory
+        else:
+            return _timed_cursor(self.cursor_factory, self.event)
+
+    cdef object _transaction(self):
+        if self.cached:
+            return NO_TRANSACTION
+        return ensure_transaction(self.conn)
+
+    cdef object _finish(self, object error):
+        # returns an awaitable, when the plan of the query must be captured
+        if self.event is not None:
+            self.event.finish(error)
+
+            auto_explain = self.conn._auto_explain
+            if auto_explain is not None and auto_explain.is_slow(self.event):
+                return auto_explain.capture(self.conn, self.event)
+        return None
+
+    async def _resolve_polymorph(self, list rows):
+        # select-in polymorph loading, replaces the base entities with the concrete ones
+        columns, load, reducer = self.polymorph
+
+        if len(self.rcos_list) == 1:
+            return await self.conn._load_polymorph(rows, load, reducer)
+
+        for idx in columns:
+            resolved = await self.conn._load_polymorph([row[idx] for row in rows], load, reducer)
+            rows = [row[:idx] + (resolved[i],) + row[idx + 1:] for i, row in enumerate(rows)]
+        return rows
+
+    async def _polymorph_rows(self):
+        cdef list batch = []
+
+        async for record in self.cursor_factory.__aiter__():
+            batch.append(self.convert_row(record))
+            if len(batch) >= POLYMORPH_BATCH_SIZE:
+                for row in await self._resolve_polymorph(batch):
+                    yield row
+                batch = []
+
+        if batch:
+            for row in await self._resolve_polymorph(batch):
+                yield row
 
     async def __aiter__(self):
-        async with ensure_transaction(self.conn):
-            async for record in self.cursor_factory.__aiter__():
-                yield self.convert_row(record)
+        if self.event is None:
+            async with self._transaction():
+                if self.polymorph is None:
+                    async for record in self.cursor_factory.__aiter__():
+                        yield self.convert_row(record)
+                else:
+                    async for row in self._polymorph_rows():
+                        yield row
+        else:
+            try:
+                async with self._transaction():
+                    if self.polymorph is None:
+                        async for record in self.cursor_factory.__aiter__():
+                            yield self.convert_row(record)
+                    else:
+                        async for row in self._polymorph_rows():
+                            yield row
+            except GeneratorExit:
+                pending = self._finish(None)
+                if pending is not None:
+                    # can't await while closing
+                    pending.close()
+                raise
+            except BaseException as e:
+                self._finish(e)
+                raise
+
+            pending = self._finish(None)
+            if pending is not None:
+                await pending
 
     def __await__(self):
         return self.fetch().__await__()
 
 
+async def _timed_cursor(cursor_factory, QueryEvent event):
+    cursor = await cursor_factory
+    event.executed()
+    return cursor
+
+
+class _NoTransaction:
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+NO_TRANSACTION = _NoTransaction()
+
+
 cdef inline object ensure_transaction(conn):
     if conn._top_xact is None:
-        return conn.transaction(isolation="serializable", readonly=True)
+        return conn.transaction(isolation=conn.read_isolation, readonly=True)
     else:
         return conn.transaction(
             isolation=conn._top_xact._isolation,
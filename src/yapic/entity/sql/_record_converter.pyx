@@ -3,7 +3,7 @@ from cpython.ref cimport Py_INCREF
 from cpython.tuple cimport PyTuple_New, PyTuple_GET_ITEM, PyTuple_SET_ITEM, PyTuple_GET_SIZE
 
 from yapic.entity._entity cimport EntityState
-from yapic.entity._entity cimport EntityBase, EntityAttribute
+from yapic.entity._entity cimport EntityBase, EntityAttribute, LazyValue
 from yapic.entity._field cimport StorageTypeFactory, StorageType, Field
 
 from ._query cimport RCO, RowConvertOp
@@ -102,6 +102,13 @@ cdef object _convert_record(list stack, object record, list rcos_list, RCState s
                     entity_state.set_initial_value(field, tmp)
             elif rco.op == RCO.GET_RECORD:
                 result = record[rco.param1]
+            elif rco.op == RCO.SET_ATTR_RECORD_LAZY:
+                field = rco.param1
+                tmp = record[rco.param2]
+                if tmp is None:
+                    entity_state.set_initial_value(field, None)
+                else:
+                    entity_state.set_lazy_initial_value(field, LazyValue(tmp, field.get_type(state.tf)))
 
             j += 1
 
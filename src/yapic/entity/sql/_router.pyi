@@ -0,0 +1,80 @@
+from typing import Any, AsyncIterator, Generic, Iterable, List, Optional, Sequence, TypeVar
+
+from .._entity import EntityBase
+from ._query import Query
+from ._explain import ExplainResult
+
+ENT = TypeVar("ENT")
+
+
+class RoutedSelect(Generic[ENT]):
+    async def fetch(self, num=None, *, timeout=None) -> List[ENT]:
+        pass
+
+    async def fetchrow(self, *, timeout=None) -> Optional[ENT]:
+        pass
+
+    async def fetchval(self, column: int = 0, *, timeout=None) -> Any:
+        pass
+
+    async def forward(self, num: int, *, timeout=None) -> int:
+        pass
+
+    async def first(self, *, timeout=None) -> Optional[ENT]:
+        pass
+
+    async def one(self, *, timeout=None) -> ENT:
+        pass
+
+    def __aiter__(self) -> AsyncIterator[ENT]:
+        pass
+
+
+class Router:
+    primary: Any
+    replicas: Sequence[Any]
+    sticky: float
+
+    def __init__(self, primary: Any, replicas: Iterable[Any] = (), *, sticky: float = 1.0) -> None:
+        """
+        Sends the selects to the replicas, and the writes, locking selects and transactions to the primary
+        """
+
+    def select(self, q: Query[ENT], *, prefetch=None, timeout=None, cache=False) -> RoutedSelect[ENT]:
+        pass
+
+    async def select_many(self, *queries: Query, timeout=None) -> List[List[Any]]:
+        pass
+
+    async def load_polymorph(self, entities: Iterable[EntityBase]) -> List[EntityBase]:
+        pass
+
+    async def explain(self, q: Query, analyze: bool = False, buffers: bool = False) -> ExplainResult:
+        pass
+
+    async def insert(self, entity: EntityBase, **kwargs) -> bool:
+        pass
+
+    async def insert_or_update(self, entity: EntityBase, **kwargs) -> bool:
+        pass
+
+    async def update(self, entity: EntityBase, **kwargs) -> bool:
+        pass
+
+    async def delete(self, entity: EntityBase) -> bool:
+        pass
+
+    async def save(self, entity: EntityBase, **kwargs) -> bool:
+        pass
+
+    async def upsert_many(self, entities: Iterable[EntityBase], **kwargs) -> List[EntityBase]:
+        pass
+
+    def transaction(self, **kwargs) -> Any:
+        """
+        Start a transaction on the primary, every call of the router
+        within the ``async with`` block (in the same task) use this connection
+        """
+
+    def is_sticky(self) -> bool:
+        pass
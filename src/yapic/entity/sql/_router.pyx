@@ -0,0 +1,199 @@
+import time
+from contextvars import ContextVar
+from itertools import count
+
+from ._query cimport Query
+
+
+# (router, connection) of the current ``Router.transaction()``
+PINNED = ContextVar("yapic_entity_router_pinned", default=None)
+
+# hot standby rejects serializable transactions
+REPLICA_ISOLATION = "repeatable_read"
+
+
+class Router:
+    """ Sends the selects to the replicas, and the writes, locking selects and transactions to the primary
+
+    ``primary`` and ``replicas`` are pools (``asyncpg.create_pool(connection_class=PostgreConnection)``)
+    or connections. After a write the reads of the same task go to the primary for ``sticky`` seconds.
+    """
+
+    def __init__(self, primary, replicas=(), *, sticky=1.0):
+        self.primary = primary
+        self.replicas = tuple(replicas)
+        self.sticky = sticky
+        self._next_replica = count()
+        self._last_write = ContextVar(f"yapic_entity_router_{id(self)}", default=None)
+
+    def select(self, Query q, **kwargs):
+        return RoutedSelect(self, q, kwargs)
+
+    async def select_many(self, *queries, **kwargs):
+        target = self._read_target(None)
+        if target in self.replicas and any((<Query>q)._lock is not None for q in queries):
+            target = self.primary
+
+        async with self._acquire(target) as conn:
+            return await conn.select_many(*queries, **kwargs)
+
+    async def load_polymorph(self, entities):
+        async with self._acquire(self._read_target(None)) as conn:
+            return await conn.load_polymorph(entities)
+
+    async def explain(self, Query q, analyze=False, buffers=False):
+        async with self._acquire(self._read_target(q)) as conn:
+            return await conn.explain(q, analyze, buffers)
+
+    async def insert(self, entity, **kwargs):
+        return await self._write("insert", entity, kwargs)
+
+    async def insert_or_update(self, entity, **kwargs):
+        return await self._write("insert_or_update", entity, kwargs)
+
+    async def update(self, entity, **kwargs):
+        return await self._write("update", entity, kwargs)
+
+    async def delete(self, entity):
+        return await self._write("delete", entity, {})
+
+    async def save(self, entity, **kwargs):
+        return await self._write("save", entity, kwargs)
+
+    async def upsert_many(self, entities, **kwargs):
+        return await self._write("upsert_many", entities, kwargs)
+
+    def transaction(self, **kwargs):
+        """ Start a transaction on the primary, every call of the router
+        within the ``async with`` block (in the same task) use this connection
+        """
+        return RoutedTransaction(self, kwargs)
+
+    def is_sticky(self):
+        last_write = self._last_write.get()
+        return last_write is not None and time.monotonic() - last_write < self.sticky
+
+    def _read_target(self, Query q):
+        pinned = PINNED.get()
+        if pinned is not None and pinned[0] is self:
+            return pinned[1]
+
+        if not self.replicas or (q is not None and q._lock is not None) or self.is_sticky():
+            return self.primary
+
+        return self.replicas[next(self._next_replica) % len(self.replicas)]
+
+    async def _write(self, str method, entity, dict kwargs):
+        pinned = PINNED.get()
+        target = pinned[1] if pinned is not None and pinned[0] is self else self.primary
+
+        try:
+            async with self._acquire(target) as conn:
+                return await getattr(conn, method)(entity, **kwargs)
+        finally:
+            self._last_write.set(time.monotonic())
+
+    def _acquire(self, target):
+        return _Acquire(target, target in self.replicas)
+
+
+class RoutedSelect:
+    """ Same interface as ``QueryContext``, the connection is acquired for each fetch """
+
+    def __init__(self, router, Query q, dict kwargs):
+        self.router = router
+        self.q = q
+        self.kwargs = kwargs
+
+    async def _call(self, str method, args, kwargs):
+        async with self.router._acquire(self.router._read_target(self.q)) as conn:
+            return await getattr(conn.select(self.q, **self.kwargs), method)(*args, **kwargs)
+
+    def fetch(self, *args, **kwargs):
+        return self._call("fetch", args, kwargs)
+
+    def fetchrow(self, *args, **kwargs):
+        return self._call("fetchrow", args, kwargs)
+
+    def fetchval(self, *args, **kwargs):
+        return self._call("fetchval", args, kwargs)
+
+    def forward(self, *args, **kwargs):
+        return self._call("forward", args, kwargs)
+
+    def first(self, *args, **kwargs):
+        return self._call("first", args, kwargs)
+
+    def one(self, *args, **kwargs):
+        return self._call("one", args, kwargs)
+
+    async def __aiter__(self):
+        async with self.router._acquire(self.router._read_target(self.q)) as conn:
+            async for row in conn.select(self.q, **self.kwargs):
+                yield row
+
+    def __await__(self):
+        return self.fetch().__await__()
+
+
+class RoutedTransaction:
+    def __init__(self, router, dict kwargs):
+        self.router = router
+        self.kwargs = kwargs
+        self.acquire = None
+        self.transaction = None
+        self.token = None
+
+    async def __aenter__(self):
+        pinned = PINNED.get()
+        if pinned is not None and pinned[0] is self.router:
+            # nested, savepoint on the same connection
+            conn = pinned[1]
+        else:
+            self.acquire = self.router._acquire(self.router.primary)
+            conn = await self.acquire.__aenter__()
+
+        try:
+            self.transaction = conn.transaction(**self.kwargs)
+            await self.transaction.__aenter__()
+        except BaseException as e:
+            if self.acquire is not None:
+                await self.acquire.__aexit__(type(e), e, e.__traceback__)
+            raise
+
+        self.token = PINNED.set((self.router, conn))
+        return conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        PINNED.reset(self.token)
+        try:
+            return await self.transaction.__aexit__(exc_type, exc, tb)
+        finally:
+            self.router._last_write.set(time.monotonic())
+            if self.acquire is not None:
+                await self.acquire.__aexit__(exc_type, exc, tb)
+
+
+class _Acquire:
+    """ Acquires from pool, or borrows the connection """
+
+    def __init__(self, target, bint replica):
+        self.target = target
+        self.replica = replica
+        self.pool_acquire = None
+
+    async def __aenter__(self):
+        if hasattr(self.target, "acquire"):
+            self.pool_acquire = self.target.acquire()
+            conn = await self.pool_acquire.__aenter__()
+        else:
+            conn = self.target
+
+        if self.replica:
+            conn.read_isolation = REPLICA_ISOLATION
+        return conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.pool_acquire is not None:
+            return await self.pool_acquire.__aexit__(exc_type, exc, tb)
+        return False
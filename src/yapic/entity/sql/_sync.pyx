@@ -11,6 +11,23 @@ from ._query cimport Query
 
 
 async def sync(connection, Registry registry, EntityType entity_base=Entity, compare_field_position=True):
+    cdef RegistryDiff diff = await registry_diff(connection, registry, entity_base, compare_field_position)
+
+    if diff:
+        # print("\n".join(map(repr, diff.changes)))
+
+        res = connection.dialect.create_ddl_compiler().compile_registry_diff(diff)
+        if not res:
+            return None
+        else:
+            return res
+    else:
+        return None
+
+
+async def registry_diff(connection, Registry registry, EntityType entity_base=Entity, compare_field_position=True):
+    """ Difference between the database and the registry, including the fix entries """
+    registry.finalize()
     if registry.deferred:
         raise RuntimeError(f"This registry is not fully resolved, some of entities deferred: {registry.deferred}")
 
@@ -23,15 +40,7 @@ async def sync(connection, Registry registry, EntityType entity_base=Entity, com
                 changes.append(cc)
         diff.changes = changes
 
-        # print("\n".join(map(repr, diff.changes)))
-
-        res = connection.dialect.create_ddl_compiler().compile_registry_diff(diff)
-        if not res:
-            return None
-        else:
-            return res
-    else:
-        return None
+    return diff
 
 
 async def compare_data(connection, RegistryDiff diff):
@@ -1,6 +1,31 @@
+from typing import Any, AsyncIterator, Literal, Tuple
+
 from asyncpg.connection import Connection as AsyncPgConnection
 from .._connection import Connection
+from ..._entity import EntityType
+
+Change = Tuple[EntityType, Literal["insert", "update", "delete"], Tuple[Any, ...]]
+
+
+class ChangeFeed(AsyncIterator[Change]):
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def __aenter__(self) -> "ChangeFeed":
+        pass
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        pass
 
 
 class PostgreConnection(AsyncPgConnection, Connection):
-    pass
+    async def register_postgis_codecs(self) -> bool:
+        pass
+
+    def listen_changes(self, *entities: EntityType, coalesce: float = 0.05) -> ChangeFeed:
+        """
+        Async iterator of ``(entity_type, op, pk)``, from the entities with ``notify`` meta
+        """
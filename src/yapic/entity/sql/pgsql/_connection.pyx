@@ -1,16 +1,35 @@
+import asyncio
+from collections import deque
+from decimal import Decimal
 from inspect import iscoroutine
+from weakref import WeakKeyDictionary
 
 import cython
 from asyncpg import Record
+from yapic import json
 from asyncpg.connection import Connection as AsyncPgConnection
+from asyncpg.transaction import Transaction
 
 from yapic.entity._entity cimport EntityType, EntityBase, EntityAttribute, EntityState, NOTSET
-from yapic.entity._field cimport Field, StorageType, PrimaryKey
+from yapic.entity._field cimport Field, StorageType, PrimaryKey, AutoIncrement, ServerGenerated
 from yapic.entity._field_impl cimport CompositeImpl
+from yapic.entity._trigger cimport ChangeNotifyTrigger
 
 from .._connection import Connection
+from .._explain import ExplainResult, relation_aliases
+from .._query cimport Query
 from .._dialect cimport Dialect
 from ._dialect cimport PostgreDialect
+from .postgis._ewkb import ewkb_encode, ewkb_decode
+
+
+# entity -> {returning: (RETURNING clause, fields in record order)}
+RETURNING_CACHE = WeakKeyDictionary()
+
+# composite entity -> {record keys: fields in record order}
+COMPOSITE_FIELDS_CACHE = WeakKeyDictionary()
+
+CHANGE_OPS = {"I": "insert", "U": "update", "D": "delete"}
 
 
 class PostgreConnection(AsyncPgConnection, Connection):
@@ -18,51 +37,349 @@ class PostgreConnection(AsyncPgConnection, Connection):
         AsyncPgConnection.__init__(self, *args, **kwargs)
         Connection.__init__(self, PostgreDialect())
 
-    async def _exec_iou(self, str q, params, EntityBase entity, EntityType entity_t, *, timeout=None):
-        cdef Dialect dialect = self.dialect
-        cdef list field_names = [dialect.quote_ident(a._name_) for a in entity_t.__fields__]
-        cdef EntityState state = entity.__state__
-        cdef EntityAttribute attr
+    def transaction(self, *, isolation=None, readonly=False, deferrable=False):
+        self._check_open()
+        return PostgreTransaction(self, isolation, readonly, deferrable)
+
+    async def register_postgis_codecs(self):
+        """ Transfer geometry / geography values as binary EWKB, instead of ST_MakePoint / ST_X, ST_Y, ST_SRID
+        expressions. Returns False when PostGIS is not installed.
+        """
+        cdef PostgreDialect dialect = self.dialect
+
+        types = await self.fetch("""SELECT t.typname, n.nspname FROM pg_type t
+            INNER JOIN pg_namespace n ON n.oid = t.typnamespace
+            WHERE t.typname IN ('geometry', 'geography')""")
+
+        if not types:
+            return False
+
+        for typname, nspname in types:
+            await self.set_type_codec(typname,
+                                      schema=nspname,
+                                      encoder=ewkb_encode,
+                                      decoder=ewkb_decode,
+                                      format="binary")
 
-        q += f" RETURNING {', '.join(field_names)}"
+        dialect.binary_postgis = True
+        return True
+
+    async def _exec_iou(self, str q, params, EntityBase entity, EntityType entity_t, returning=None, *, timeout=None):
+        cdef Dialect dialect = self.dialect
+        cdef tuple projection = compile_returning(dialect, entity_t, returning)
+        cdef EntityState state
 
         self._check_open()
-        res = await self._execute(q, params, 0, timeout)
+
+        if projection[0] is None:
+            _, status, _ = await self._execute(q, params, 0, timeout, return_status=True)
+            if status and int(status.rpartition(b" ")[2]) > 0:
+                state = entity.__state__
+                state.exists = True
+                state.reset()
+                return True
+            else:
+                return False
+
+        res = await self._execute(q + projection[0], params, 0, timeout)
         if res:
-            set_rec_on_entity(dialect, entity, entity_t, res[0])
+            set_returning_on_entity(dialect, entity, projection[1], res[0])
             return True
         else:
             return False
 
+    def listen_changes(self, *entities, coalesce=0.05):
+        """ Async iterator of ``(entity_type, op, pk)``, from the entities with ``notify`` meta """
+        return ChangeFeed(self, entities, coalesce)
+
+    async def _exec_upsert(self, str q, params, list entities, EntityType entity_t, list conflict, returning=None, *, timeout=None):
+        cdef Dialect dialect = self.dialect
+        cdef list fields = list(compile_returning(dialect, entity_t, returning)[1])
+        cdef list key_idx = []
+        cdef list keys = []
+        cdef dict by_key = {}
+        cdef EntityBase entity
+        cdef EntityState state
+        cdef Field field
+
+        # conflict fields identify the returned rows, the missing ones are skipped
+        for field in conflict:
+            for i, f in enumerate(fields):
+                if f is field:
+                    key_idx.append(i)
+                    break
+            else:
+                key_idx.append(len(fields))
+                fields.append(field)
+
+        for entity in entities:
+            key = tuple([getattr(entity, (<Field>f)._key_) for f in conflict])
+            keys.append(key)
+            by_key.setdefault(key, []).append(entity)
+
+        self._check_open()
+        res = await self._execute(f"{q} RETURNING {', '.join([dialect.quote_ident((<Field>f)._name_) for f in fields])}",
+                                  params, 0, timeout)
+
+        for record in res:
+            key = tuple([_decode_value(dialect, <Field>conflict[i], record[key_idx[i]]) for i in range(len(conflict))])
+            for entity in by_key.pop(key, ()):
+                state = entity.__state__
+                state.exists = True
+                for i, field in enumerate(fields):
+                    _set_returned_value(dialect, entity, state, field, record[i])
+                state.reset()
+
+        return [entity for key, entity in zip(keys, entities) if key in by_key]
+
+    async def _explain(self, str sql, params, Query q, bint analyze, bint buffers):
+        cdef list options = ["FORMAT JSON"]
+        if analyze:
+            options.append("ANALYZE true")
+        if buffers:
+            options.append("BUFFERS true")
+
+        self._check_open()
+        res = await self.fetchval(f"EXPLAIN ({', '.join(options)}) {sql}", *params)
+        if isinstance(res, str):
+            res = json.loads(res)
+
+        return ExplainResult(sql, params, res[0], relation_aliases(q) if q is not None else {})
+
     async def _exec_del(self, str q, params, *, timeout=None):
         self._check_open()
         _, res, _ = await self._execute(q, params, 0, timeout, return_status=True)
         return res and int(res[7:]) > 0
 
 
-# TODO: refactor withoperations
-cdef set_rec_on_entity(Dialect dialect, EntityBase entity, EntityType entity_t, record):
+class PostgreTransaction(Transaction):
+    """ Notifies the connection about the end of the transaction, see ``Connection._transaction_finished`` """
+
+    async def __aexit__(self, extype, ex, tb):
+        try:
+            return await Transaction.__aexit__(self, extype, ex, tb)
+        finally:
+            self._connection._transaction_finished()
+
+    async def commit(self):
+        try:
+            await Transaction.commit(self)
+        finally:
+            self._connection._transaction_finished()
+
+    async def rollback(self):
+        try:
+            await Transaction.rollback(self)
+        finally:
+            self._connection._transaction_finished()
+
+
+class ChangeFeed:
+    """ Changes sent by the ``notify`` trigger, the burst of notifications
+    (arrived within ``coalesce`` seconds) is deduplicated by entity and primary key
+    """
+
+    def __init__(self, conn, entities, coalesce):
+        cdef EntityType entity
+
+        self.conn = conn
+        self.coalesce = coalesce
+        self.entities = {}
+        self.channels = set()
+        self.queue = asyncio.Queue()
+        self.pending = deque()
+        self.listening = False
+
+        for entity in entities:
+            for trigger in entity.__triggers__:
+                if isinstance(trigger, ChangeNotifyTrigger):
+                    self.channels.add((<ChangeNotifyTrigger>trigger).channel)
+                    break
+            else:
+                raise ValueError(f"Change notification is not enabled on: {entity!r}")
+            self.entities[entity.__qname__] = entity
+
+    async def start(self):
+        if not self.listening:
+            self.listening = True
+            for channel in self.channels:
+                await self.conn.add_listener(channel, self._on_notify)
+
+    async def close(self):
+        if self.listening:
+            self.listening = False
+            for channel in self.channels:
+                await self.conn.remove_listener(channel, self._on_notify)
+
+    def _on_notify(self, conn, pid, channel, payload):
+        self.queue.put_nowait(payload)
+
+    async def _fill(self):
+        cdef dict batch = {}
+
+        while not batch:
+            self._add(batch, await self.queue.get())
+            if self.coalesce > 0:
+                await asyncio.sleep(self.coalesce)
+            while not self.queue.empty():
+                self._add(batch, self.queue.get_nowait())
+
+        self.pending.extend(batch.values())
+
+    def _add(self, dict batch, str payload):
+        cdef EntityType entity
+        cdef Dialect dialect = self.conn.dialect
+
+        # numeric primary keys must stay exact
+        qname, op, pk = json.loads(payload, parse_float=Decimal)
+        try:
+            entity = self.entities[qname]
+        except KeyError:
+            # other entity on the same channel
+            return
+
+        # json types (str, float, ...) -> python values of the primary key, like as the loaded entities have
+        pk = tuple([_decode_value(dialect, <Field>field, value) for field, value in zip(entity.__pk__, pk)])
+        key = (qname, pk)
+        # keep the position of the first, and the operation of the last change
+        batch[key] = (entity, CHANGE_OPS[op], pk)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await self.start()
+        if not self.pending:
+            await self._fill()
+        return self.pending.popleft()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+cdef tuple compile_returning(Dialect dialect, EntityType entity_t, object returning):
+    cdef dict cache
+    cdef tuple fields
+
+    if returning is None:
+        returning = entity_t.get_meta("returning", "generated")
+
+    if isinstance(returning, str):
+        key = returning
+    else:
+        key = tuple((<Field>f)._key_ if isinstance(f, Field) else f for f in returning)
+
+    try:
+        cache = RETURNING_CACHE[entity_t]
+    except KeyError:
+        cache = RETURNING_CACHE[entity_t] = {}
+
+    try:
+        return cache[key]
+    except KeyError:
+        pass
+
+    fields = returning_fields(entity_t, key)
+    if fields:
+        result = (f" RETURNING {', '.join(dialect.quote_ident(f._name_) for f in fields)}", fields)
+    else:
+        result = (None, fields)
+
+    cache[key] = result
+    return result
+
+
+cdef tuple returning_fields(EntityType entity_t, object returning):
+    cdef Field field
+    cdef list result
+
+    if returning == "all":
+        return entity_t.__fields__
+    elif returning == "none":
+        return ()
+    elif returning == "generated":
+        return tuple(field for field in entity_t.__fields__ if is_server_generated(field))
+    elif isinstance(returning, str):
+        raise ValueError(f"Invalid returning: {returning!r}")
+
+    # primary key is always returned, to keep the identity of the entity
+    result = list(entity_t.__pk__)
+    for name in returning:
+        field = getattr(entity_t, name, None)
+        if not isinstance(field, Field):
+            raise ValueError(f"Unknown field in returning: {name!r}")
+        if not any(f is field for f in result):
+            result.append(field)
+    return tuple(result)
+
+
+cdef tuple composite_fields(EntityType entity_t, record):
+    cdef dict cache
+    cdef tuple fields
+
+    try:
+        cache = COMPOSITE_FIELDS_CACHE[entity_t]
+    except KeyError:
+        cache = COMPOSITE_FIELDS_CACHE[entity_t] = {}
+
+    # attributes of the database type may be in a different order than the fields of the entity
+    # (ALTER TYPE ADD ATTRIBUTE appends), and it can change with migrations or differ between databases,
+    # so the order is keyed by the attribute names of the record
+    key = tuple(record.keys())
+    try:
+        return <tuple>cache[key]
+    except KeyError:
+        pass
+
+    fields = cache[key] = tuple([getattr(entity_t, k) for k in key])
+    return fields
+
+
+cdef bint is_server_generated(Field field):
+    return field.get_ext(PrimaryKey) is not None \
+        or field.get_ext(AutoIncrement) is not None \
+        or field.get_ext(ServerGenerated) is not None \
+        or field._default_ is not None \
+        or field.on_update is not None
+
+
+cdef set_returning_on_entity(Dialect dialect, EntityBase entity, tuple fields, record):
     cdef EntityState state = entity.__state__
-    cdef EntityAttribute attr
-    cdef StorageType field_type
-    cdef CompositeImpl cimpl
+    cdef Field field
 
     state.exists = True
 
-    for k, v in record.items():
-        attr = getattr(entity_t, k)
-        if isinstance(v, Record):
-            cimpl = attr._impl_
-            nv = getattr(entity, k)
-            if not isinstance(nv, EntityBase):
-                nv = cimpl._entity_()
-            set_rec_on_entity(dialect, nv, cimpl._entity_, v)
-            v = nv
-
-        if v is None:
-            state.set_value(attr, None)
-        else:
-            field_type = dialect.get_field_type(attr)
-            state.set_value(attr, field_type.decode(v))
+    for i, field in enumerate(fields):
+        _set_returned_value(dialect, entity, state, field, record[i])
 
     state.reset()
+
+
+cdef _set_returned_value(Dialect dialect, EntityBase entity, EntityState state, EntityAttribute attr, object v):
+    cdef StorageType field_type
+    cdef CompositeImpl cimpl
+
+    if isinstance(v, Record):
+        cimpl = attr._impl_
+        nv = getattr(entity, attr._key_)
+        if not isinstance(nv, EntityBase):
+            nv = cimpl._entity_()
+        set_returning_on_entity(dialect, nv, composite_fields(cimpl._entity_, v), v)
+        v = nv
+
+    if v is None:
+        state.set_value(attr, None)
+    else:
+        field_type = dialect.get_field_type(attr)
+        state.set_value(attr, field_type.decode(v))
+
+
+cdef object _decode_value(Dialect dialect, Field field, object value):
+    if value is None:
+        return None
+    return dialect.get_field_type(field).decode(value)
+
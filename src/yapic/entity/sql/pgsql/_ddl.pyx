@@ -9,7 +9,7 @@ from yapic.entity._entity cimport EntityType, EntityAttribute, EntityAttributeEx
 from yapic.entity._field cimport Field, PrimaryKey, ForeignKey, Index, Check, Unique, AutoIncrement, StorageType
 from yapic.entity._registry cimport Registry
 from yapic.entity._expression cimport RawExpression
-from yapic.entity._trigger cimport Trigger, PolymorphParentDeleteTrigger
+from yapic.entity._trigger cimport Trigger, PolymorphParentDeleteTrigger, ChangeNotifyTrigger
 from yapic.entity._field_impl cimport (
     IntImpl,
     StringImpl,
@@ -120,6 +120,7 @@ cdef class PostgreDDLCompiler(DDLCompiler):
 
     def _special_trigger(self, EntityType entity, Trigger trigger):
         cdef PolymorphParentDeleteTrigger poly_delete
+        cdef ChangeNotifyTrigger notify
 
         if isinstance(trigger, PolymorphParentDeleteTrigger):
             poly_delete = <PolymorphParentDeleteTrigger>trigger
@@ -136,12 +137,46 @@ cdef class PostgreDDLCompiler(DDLCompiler):
                     RETURN OLD;
                 """
             )
+        elif isinstance(trigger, ChangeNotifyTrigger):
+            notify = <ChangeNotifyTrigger>trigger
+            channel = self.dialect.quote_value(notify.channel)
+            qname = self.dialect.quote_value(entity.__qname__)
+
+            def pk(rec):
+                return ", ".join([f"{rec}.{self.dialect.quote_ident(attr._name_)}" for attr in entity.__pk__])
+
+            def payload(rec, op):
+                return f"json_build_array({qname}, '{op}', json_build_array({pk(rec)}))::text"
+
+            return PostgreTrigger(
+                name=notify.name,
+                before=notify.before,
+                after=notify.after,
+                for_each=notify.for_each,
+                unique_name=trigger.get_unique_name(entity),
+                body=f"""
+                    IF TG_OP = 'INSERT' THEN
+                        PERFORM pg_notify({channel}, {payload("NEW", "I")});
+                    ELSIF TG_OP = 'UPDATE' THEN
+                        IF ROW({pk("OLD")}) IS DISTINCT FROM ROW({pk("NEW")}) THEN
+                            PERFORM pg_notify({channel}, {payload("OLD", "D")});
+                        END IF;
+                        PERFORM pg_notify({channel}, {payload("NEW", "U")});
+                    ELSE
+                        PERFORM pg_notify({channel}, {payload("OLD", "D")});
+                    END IF;
+                    RETURN NULL;
+                """
+            )
         else:
             return trigger
 
 
 JSON_ENTITY_UID = 0
 
+# order of events in multi event triggers, e.g.: INSERT OR UPDATE
+TRIGGER_EVENTS = ["INSERT", "UPDATE", "DELETE", "TRUNCATE"]
+
 
 cdef class PostgreDDLReflect(DDLReflect):
     async def get_extensions(self, conn):
@@ -436,9 +471,17 @@ cdef class PostgreDDLReflect(DDLReflect):
         """)
 
         cdef Trigger trigger
+        cdef dict events = {}
         result = []
 
+        # information_schema has one row per event
         for record in triggers:
+            try:
+                events[record[0]].append(record[2].upper())
+                continue
+            except KeyError:
+                events[record[0]] = [record[2].upper()]
+
             trigger = PostgreTrigger(name=record[0], for_each=record[3])
             if record[1] == "BEFORE":
                 trigger.before = record[2].upper()
@@ -447,6 +490,13 @@ cdef class PostgreDDLReflect(DDLReflect):
             trigger.unique_name = record[4]
             result.append(trigger)
 
+        for trigger in result:
+            event = " OR ".join(sorted(events[trigger.name], key=TRIGGER_EVENTS.index))
+            if trigger.before:
+                trigger.before = event
+            else:
+                trigger.after = event
+
         return result
 
     async def create_field(self, conn, registry, str schema, str table, bint primary, record):
@@ -6,4 +6,5 @@ from yapic.entity._field cimport Field
 from .._dialect cimport Dialect
 
 cdef class PostgreDialect(Dialect):
-    pass
+    # geometry / geography binary codecs is registered, see PostgreConnection.register_postgis_codecs
+    cdef readonly bint binary_postgis
@@ -1,6 +1,8 @@
+from yapic import json
+
 from yapic.entity._entity cimport EntityType
-from yapic.entity._expression cimport RawExpression, ParamExpression
-from yapic.entity._field cimport StorageTypeFactory
+from yapic.entity._expression cimport RawExpression, ParamExpression, ConstExpression
+from yapic.entity._field cimport Field, StorageTypeFactory
 
 from .._dialect cimport Dialect
 from .._ddl cimport DDLCompiler, DDLReflect
@@ -9,6 +11,7 @@ from .._query cimport QueryCompiler
 from ._ddl cimport PostgreDDLCompiler, PostgreDDLReflect
 from ._query_compiler cimport PostgreQueryCompiler
 from ._type_factory cimport PostgreTypeFactory
+from .postgis._impl cimport PostGISImpl
 
 
 cdef class PostgreDialect(Dialect):
@@ -80,6 +83,49 @@ cdef class PostgreDialect(Dialect):
             value = str(value).replace("'", "''")
             return f"'{value}'"
 
+    cpdef object encode_json_patch(self, Field field, str name, list changes):
+        cdef list exprs = [name]
+        cdef set parents = set()
+
+        for path, _ in changes:
+            for i in range(1, len(path)):
+                parents.add(path[:i])
+
+        # jsonb_set creates only the last key of the path, so the missing (or not object) parents
+        # are created first, otherwise the change is silently dropped
+        for parent in sorted(parents, key=len):
+            exprs.insert(0, "jsonb_set(")
+            exprs.append(", ")
+            exprs.append(ConstExpression(list(parent), list))
+            exprs.append("::text[], CASE jsonb_typeof(")
+            exprs.append(name)
+            exprs.append(" #> ")
+            exprs.append(ConstExpression(list(parent), list))
+            exprs.append("::text[]) WHEN 'object' THEN ")
+            exprs.append(name)
+            exprs.append(" #> ")
+            exprs.append(ConstExpression(list(parent), list))
+            exprs.append("::text[] ELSE '{}'::jsonb END, true)")
+
+        for path, value in changes:
+            exprs.insert(0, "jsonb_set(")
+            exprs.append(", ")
+            exprs.append(ConstExpression(list(path), list))
+            exprs.append("::text[], ")
+            exprs.append(ConstExpression(json.dumps(value, ensure_ascii=False), str))
+            exprs.append("::jsonb, true)")
+
+        return RawExpression(*exprs)
+
+    cpdef bint has_binary_codec(self, Field field):
+        return self.binary_postgis and isinstance(field._impl_, PostGISImpl)
+
+    cpdef object finalize_key(self):
+        # PostGIS fields are loaded as a single value, when the binary codecs are registered
+        if self.binary_postgis:
+            return (type(self), "postgis")
+        return type(self)
+
     cpdef str table_qname(self, EntityType entity):
         try:
             schema = entity.__meta__["schema"]
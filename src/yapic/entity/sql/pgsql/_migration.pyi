@@ -0,0 +1,45 @@
+from typing import Iterator, List, Optional
+
+from ..._entity import EntityType
+from ..._registry import Registry
+
+
+class MigrationStep:
+    kind: str
+    sql: str
+    cleanup: Optional[str]
+
+    def __init__(self, kind: str, sql: str, *, cleanup: Optional[str] = None):
+        pass
+
+
+class MigrationPlan:
+    steps: List[MigrationStep]
+
+    @property
+    def is_blocking(self) -> bool:
+        pass
+
+    async def execute(self,
+                      conn,
+                      *,
+                      lock_timeout: str = "5s",
+                      retries: int = 10,
+                      retry_delay: float = 1.0,
+                      batch_size: int = 10000,
+                      throttle: float = 0.1,
+                      allow_blocking: bool = False) -> None:
+        pass
+
+    def __iter__(self) -> Iterator[MigrationStep]:
+        pass
+
+    def __len__(self) -> int:
+        pass
+
+
+async def plan_migration(connection,
+                         registry: Registry,
+                         entity_base: EntityType = ...,
+                         compare_field_position: bool = True) -> MigrationPlan:
+    pass
@@ -0,0 +1,387 @@
+import asyncio
+
+from asyncpg.exceptions import LockNotAvailableError
+
+from yapic.entity._entity cimport EntityType, EntityAttributeExtGroup
+from yapic.entity._entity import Entity
+from yapic.entity._entity_diff cimport EntityDiff
+from yapic.entity._entity_diff import EntityDiffKind
+from yapic.entity._registry cimport Registry, RegistryDiff
+from yapic.entity._registry import RegistryDiffKind
+from yapic.entity._field cimport Field, ForeignKey, Index, Check, Unique, AutoIncrement
+from yapic.entity._expression cimport Expression
+
+from .._ddl cimport DDLCompiler
+from .._sync import registry_diff
+
+
+class MigrationStep:
+    """ One statement of the migration plan
+
+    kind:
+        - ``ddl``: short statement in transaction, with ``lock_timeout``
+        - ``concurrent``: ``CREATE / DROP INDEX CONCURRENTLY``, without transaction
+        - ``validate``: ``VALIDATE CONSTRAINT``, without transaction
+        - ``backfill``: update in batches, see ``BackfillStep``
+        - ``blocking``: rewrites or recreates the table, executed only with ``allow_blocking=True``
+    """
+
+    def __init__(self, str kind, str sql, *, str cleanup=None):
+        self.kind = kind
+        self.sql = sql
+        # executed before retry, e.g. drop the invalid index
+        self.cleanup = cleanup
+
+    def __repr__(self):
+        return f"<MigrationStep {self.kind} {self.sql!r}>"
+
+
+class BackfillStep(MigrationStep):
+    """ Fills the column of the existing rows in batches, walking the table by primary key ranges,
+    so every batch reads only its own range. The first pass skips the locked rows, the next pass
+    waits for them (up to ``lock_timeout``). When ``not_null`` is set (the column becomes ``NOT NULL``),
+    the passes are repeated until no ``NULL`` remains.
+    """
+
+    def __init__(self, str table, str column, str value, list pk, *, bint not_null=False):
+        self.table = table
+        self.column = column
+        self.value = value
+        self.pk = pk
+        self.not_null = not_null
+        # the last primary key of the finished batches, kept between retries
+        self.position = None
+        self.skip_locked = True
+        # the finished passes, kept between retries
+        self.passes = 0
+        MigrationStep.__init__(self, "backfill", self.batch_sql(False))
+        self.check = f"SELECT EXISTS(SELECT 1 FROM {table} WHERE {column} IS NULL)"
+
+    def batch_sql(self, bint first):
+        """ Returns the last primary key of the batch, params: ``*position, batch_size`` """
+        cdef str pk = ", ".join(self.pk)
+        cdef str pk_desc = ", ".join([f"{name} DESC" for name in self.pk])
+        cdef int count = len(self.pk)
+
+        if first:
+            where = ""
+        elif count == 1:
+            where = f" WHERE {pk} > $1"
+        else:
+            where = f" WHERE ({pk}) > ({', '.join([f'${i + 1}' for i in range(count)])})"
+
+        lock = "FOR UPDATE SKIP LOCKED" if self.skip_locked else "FOR UPDATE"
+        return (
+            f"WITH \"batch\" AS (SELECT {pk} FROM {self.table}{where} ORDER BY {pk} LIMIT ${1 if first else count + 1}), "
+            f"\"updated\" AS (UPDATE {self.table} SET {self.column} = {self.value} WHERE ({pk}) IN ("
+            f"SELECT {pk} FROM {self.table} WHERE ({pk}) IN (SELECT {pk} FROM \"batch\") AND {self.column} IS NULL {lock})) "
+            f"SELECT {pk} FROM \"batch\" ORDER BY {pk_desc} LIMIT 1;"
+        )
+
+
+class MigrationPlan:
+    def __init__(self, list steps):
+        self.steps = steps
+
+    @property
+    def is_blocking(self):
+        return any(step.kind == "blocking" for step in self.steps)
+
+    async def execute(self, conn, *, str lock_timeout="5s", int retries=10, double retry_delay=1.0,
+                      int batch_size=10000, double throttle=0.1, int backfill_passes=10, bint allow_blocking=False):
+        if self.is_blocking and not allow_blocking:
+            raise RuntimeError("The migration contains blocking steps, run with allow_blocking=True")
+
+        for step in self.steps:
+            for attempt in range(retries + 1):
+                try:
+                    await _execute_step(conn, step, lock_timeout, batch_size, throttle, backfill_passes)
+                except LockNotAvailableError:
+                    if attempt == retries:
+                        raise
+                    if step.cleanup:
+                        await _execute_session(conn, step.cleanup, lock_timeout)
+                    await asyncio.sleep(retry_delay * (attempt + 1))
+                else:
+                    break
+
+    def __bool__(self):
+        return len(self.steps) > 0
+
+    def __iter__(self):
+        return iter(self.steps)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __str__(self):
+        return "\n".join(f"-- {step.kind}\n{step.sql}" for step in self.steps)
+
+
+async def plan_migration(connection, Registry registry, EntityType entity_base=Entity, compare_field_position=True):
+    """ Online migration plan of the difference between the database and the registry """
+    cdef RegistryDiff diff = await registry_diff(connection, registry, entity_base, compare_field_position)
+    return MigrationPlanner(connection.dialect.create_ddl_compiler()).plan(diff)
+
+
+class MigrationPlanner:
+    def __init__(self, DDLCompiler ddl):
+        self.ddl = ddl
+        self.dialect = ddl.dialect
+
+    def plan(self, RegistryDiff diff):
+        cdef DDLCompiler ddl = self.ddl
+        cdef list steps = []
+        cdef list deferred = []
+        cdef list structure = []
+        cdef list data = []
+        cdef set entities_recrated = set()
+
+        if not diff:
+            return MigrationPlan(steps)
+
+        for kind, param in diff:
+            if kind is RegistryDiffKind.CHANGED and param.b.get_meta("is_type", False) is False:
+                for ek, ep in param:
+                    if ek is EntityDiffKind.CHANGED and "_index_" in ep[2]:
+                        entities_recrated.add(self.dialect.table_qname(param.b))
+                        break
+
+        for kind, param in diff:
+            if kind is RegistryDiffKind.CHANGED and param.b.get_meta("is_type", False) is False:
+                if self.dialect.table_qname(param.b) in entities_recrated:
+                    sql, _deferred = ddl.recreate_entity(param.a, param.b, entities_recrated)
+                    steps.append(MigrationStep("blocking", sql))
+                    deferred.extend(_deferred)
+                else:
+                    steps.extend(self.plan_entity_diff(param))
+            elif kind is RegistryDiffKind.INSERT_ENTITY \
+                    or kind is RegistryDiffKind.UPDATE_ENTITY \
+                    or kind is RegistryDiffKind.REMOVE_ENTITY:
+                data.append((kind, param))
+            else:
+                structure.append((kind, param))
+
+        # creating / dropping tables and types, and the fix entries are compiled as sync does
+        sql = self.compile_changes(diff, structure)
+        if sql:
+            steps.insert(0, MigrationStep("ddl", sql))
+
+        sql = self.compile_changes(diff, data)
+        if sql:
+            steps.append(MigrationStep("ddl", sql))
+
+        if deferred:
+            steps.append(MigrationStep("ddl", "\n".join(deferred)))
+
+        return MigrationPlan(steps)
+
+    def compile_changes(self, RegistryDiff diff, list changes):
+        if not changes:
+            return None
+
+        original = diff.changes
+        diff.changes = changes
+        try:
+            return self.ddl.compile_registry_diff(diff)
+        finally:
+            diff.changes = original
+
+    def plan_entity_diff(self, EntityDiff diff):
+        cdef DDLCompiler ddl = self.ddl
+        cdef EntityAttributeExtGroup group
+        cdef Field field
+        cdef str table = self.dialect.table_qname(diff.b)
+        cdef list pre = []
+        cdef list alter = []
+        cdef list columns = []
+        cdef list constraints = []
+        cdef list indexes = []
+        cdef list post = []
+        requirements = []
+
+        for kind, param in diff:
+            if kind == EntityDiffKind.REMOVED:
+                alter.append(f"DROP COLUMN {self.dialect.quote_ident(param._name_)}")
+            elif kind == EntityDiffKind.CREATED:
+                columns.extend(self.plan_add_column(table, diff.b, param, requirements))
+            elif kind == EntityDiffKind.CHANGED:
+                field = param[1]
+                changes = dict(param[2])
+                if "_impl_" in changes or "size" in changes:
+                    # type change rewrites the table
+                    pre.append(MigrationStep("blocking", f"ALTER TABLE {table}\n  {', '.join(ddl.compile_field_diff(field, changes))};"))
+                    continue
+
+                set_not_null = "nullable" in changes and not changes["nullable"]
+                if set_not_null:
+                    del changes["nullable"]
+                alter.extend(ddl.compile_field_diff(field, changes))
+                if set_not_null:
+                    constraints.extend(self.plan_set_not_null(table, field))
+            elif kind == EntityDiffKind.REMOVE_PK:
+                alter.append(f"DROP CONSTRAINT IF EXISTS {self.dialect.quote_ident(param.__name__ + '_pkey')}")
+            elif kind == EntityDiffKind.CREATE_PK:
+                name = self.dialect.quote_ident(param.__name__ + "_pkey")
+                pk_names = [self.dialect.quote_ident(pk._name_) for pk in param.__pk__]
+                indexes.append(self.concurrent_index(f"CREATE UNIQUE INDEX {name} ON {table} ({', '.join(pk_names)});",
+                                                     diff.b, param.__name__ + "_pkey"))
+                indexes.append(MigrationStep("ddl", f"ALTER TABLE {table} ADD CONSTRAINT {name} PRIMARY KEY USING INDEX {name};"))
+            elif kind == EntityDiffKind.REMOVE_EXTGROUP:
+                group = param
+                if group.type is Index:
+                    pre.append(MigrationStep("concurrent", f"DROP INDEX CONCURRENTLY IF EXISTS {self.index_qname(diff.b, group.name)};"))
+                else:
+                    alter.append(f"DROP CONSTRAINT IF EXISTS {self.dialect.quote_ident(group.name)}")
+            elif kind == EntityDiffKind.CREATE_EXTGROUP:
+                group = param
+                name = self.dialect.quote_ident(group.name)
+                if group.type is ForeignKey:
+                    constraints.append(MigrationStep("ddl", f"ALTER TABLE {table} ADD {ddl.compile_foreign_key(group)} NOT VALID;"))
+                    constraints.append(MigrationStep("validate", f"ALTER TABLE {table} VALIDATE CONSTRAINT {name};"))
+                elif group.type is Check:
+                    check, comment = ddl.compile_create_check(group)
+                    constraints.append(MigrationStep("ddl", f"ALTER TABLE {table} ADD {check} NOT VALID;"))
+                    constraints.append(MigrationStep("validate", f"ALTER TABLE {table} VALIDATE CONSTRAINT {name};"))
+                    if comment:
+                        post.append(comment)
+                elif group.type is Index:
+                    indexes.append(self.concurrent_index(ddl.compile_create_index(group), diff.b, group.name))
+                elif group.type is Unique:
+                    fields = ", ".join([self.dialect.quote_ident(item.attr._name_) for item in group.items])
+                    indexes.append(self.concurrent_index(f"CREATE UNIQUE INDEX {name} ON {table} ({fields});", diff.b, group.name))
+                    indexes.append(MigrationStep("ddl", f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name};"))
+            elif kind == EntityDiffKind.REMOVE_TRIGGER:
+                pre.append(MigrationStep("ddl", ddl.remove_trigger(param[0], param[1])))
+            elif kind == EntityDiffKind.CREATE_TRIGGER:
+                post.append(ddl.create_trigger(param[0], param[1]))
+
+        steps = list(pre)
+        if alter:
+            alter_sep = ",\n  "
+            steps.append(MigrationStep("ddl", f"ALTER TABLE {table}\n  {alter_sep.join(alter)};"))
+        steps.extend(columns)
+        steps.extend(constraints)
+        steps.extend(indexes)
+        if post:
+            steps.append(MigrationStep("ddl", "\n".join(filter(bool, post))))
+        return steps
+
+    def plan_add_column(self, str table, EntityType entity, Field field, list requirements):
+        """ Volatile defaults (expressions, sequences) would rewrite the table, so the column is added without
+        default, and the existing rows filled in primary key ranges. Constant defaults are stored in the catalog.
+        """
+        cdef str col = self.dialect.quote_ident(field._name_)
+        cdef list steps
+
+        default = self.volatile_default(field)
+        if default is None:
+            return [MigrationStep("ddl", f"ALTER TABLE {table} ADD COLUMN {self.ddl.compile_field(field, requirements)};")]
+
+        pk = [self.dialect.quote_ident(f._name_) for f in entity.__pk__]
+        if not pk:
+            # without primary key the batches can not be ranged
+            return [MigrationStep("blocking", f"ALTER TABLE {table} ADD COLUMN {self.ddl.compile_field(field, requirements)};")]
+
+        type_name = self.dialect.get_field_type(field).name
+        steps = [
+            MigrationStep("ddl", f"ALTER TABLE {table} ADD COLUMN {col} {type_name};"),
+            MigrationStep("ddl", f"ALTER TABLE {table} ALTER COLUMN {col} SET DEFAULT {default};"),
+            BackfillStep(table, col, default, pk, not_null=field.nullable is False),
+        ]
+
+        if field.nullable is False:
+            steps.extend(self.plan_set_not_null(table, field))
+        return steps
+
+    def plan_set_not_null(self, str table, Field field):
+        """ ``SET NOT NULL`` skips the table scan, when a validated ``IS NOT NULL`` check exists """
+        cdef str col = self.dialect.quote_ident(field._name_)
+        cdef str check = self.dialect.quote_ident(f"{field._name_}_not_null")
+        return [
+            MigrationStep("ddl", f"ALTER TABLE {table} ADD CONSTRAINT {check} CHECK ({col} IS NOT NULL) NOT VALID;"),
+            MigrationStep("validate", f"ALTER TABLE {table} VALIDATE CONSTRAINT {check};"),
+            MigrationStep("ddl", f"ALTER TABLE {table}\n  ALTER COLUMN {col} SET NOT NULL,\n  DROP CONSTRAINT {check};"),
+        ]
+
+    def volatile_default(self, Field field):
+        cdef AutoIncrement ai
+
+        if field._default_ is not None:
+            if isinstance(field._default_, Expression):
+                return self.dialect.create_query_compiler().visit(field._default_)
+            return None
+
+        ai = field.get_ext(AutoIncrement)
+        if ai is not None:
+            return f"nextval({self.dialect.quote_value(self.dialect.table_qname(ai.sequence))}::regclass)"
+        return None
+
+    def concurrent_index(self, str sql, EntityType entity, str name):
+        # UNIQUE INDEX -> UNIQUE INDEX CONCURRENTLY, failed build leaves an invalid index behind
+        sql = sql.replace(" INDEX ", " INDEX CONCURRENTLY ", 1)
+        return MigrationStep("concurrent", sql, cleanup=f"DROP INDEX CONCURRENTLY IF EXISTS {self.index_qname(entity, name)};")
+
+    def index_qname(self, EntityType entity, str name):
+        schema = entity.get_meta("schema", "public") or "public"
+        schema = f"{self.dialect.quote_ident(schema)}." if schema != "public" else ""
+        return f"{schema}{self.dialect.quote_ident(name)}"
+
+
+async def _execute_step(conn, step, str lock_timeout, int batch_size, double throttle, int backfill_passes):
+    if step.kind == "ddl" or step.kind == "blocking":
+        async with conn.transaction():
+            await conn.execute(f"SET LOCAL lock_timeout = {conn.dialect.quote_value(lock_timeout)}")
+            await conn.execute(step.sql)
+    elif step.kind == "backfill":
+        await conn.execute(f"SET lock_timeout = {conn.dialect.quote_value(lock_timeout)}")
+        try:
+            await _backfill(conn, step, batch_size, throttle, backfill_passes)
+        finally:
+            await conn.execute("RESET lock_timeout")
+    else:
+        await _execute_session(conn, step.sql, lock_timeout)
+
+
+async def _backfill(conn, step, int batch_size, double throttle, int max_passes):
+    while True:
+        first = step.batch_sql(True).rstrip(";")
+        following = step.batch_sql(False).rstrip(";")
+
+        while True:
+            if step.position is None:
+                last = await conn.fetchrow(first, batch_size)
+            else:
+                last = await conn.fetchrow(following, *step.position, batch_size)
+
+            if last is None:
+                break
+
+            step.position = tuple(last)
+            if throttle > 0:
+                await asyncio.sleep(throttle)
+
+        step.position = None
+        step.passes += 1
+        if not await conn.fetchval(step.check):
+            return
+
+        # nullable column: the writers may insert NULL, so the pass that waited for the locks is the last
+        if not step.not_null and not step.skip_locked:
+            return
+
+        if step.passes >= max_passes:
+            raise RuntimeError(f"Backfill of {step.table}.{step.column} still has NULL values after {step.passes} passes, "
+                               "check the writers of the table and the default, or raise backfill_passes")
+
+        # the locked rows are skipped at the first pass
+        step.skip_locked = False
+
+
+async def _execute_session(conn, str sql, str lock_timeout, *args):
+    # outside of transaction, CONCURRENTLY is not allowed in transaction block
+    await conn.execute(f"SET lock_timeout = {conn.dialect.quote_value(lock_timeout)}")
+    try:
+        return await conn.execute(sql.rstrip(";"), *args)
+    finally:
+        await conn.execute("RESET lock_timeout")
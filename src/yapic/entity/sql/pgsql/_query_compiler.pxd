@@ -11,3 +11,4 @@ cdef class PostgreQueryCompiler(QueryCompiler):
     cdef int skip_alias
 
     cpdef init_subquery(self, PostgreQueryCompiler parent)
+    cdef str _in_array_type(self, object left, object values)
@@ -207,6 +207,13 @@ cdef class PostgreQueryCompiler(QueryCompiler):
         if isinstance(right, ConstExpression):
             value = (<ConstExpression>right).value
             if isinstance(value, (list, tuple)):
+                array_type = self._in_array_type(left, value)
+                if array_type is not None:
+                    # one array parameter, so the sql is independent of the number of values
+                    self.params.append(list(value))
+                    op = " <> ALL" if expr.negated else " = ANY"
+                    return f"{self.visit(left)}{op}(${len(self.params)}::{array_type}[])"
+
                 entries = [self.visit(x) for x in value]
             else:
                 entries = [self.visit(value)]
@@ -219,6 +226,19 @@ cdef class PostgreQueryCompiler(QueryCompiler):
         else:
             return f"FALSE"
 
+    cdef str _in_array_type(self, object left, object values):
+        if self.inline_values or not isinstance(left, Field):
+            return None
+
+        if isinstance((<Field>left)._impl_, (JsonImpl, CompositeImpl, ArrayImpl)):
+            return None
+
+        for v in values:
+            if isinstance(v, Expression):
+                return None
+
+        return self.dialect.get_field_type(<Field>left).name
+
     def visit_binary_startswith(self, BinaryExpression expr):
         left = expr.left
         right = expr.right
@@ -300,6 +320,27 @@ cdef class PostgreQueryCompiler(QueryCompiler):
     def visit_column_ref(self, ColumnRefExpression expr):
         return str(expr.index + 1)
 
+    cpdef compile_select_many(self, list queries):
+        """ One select, what returns the rows of each query as an array of records in separate columns,
+        returns ``(sql, params, compilers)``, where compilers contains the finalized query and rcos of each query
+        """
+        cdef PostgreQueryCompiler qc
+        cdef list columns = []
+        cdef list compilers = []
+
+        self.params = []
+        self.inline_values = False
+
+        for i, q in enumerate(queries):
+            qc = self.dialect.create_query_compiler()
+            qc.init_subquery(self)
+            sql, _ = qc.compile_select(q)
+            alias = self.dialect.quote_ident(f"q{i}")
+            columns.append(f"ARRAY(SELECT {alias} FROM ({sql}) {alias})")
+            compilers.append(qc)
+
+        return f"SELECT {', '.join(columns)}", self.params, compilers
+
     def visit_query(self, expr):
         cdef PostgreQueryCompiler qc = self.dialect.create_query_compiler()
         qc.init_subquery(self)
@@ -546,6 +587,41 @@ cdef class PostgreQueryCompiler(QueryCompiler):
 
         return "".join(q), self.params
 
+    cpdef compile_upsert(self, EntityType entity, list names, list rows, list conflict, list updates):
+        """ Multi-row ``INSERT ... ON CONFLICT``, every row must contain the values of ``names`` """
+        self.params = []
+        self.inline_values = False
+
+        cdef list row_values = []
+        cdef list inserts
+
+        for values in rows:
+            inserts = []
+            for v in <list>values:
+                if isinstance(v, Expression):
+                    inserts.append((<Expression>v).visit(self))
+                else:
+                    self.params.append(v)
+                    inserts.append(f"${len(self.params)}")
+            row_values.append(f"({', '.join(inserts)})")
+
+        q = ["INSERT INTO ", self.dialect.table_qname(get_alias_target(entity)),
+            " (", ", ".join(names), ") VALUES ", ", ".join(row_values), " ON CONFLICT "]
+
+        if conflict:
+            q.extend(("(", ", ".join(conflict), ") "))
+
+        if updates:
+            q.append("DO UPDATE SET ")
+            for i, name in enumerate(updates):
+                if i:
+                    q.append(", ")
+                q.extend((name, "=EXCLUDED.", name))
+        else:
+            q.append("DO NOTHING")
+
+        return "".join(q), self.params
+
     cpdef compile_update(self, EntityType entity, list attrs, list names, list values, list where, bint inline_values=False):
         if not values:
             return (None, None)
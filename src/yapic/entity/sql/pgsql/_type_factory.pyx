@@ -1,5 +1,6 @@
 from datetime import date, datetime, time
 from decimal import Decimal
+from uuid import UUID
 from cpython.object cimport PyObject
 from cpython.weakref cimport PyWeakref_NewRef, PyWeakref_GetObject
 
@@ -361,7 +362,7 @@ cdef class FloatType(PostgreType):
         if value is None:
             return None
 
-        if isinstance(value, str):
+        if isinstance(value, (str, Decimal)):
             return float(value)
         else:
             return value
@@ -372,6 +373,8 @@ cdef class UUIDType(PostgreType):
         return value
 
     cpdef object decode(self, object value):
+        if isinstance(value, str):
+            return UUID(value)
         return value
 
 
@@ -462,19 +465,28 @@ cdef class PointType(PostgreType):
 
 
 cdef class PostGISGeometryType(PostgreType):
+    cdef readonly int srid
+
     def __init__(self, str name, srid):
         typestr = f"geometry({name}, {srid})" if srid else f"geometry({name})"
         PostgreType.__init__(self, typestr)
+        self.srid = srid or 0
 
 
 cdef class PostGISGeographyType(PostgreType):
+    cdef readonly int srid
+
     def __init__(self, str name, srid):
         typestr = f"geography({name}, {srid})" if srid else f"geography({name})"
         PostgreType.__init__(self, typestr)
+        self.srid = srid or 0
 
 
+# entities are encoded only with binary codecs (ewkb_encode), otherwise PostGISImpl.data_for_write is used
 cdef class PostGISPointType(PostGISGeometryType):
     cpdef object encode(self, object value):
+        if isinstance(value, EntityBase):
+            return (value.x, value.y, value.srid or self.srid)
         return value
 
     cpdef object decode(self, object value):
@@ -483,8 +495,12 @@ cdef class PostGISPointType(PostGISGeometryType):
 
 cdef class PostGISLatLngType(PostGISGeographyType):
     cpdef object encode(self, object value):
+        if isinstance(value, EntityBase):
+            return (value.lng, value.lat, value.srid or self.srid)
         return value
 
     cpdef object decode(self, object value):
+        if isinstance(value, tuple):
+            return (value[1], value[0], value[2])
         return value
 
@@ -0,0 +1,40 @@
+import struct
+
+
+cdef unsigned int EWKB_POINT = 1
+cdef unsigned int EWKB_SRID = 0x20000000
+cdef unsigned int EWKB_FLAGS = 0xF0000000
+
+cdef object POINT = struct.Struct("<BIdd")
+cdef object POINT_SRID = struct.Struct("<BIIdd")
+
+
+def ewkb_encode(object value):
+    """ (x, y, srid) -> EWKB point, bytes are passed as is """
+    if isinstance(value, bytes):
+        return value
+
+    x, y, srid = value
+    if srid:
+        return POINT_SRID.pack(1, EWKB_POINT | EWKB_SRID, srid, x, y)
+    else:
+        return POINT.pack(1, EWKB_POINT, x, y)
+
+
+def ewkb_decode(bytes data):
+    """ EWKB point -> (x, y, srid), other geometries are returned as is """
+    cdef str order = "<" if data[0] == 1 else ">"
+    cdef unsigned int geom_type
+    cdef unsigned int srid = 0
+    cdef int offset = 5
+
+    geom_type = struct.unpack_from(f"{order}I", data, 1)[0]
+    if geom_type & EWKB_SRID:
+        srid = struct.unpack_from(f"{order}I", data, 5)[0]
+        offset = 9
+
+    if geom_type & ~EWKB_FLAGS != EWKB_POINT:
+        return data
+
+    x, y = struct.unpack_from(f"{order}dd", data, offset)
+    return (x, y, srid)
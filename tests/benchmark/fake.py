@@ -0,0 +1,56 @@
+from yapic.entity._expression import AliasExpression
+from yapic.entity._field import Field
+from yapic.entity._field_impl import BoolImpl, FloatImpl, StringImpl
+from yapic.entity.sql import PostgreDialect, Query
+from yapic.entity.sql._record_converter import RCState, convert_record
+
+dialect = PostgreDialect()
+
+
+class FakeConnection:
+    """ Enough of connection to convert records without database """
+
+    def __init__(self):
+        self.dialect = dialect
+
+
+def compile_select(q: Query):
+    qc = dialect.create_query_compiler()
+    sql, params = qc.compile_select(q)
+    return qc, sql, params
+
+
+def make_record(columns, n, values=None, many=10):
+    """ Creates a tuple, what can be used as ``asyncpg.Record`` for the given
+    (compiled) query columns. Sub entities are nested tuples, and many relations
+    are list of tuples, like as postgres returns them.
+    """
+    return tuple(_column_value(column, n, values, many) for column in columns)
+
+
+def _column_value(column, n, values, many):
+    if isinstance(column, AliasExpression) and isinstance(column.expr, Query):
+        query = column.expr
+        if query._as_row:
+            return make_record(query._columns, n, values, many)
+        else:
+            subq = query._select_from[0].expr
+            return [make_record(subq._columns, n * many + i, values, many) for i in range(many)]
+    elif isinstance(column, Field):
+        if values and column._name_ in values:
+            return values[column._name_]
+
+        impl = column._impl_
+        if isinstance(impl, StringImpl):
+            return f"{column._name_} {n}"
+        elif isinstance(impl, BoolImpl):
+            return n % 2 == 0
+        elif isinstance(impl, FloatImpl):
+            return n / 2
+    return n
+
+
+def convert_records(qc, records):
+    state = RCState(FakeConnection())
+    rcos_list = qc.rcos_list
+    return [convert_record(record, rcos_list, state) for record in records]
@@ -0,0 +1,105 @@
+from yapic.entity import Auto, Bool, Entity, Float, ForeignKey, Int, Many, One, Registry, Serial, String
+
+MODULE_HEADER = """\
+from yapic.entity import Entity, Registry, Serial, Int, String, One, Many, ForeignKey
+
+registry = Registry()
+
+
+class BaseEntity(Entity, registry=registry, lazy={lazy}, _root=True):
+    pass
+"""
+
+ENTITY_TEMPLATE = """
+class Node{i}(BaseEntity):
+    id: Serial
+    name: String
+    next_id: Int = ForeignKey("Node{next}.id")
+    far_id: Int = ForeignKey("Node{far}.id")
+    next: One["Node{next}"] = "Node{i}.next_id == Node{next}.id"
+    far: One["Node{far}"] = "Node{i}.far_id == Node{far}.id"
+    far_children: Many["Node{back}"] = "Node{i}.id == Node{back}.far_id"
+"""
+
+
+def generate_models(count: int, lazy: bool = False) -> str:
+    """ Generates module source with ``count`` entities, where each entity references
+    the next one and the one in the half distance, so half of the entities are
+    deferred at the same time while the module is executed
+    """
+    half = count // 2
+    parts = [MODULE_HEADER.format(lazy=lazy)]
+
+    for i in range(count):
+        parts.append(ENTITY_TEMPLATE.format(i=i, next=(i + 1) % count, far=(i + half) % count, back=(i - half) % count))
+
+    return "".join(parts)
+
+
+registry = Registry()
+
+
+class BaseEntity(Entity, registry=registry, schema="benchmark", _root=True):
+    pass
+
+
+class Address(BaseEntity):
+    id: Serial
+    city: String
+    street: String
+
+
+class User(BaseEntity):
+    id: Serial
+    name: String
+    email: String
+    age: Int
+    score: Float
+    active: Bool
+    address_id: Auto = ForeignKey(Address.id)
+    address: One[Address]
+    tags: Many["Tag"]
+
+
+class Reading(BaseEntity):
+    id: Serial
+    sensor_id: Int
+    sequence: Int
+    value: Float
+    min_value: Float
+    max_value: Float
+    valid: Bool
+    calibrated: Bool
+    unit: String
+
+
+class CompactReading(BaseEntity, compact=True):
+    id: Serial
+    sensor_id: Int
+    sequence: Int
+    value: Float
+    min_value: Float
+    max_value: Float
+    valid: Bool
+    calibrated: Bool
+    unit: String
+
+
+class Tag(BaseEntity):
+    id: Serial
+    user_id: Auto = ForeignKey(User.id)
+    label: String
+
+
+class Employee(BaseEntity, polymorph="variant"):
+    id: Serial
+    variant: String
+    name: String
+
+
+class Manager(Employee, polymorph_id="manager"):
+    manager_field: String
+
+
+class Worker(Employee, polymorph_id="worker"):
+    worker_field: String
@@ -0,0 +1,96 @@
+import tracemalloc
+
+import pytest
+from yapic import json
+from yapic.entity._entity import EntityState
+
+from .models import Address, CompactReading, Reading, Tag, User
+
+pytest.importorskip("pytest_benchmark")
+
+COUNT = 1000
+
+
+def make_users(count):
+    return [
+        User(name=f"User {i}", email=f"user{i}@example.com", age=i, score=i / 2, active=True)
+        for i in range(count)
+    ]
+
+
+def loaded_user(i):
+    state = EntityState(User)
+    state.update({"id": i, "name": f"User {i}", "email": f"user{i}@example.com", "age": i}, True)
+    return User(state)
+
+
+def test_entity_construct(benchmark):
+    users = benchmark(make_users, COUNT)
+    assert len(users) == COUNT
+    assert users[-1].age == COUNT - 1
+
+
+def test_entity_is_dirty(benchmark):
+    users = [loaded_user(i) for i in range(COUNT)]
+    for user in users[::2]:
+        user.age += 1
+
+    def is_dirty():
+        return sum(1 for user in users if user.__state__.is_dirty)
+
+    assert benchmark(is_dirty) == COUNT // 2
+
+
+def test_entity_changes(benchmark):
+    users = [loaded_user(i) for i in range(COUNT)]
+    for user in users:
+        user.name = "Changed"
+
+    def changes():
+        return [user.__state__.changes() for user in users]
+
+    result = benchmark(changes)
+    assert result[0] == {"name": "Changed"}
+
+
+def test_entity_serialize(benchmark):
+    users = make_users(COUNT)
+    for i, user in enumerate(users):
+        user.address = Address(city="City", street=f"Street {i}")
+        user.tags = [Tag(label=f"tag {j}") for j in range(5)]
+
+    result = json.loads(benchmark(json.dumps, users))
+    assert result[0]["address"]["city"] == "City"
+    assert len(result[0]["tags"]) == 5
+
+
+def loaded_reading(entity, i):
+    state = EntityState(entity)
+    state.update({
+        "id": 100000 + i,
+        "sensor_id": 5000 + i % 100,
+        "sequence": 1 << 40 | i,
+        "value": i / 3,
+        "min_value": i / 7,
+        "max_value": i / 5,
+        "valid": True,
+        "calibrated": i % 2 == 0,
+        "unit": "C",
+    }, True)
+    return entity(state)
+
+
+@pytest.mark.parametrize("entity", [Reading, CompactReading], ids=["boxed", "compact"])
+def test_entity_state_memory(benchmark, entity):
+    def load():
+        return [loaded_reading(entity, i) for i in range(COUNT)]
+
+    load()
+    tracemalloc.start()
+    readings = load()
+    benchmark.extra_info["bytes_per_entity"] = tracemalloc.get_traced_memory()[0] // COUNT
+    tracemalloc.stop()
+    assert readings[1].sequence == 1 << 40 | 1
+    assert readings[3].value == 1.0
+
+    benchmark(load)
@@ -0,0 +1,101 @@
+import tracemalloc
+
+import pytest
+from yapic.entity import Query, and_, or_
+
+from .fake import compile_select, convert_records, make_record
+from .models import Employee, Manager, User, Worker
+
+pytest.importorskip("pytest_benchmark")
+
+ROWS = 1000
+
+
+def build_query():
+    return Query(User) \
+        .where(User.name == "Jhon", User.age > 18) \
+        .where(User.address.city == "Budapest") \
+        .order(User.id.desc()) \
+        .limit(10)
+
+
+def test_query_build(benchmark):
+    q = benchmark(build_query)
+    assert isinstance(q, Query)
+
+
+def test_query_compile_select(benchmark):
+    _, sql, params = benchmark(lambda: compile_select(build_query()))
+    assert sql.startswith("SELECT")
+    assert "JOIN" in sql
+    assert len(params) == 3
+
+
+def build_wide_where():
+    # 200 predicates, with mixed operators
+    predicates = []
+    for i in range(50):
+        predicates.append(or_(User.age > i, User.age <= -i))
+        predicates.append(and_(User.name != f"name {i}", ~(User.id == i)))
+    return Query(User).where(and_(*predicates))
+
+
+def test_query_compile_wide_where(benchmark):
+    q = build_wide_where()
+    _, sql, params = benchmark(compile_select, q)
+    assert sql.count(" OR ") == 50
+    assert len(params) > 100
+
+
+BASE_QUERY = Query(User).where(User.age > 18).load(User, User.address)
+
+
+def derive_mutable(i):
+    # without freeze, the base must be cloned before each variant
+    return BASE_QUERY.clone().where(User.name == f"name {i}").order(User.id.desc()).limit(10)
+
+
+def derive_frozen(i, base=BASE_QUERY.freeze()):
+    return base.where(User.name == f"name {i}").order(User.id.desc()).limit(10)
+
+
+@pytest.mark.parametrize("derive", [derive_mutable, derive_frozen], ids=["mutable", "frozen"])
+def test_query_derive_variant(benchmark, derive):
+    def derive_and_compile():
+        for i in range(10):
+            compile_select(derive(i))
+
+    derive_and_compile()
+    tracemalloc.start()
+    compile_select(derive(0))
+    benchmark.extra_info["peak_alloc_per_request"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    benchmark(derive_and_compile)
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        lambda: Query(User),
+        lambda: Query(User).load(User, User.address),
+        lambda: Query(User).load(User, User.tags),
+        lambda: Query(Employee),
+    ],
+    ids=["flat", "joined", "many", "polymorph"],
+)
+def test_query_convert_record(benchmark, query):
+    qc, _, _ = compile_select(query())
+    records = [make_record(qc.query._columns, i, {"variant": "worker"}) for i in range(ROWS)]
+
+    result = benchmark(convert_records, qc, records)
+    assert len(result) == ROWS
+
+    entity = result[-1]
+    assert entity.id == ROWS - 1
+
+    if isinstance(entity, User):
+        assert entity.name == f"name {ROWS - 1}"
+    else:
+        assert isinstance(entity, Worker)
+        assert not isinstance(entity, Manager)
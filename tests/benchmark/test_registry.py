@@ -0,0 +1,31 @@
+import pytest
+from yapic.entity import ForeignKey
+
+from .models import generate_models
+
+pytest.importorskip("pytest_benchmark")
+
+ENTITY_COUNT = 2000
+
+
+def test_registry_resolve(benchmark):
+    code = compile(generate_models(ENTITY_COUNT), "<benchmark models>", "exec")
+    scopes = []
+
+    def setup():
+        scope = {}
+        scopes.append(scope)
+        return (code, scope), {}
+
+    benchmark.pedantic(exec, setup=setup, rounds=3)
+
+    for scope in scopes:
+        registry = scope["registry"]
+        assert registry.deferred == []
+        # every entity has an id sequence
+        assert len(registry.entities) == ENTITY_COUNT * 2
+
+    registry = scopes[-1]["registry"]
+    node0 = registry["Node0"]
+    assert node0.next_id.get_ext(ForeignKey).ref is registry["Node1"].id
+    assert node0.far_id.get_ext(ForeignKey).ref is registry[f"Node{ENTITY_COUNT // 2}"].id
@@ -0,0 +1,46 @@
+import pytest
+from yapic.entity import Entity, Serial, Auto, ForeignKey, Many, Registry, save_operations
+from yapic.entity._entity_operation import EntityOperation
+
+pytest.importorskip("pytest_benchmark")
+
+LINE_COUNT = 1000
+PART_COUNT = 9
+
+registry = Registry()
+
+
+class BaseEntity(Entity, registry=registry, _root=True):
+    pass
+
+
+class Order(BaseEntity):
+    id: Serial
+    lines: Many["OrderLine"]
+
+
+class OrderLine(BaseEntity):
+    id: Serial
+    order_id: Auto = ForeignKey(Order.id)
+    parts: Many["OrderLinePart"]
+
+
+class OrderLinePart(BaseEntity):
+    id: Serial
+    line_id: Auto = ForeignKey(OrderLine.id)
+
+
+def test_save_operations(benchmark):
+    order = Order(lines=[OrderLine(parts=[OrderLinePart() for _ in range(PART_COUNT)]) for _ in range(LINE_COUNT)])
+
+    ops = benchmark.pedantic(save_operations, args=(order, ), rounds=3)
+    benchmark.extra_info["nodes"] = 1 + LINE_COUNT + LINE_COUNT * PART_COUNT
+
+    inserts = [val for op, val in ops if op is not EntityOperation.UPDATE_ATTR]
+    assert len(inserts) == 1 + LINE_COUNT + LINE_COUNT * PART_COUNT
+    assert inserts[0] is order
+
+    # parents always precede their children
+    rank = {Order: 0, OrderLine: 1, OrderLinePart: 2}
+    ranks = [rank[type(val)] for val in inserts]
+    assert ranks == sorted(ranks)
@@ -0,0 +1,55 @@
+import importlib.util
+import sys
+import tracemalloc
+from itertools import count
+
+import pytest
+
+from .models import generate_models
+
+pytest.importorskip("pytest_benchmark")
+
+ENTITY_COUNT = 600
+MODULE_ID = count()
+
+
+def import_models(path):
+    name = f"benchmark_models_{next(MODULE_ID)}"
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        del sys.modules[name]
+    return module
+
+
+@pytest.mark.parametrize("lazy", [False, True], ids=["eager", "lazy"])
+def test_import_models(benchmark, tmp_path, lazy):
+    path = tmp_path / "models.py"
+    path.write_text(generate_models(ENTITY_COUNT, lazy=lazy))
+
+    memory = []
+
+    def traced_import():
+        # measured in the benchmarked rounds, the tracing overhead is included in the timing of both modes
+        tracemalloc.start()
+        try:
+            module = import_models(path)
+            memory.append(tracemalloc.get_traced_memory())
+        finally:
+            tracemalloc.stop()
+        return module
+
+    module = benchmark.pedantic(traced_import, rounds=3)
+    benchmark.extra_info["allocated_kb"] = max(size for size, _ in memory) // 1024
+    benchmark.extra_info["peak_kb"] = max(peak for _, peak in memory) // 1024
+    registry = module.registry
+
+    if lazy:
+        assert registry.deferred == []
+        registry.finalize()
+
+    assert registry.deferred == []
+    assert module.Node0().name is None
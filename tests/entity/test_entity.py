@@ -1,5 +1,5 @@
 import pytest
-from yapic.entity import Entity, String, Int, Serial, One, Many, DontSerialize, ForeignKey
+from yapic.entity import Entity, String, Int, Float, Bool, Serial, One, Many, DontSerialize, ForeignKey, Registry, Json, virtual
 from yapic.entity._entity import EntityState
 from yapic.entity._field import FieldExtension, Field
 from yapic import json
@@ -132,6 +132,139 @@ def test_entity_state_usage():
     assert changes == {"name": "New Name"}
 
 
+def test_entity_state_dirty_tracking():
+    class DirtyPoint(Entity):
+        x: Int
+        y: Int
+
+    attrs = {"__annotations__": {f"field_{i}": Int for i in range(80)}}
+    attrs["__annotations__"]["point"] = Json[DirtyPoint]
+    Wide = type("Wide", (Entity, ), attrs)
+
+    wide = Wide(field_0=1, field_70=2, point={"x": 1, "y": 1})
+    assert wide.__state__.is_dirty
+    assert set(wide.__state__.changes()) == {"field_0", "field_70", "point"}
+
+    wide.__state__.reset()
+    wide.point.__state__.reset()
+    assert not wide.__state__.is_dirty
+    assert wide.__state__.changes() == {}
+
+    wide.field_65 = 3
+    assert wide.__state__.changes() == {"field_65": 3}
+
+    wide.__state__.reset()
+    wide.field_65 = 3
+    assert not wide.__state__.is_dirty
+
+    # in place modification
+    wide.point.x = 2
+    assert wide.__state__.changes() == {"point": wide.point}
+
+    wide.__state__.reset()
+    wide.point.__state__.reset()
+    del wide.field_0
+    assert not wide.__state__.is_dirty
+    assert wide.field_0 == 1
+
+
+def test_compact_entity_state():
+    class CompactPoint(Entity, compact=True):
+        id: Serial
+        x: Float
+        visible: Bool
+        name: String
+
+    state = EntityState(CompactPoint)
+    state.update({"id": 1, "x": 1.5, "visible": True, "name": "A"}, True)
+    point = CompactPoint(state)
+
+    assert point.id == 1
+    assert point.x == 1.5
+    assert point.visible is True
+    assert point.name == "A"
+    assert point.__pk__ == (1, )
+    assert not point.__state__.is_dirty
+
+    point.x = 2.5
+    assert point.__state__.changes() == {"x": 2.5}
+    assert point.__state__.changes_with_previous() == {"x": (1.5, 2.5)}
+
+    point.__state__.reset()
+    assert point.x == 2.5
+    assert point.id == 1
+    assert point.__state__.changes() == {}
+
+    point.visible = None
+    point.__state__.reset()
+    assert point.visible is None
+
+    state = EntityState(CompactPoint)
+    state.update({"id": 2**70, "visible": False}, True)
+    point = CompactPoint(state)
+    assert point.id == 2**70
+    assert point.visible is False
+    assert point.x is None
+
+
+def test_lazy_entity():
+    registry = Registry()
+
+    class LazyBase(Entity, registry=registry, lazy=True, _root=True):
+        pass
+
+    class LazyA(LazyBase):
+        id: Serial
+        name: String = "default"
+        b_id: Int = ForeignKey("LazyB.id")
+
+    class LazyB(LazyBase):
+        id: Serial
+
+    def is_built(entity):
+        return not any(type(v).__name__ == "LazyAttribute" for v in entity.__dict__.values())
+
+    assert not is_built(LazyA)
+    assert not is_built(LazyB)
+
+    # first access builds LazyA, and LazyB through the foreign key
+    assert isinstance(LazyA.name, Field)
+    assert is_built(LazyA)
+    assert LazyA.__fields__[1] is LazyA.name
+    assert LazyA.b_id.get_ext(ForeignKey).ref is LazyB.id
+    assert LazyA().name == "default"
+    assert registry.deferred == []
+
+    # not annotated attributes
+    class LazyD(LazyBase):
+        id: Serial
+        name: String
+
+        @virtual
+        def upper_name(self):
+            return self.name.upper()
+
+    assert not is_built(LazyD)
+    assert LazyD.upper_name._key_ == "upper_name"
+    assert is_built(LazyD)
+
+    # the entity attributes build the entity
+    class LazyC(LazyBase):
+        id: Serial
+
+    assert not is_built(LazyC)
+    assert LazyC.__pk__ == (LazyC.id,)
+    assert is_built(LazyC)
+
+    class LazyE(LazyBase):
+        id: Serial
+
+    assert not is_built(LazyE)
+    registry.finalize()
+    assert is_built(LazyE)
+    assert LazyE.__fields__ == (LazyE.id,)
+
+
 def test_entity_iter():
 
     class User3(Entity):
@@ -182,3 +315,54 @@ def test_entity_serialize_skip_none():
     addr = User4Addr(id=42)
     serialized = json.dumps(addr)
     assert serialized == """{"id":42}"""
+
+
+def test_cached_virtual():
+    calls = []
+    registry = Registry()
+
+    class CachedVirtual(Entity, registry=registry):
+        id: Serial
+        first: String
+        last: String
+        other: String
+
+        @virtual(depends=("first", "last"), cache=True)
+        def full(self):
+            calls.append(1)
+            return f"{self.first} {self.last}"
+
+        @virtual(cache=True)
+        def without_deps(self):
+            calls.append(2)
+            return self.first
+
+    ent = CachedVirtual(first="John", last="Doe")
+    assert ent.full == "John Doe"
+    assert ent.full == "John Doe"
+    assert calls == [1]
+
+    # not a dependency
+    ent.other = "x"
+    assert ent.full == "John Doe"
+    assert calls == [1]
+
+    ent.last = "Smith"
+    assert ent.full == "John Smith"
+    assert calls == [1, 1]
+
+    del ent.first
+    assert ent.full == "None Smith"
+    assert calls == [1, 1, 1]
+
+    # without depends, invalidated by any change
+    assert ent.without_deps is None
+    assert ent.without_deps is None
+    assert calls == [1, 1, 1, 2]
+    ent.other = "y"
+    ent.first = "Jane"
+    assert ent.without_deps == "Jane"
+    assert calls == [1, 1, 1, 2, 2]
+
+    # cached value is not a change
+    assert "full" not in ent.__state__.changes()
@@ -97,6 +97,23 @@ def test_relation_many():
     assert binst.n_many == [g3, g4]
     assert binst.__state__.changes(B.n_many) == ([g3, g4], [ginst2], [])
 
+    binst.__state__.reset()
+    g3.__state__.reset()
+    g4.__state__.reset()
+    g3.name = "changed"
+    g5 = GlobalA(id=5)
+    binst.n_many = [g4, g3, g5]
+    assert binst.__state__.changes(B.n_many) == ([g5], [], [g3])
+
+    binst.__state__.reset()
+    many = [GlobalA(id=i) for i in range(100, 5100)]
+    for g in many:
+        g.__state__.reset()
+    binst.n_many = many
+    binst.__state__.reset()
+    binst.n_many = many[1:] + [GlobalA(id=1)]
+    assert binst.__state__.changes(B.n_many) == ([binst.n_many[-1]], [many[0]], [])
+
     # binst.n_many = [10, 11, 12]
     # assert len(binst.n_many.__added__) == 3
     # assert len(binst.n_many.__removed__) == 2
@@ -189,3 +206,62 @@ def test_get_foreign_key_refs():
 
     result = registry.get_foreign_key_refs(B.id)
     assert result[0] == (C, ["b_id"])
+
+    result = registry.get_referenced_foreign_keys(A.id)
+    assert [(ent, [g.name for g in groups]) for ent, groups in result] == [
+        (B, ["fk_B__a_id-A__id"]),
+        (C, ["fk_C__a_id-A__id"]),
+        (D, ["fk_D__a_id_1-A__id", "fk_D__a_id_2-A__id"]),
+    ]
+
+    registry.remove(C)
+    assert "C" not in registry.keys()
+    assert registry.get_foreign_key_refs(B.id) == []
+    assert [ent for ent, _ in registry.get_referenced_foreign_keys(A.id)] == [B, D]
+
+
+def test_get_foreign_key_refs_lazy():
+    registry = Registry()
+
+    class LazyBase(Entity, registry=registry, lazy=True, _root=True):
+        pass
+
+    class A(LazyBase):
+        id: Serial
+
+    class B(LazyBase):
+        id: Serial
+        a_id: Auto = ForeignKey(A.id)
+
+    class C(LazyBase):
+        id: Serial
+        a_id: Auto = ForeignKey("A.id")
+
+    # the referencing entities are not built yet
+    assert registry.get_foreign_key_refs(A.id) == [(B, ["a_id"]), (C, ["a_id"])]
+    assert [ent for ent, _ in registry.get_referenced_foreign_keys(A.id)] == [B, C]
+
+
+def test_resolve_waiting_for_name():
+    registry = Registry()
+
+    class A(Entity, registry=registry):
+        id: Serial
+        c_id: Auto = ForeignKey("C.id")
+        c: One["C"]
+
+    class B(Entity, registry=registry):
+        id: Serial
+        a_id: Auto = ForeignKey("A.id")
+        c_id: Auto = ForeignKey("C.id")
+
+    assert registry.deferred == [A, B]
+
+    class C(Entity, registry=registry):
+        id: Serial
+
+    assert registry.deferred == []
+    assert A.c_id.get_ext(ForeignKey).ref is C.id
+    assert B.a_id.get_ext(ForeignKey).ref is A.id
+    assert B.c_id.get_ext(ForeignKey).ref is C.id
+    assert isinstance(A.c, Relation)
@@ -98,6 +98,21 @@ async def pgsql(pgsql_docker):
             return
 
 
+@pytest_asyncio.fixture
+async def pgsql_replica(pgsql):
+    # second instance with PG_REPLICA_HOST / PG_REPLICA_PORT, otherwise the same server
+    host = os.getenv("PG_REPLICA_HOST", "postgre" if IN_DOCKER else "127.0.0.1")
+    port = int(os.getenv("PG_REPLICA_PORT", "5432"))
+    connection = await asyncpg.connect(user="postgres",
+                                       password="root",
+                                       database="root",
+                                       host=host,
+                                       port=port,
+                                       connection_class=PostgreConnection)
+    yield connection
+    await connection.close()
+
+
 @pytest_asyncio.fixture
 async def conn(pgsql):
     await pgsql.execute('CREATE EXTENSION IF NOT EXISTS "postgis"')
@@ -1,5 +1,6 @@
 # flake8: noqa: E501
 
+import asyncio
 from datetime import date, datetime, time, timedelta, tzinfo
 from decimal import Decimal
 from typing import List, TypedDict
@@ -27,6 +28,7 @@ from yapic.entity import (
     Index,
     Int,
     Json,
+    LazyDecode,
     MissingRow,
     MultipleRows,
     Numeric,
@@ -45,7 +47,7 @@ from yapic.entity import (
     virtual,
 )
 from yapic.entity.field import Choice
-from yapic.entity.sql import PostgreDialect
+from yapic.entity.sql import PostgreDialect, QueryObserver
 from yapic.entity.sql import sync as _sync
 
 pytestmark = pytest.mark.asyncio
@@ -1650,3 +1652,463 @@ async def test_lock(conn, pgclean):
         await conn.select(Query(User).for_update(nowait=True))
         await conn.select(Query(User).for_update(skip=True))
 
+
+
+async def test_observer(conn, pgclean):
+    reg = Registry()
+
+    class Product(Entity, schema="execution", registry=reg):
+        id: Int
+        name: String
+
+    await conn.execute(await sync(conn, reg))
+
+    events = []
+
+    class Observer(QueryObserver):
+        def on_query(self, event):
+            events.append(event)
+
+    observer = Observer()
+    conn.add_observer(observer)
+    try:
+        assert await conn.save(Product(id=1, name="Prod1")) is True
+        rows = await conn.select(Query(Product).where(Product.id.in_(1, 2)))
+        await conn.select(Query(Product).where(Product.id.in_(1, 2, 3))).first()
+
+        with pytest.raises(MissingRow):
+            await conn.select(Query(Product).where(Product.id == 10)).one()
+    finally:
+        conn.remove_observer(observer)
+
+    await conn.select(Query(Product)).fetch()
+
+    assert len(rows) == 1
+    assert [e.kind for e in events] == ["insert", "select", "select", "select"]
+
+    insert, select, first, one = events
+    assert insert.entities == (Product, )
+    assert insert.rows == 1
+    assert insert.sql.startswith("INSERT")
+
+    assert select.entities == (Product, )
+    assert select.rows == 1
+    assert select.params == ([1, 2], )
+    assert select.error is None
+    assert select.fingerprint == first.fingerprint
+    assert select.total_time >= select.finalize_time + select.compile_time + select.convert_time
+
+    assert first.rows == 1
+    assert first.execute_time > 0
+
+    assert one.rows == 0
+    assert isinstance(one.error, MissingRow)
+
+    # failing observer is logged, and does not affect the query
+    class FailingObserver(QueryObserver):
+        def on_query(self, event):
+            raise ValueError("observer")
+
+    events.clear()
+    failing = FailingObserver()
+    conn.add_observer(failing)
+    conn.add_observer(observer)
+    try:
+        assert len(await conn.select(Query(Product))) == 1
+        with pytest.raises(MissingRow):
+            await conn.select(Query(Product).where(Product.id == 10)).one()
+    finally:
+        conn.remove_observer(failing)
+        conn.remove_observer(observer)
+
+    assert [e.kind for e in events] == ["select", "select"]
+
+
+async def test_lazy_decode(conn, pgclean):
+    reg = Registry()
+
+    class LazyPoint(Entity, registry=reg, schema="execution"):
+        x: Int
+        y: Int
+
+    class LazyDoc(Entity, registry=reg, schema="execution"):
+        id: Serial
+        point: Json[LazyPoint] = LazyDecode()
+        tags: Json[List[str]] = LazyDecode()
+        title: String = LazyDecode()
+
+    await conn.execute(await sync(conn, reg))
+    await conn.save(LazyDoc(point={"x": 1, "y": 2}, tags=["a", "b"], title="Doc"))
+
+    doc = await conn.select(Query(LazyDoc)).first()
+    assert doc.__state__.is_dirty is False
+    assert doc.__state__.changes() == {}
+
+    # decode, and change in place
+    assert doc.point.x == 1
+    doc.point.x = 10
+    assert doc.__state__.changes() == {"point": LazyPoint(x=10, y=2)}
+
+    doc.title = "Changed"
+    assert await conn.save(doc) is True
+    assert doc.__state__.is_dirty is False
+
+    doc = await conn.select(Query(LazyDoc)).first()
+    assert doc.point == LazyPoint(x=10, y=2)
+    assert doc.tags == ["a", "b"]
+    assert doc.title == "Changed"
+
+    # set before access
+    doc = await conn.select(Query(LazyDoc)).first()
+    doc.tags = ["c"]
+    assert doc.__state__.changes() == {"tags": ["c"]}
+
+    doc = await conn.select(Query(LazyDoc).where(LazyDoc.id == 10)).first()
+    assert doc is None
+
+
+async def test_json_patch(conn, pgclean):
+    reg = Registry()
+
+    class PatchXY(Entity, registry=reg, schema="execution"):
+        x: Int
+        y: Int
+
+    class PatchName(Entity, registry=reg, schema="execution"):
+        given: String
+        family: String
+        xy: Json[PatchXY]
+
+    class PatchDoc(Entity, registry=reg, schema="execution"):
+        id: Serial
+        name: Json[PatchName]
+
+    await conn.execute(await sync(conn, reg))
+
+    events = []
+
+    class Observer(QueryObserver):
+        def on_query(self, event):
+            if event.kind == "update":
+                events.append(event)
+
+    doc = PatchDoc(name={"given": "Given", "family": "Family", "xy": {"x": 1, "y": 2}})
+    await conn.save(doc)
+
+    observer = Observer()
+    conn.add_observer(observer)
+    try:
+        doc = await conn.select(Query(PatchDoc)).first()
+        doc.name.xy.x = 10
+        doc.name.family = "Changed"
+        assert await conn.save(doc) is True
+
+        # new object: whole document
+        doc.name = PatchName(given="New")
+        assert await conn.save(doc) is True
+    finally:
+        conn.remove_observer(observer)
+
+    patch, full = events
+    assert patch.sql.startswith(
+        """UPDATE "execution"."PatchDoc" SET "name"=jsonb_set(jsonb_set(jsonb_set("name", $1::text[], """
+        """CASE jsonb_typeof("name" #> $1::text[]) WHEN 'object' THEN "name" #> $1::text[] ELSE '{}'::jsonb END, true), """
+        """$2::text[], $3::jsonb, true), $4::text[], $5::jsonb, true)""")
+    assert patch.params[0:5] == [["xy"], ["family"], '"Changed"', ["xy", "x"], "10"]
+    assert full.sql.startswith("""UPDATE "execution"."PatchDoc" SET "name"=$1""")
+
+    doc = await conn.select(Query(PatchDoc)).first()
+    assert doc.name == PatchName(given="New")
+
+    # the parent is missing / null in the stored row, e.g. written by an other process
+    doc.name = PatchName(given="G", xy=PatchXY(x=1, y=2))
+    await conn.save(doc)
+    for i, stored in enumerate("""jsonb_set("name", '{xy}', 'null')""", """"name" - 'xy'"""):
+        doc = await conn.select(Query(PatchDoc)).first()
+        await conn.execute(f"""UPDATE "execution"."PatchDoc" SET "name"={stored}""")
+        doc.name.xy.x = 5 + i
+        assert await conn.save(doc) is True
+
+        doc = await conn.select(Query(PatchDoc)).first()
+        assert doc.name.given == "G"
+        assert doc.name.xy.x == 5 + i
+        assert doc.name.xy.y is None
+
+
+async def test_returning(conn, pgclean):
+    reg = Registry()
+
+    class RetDoc(Entity, registry=reg, schema="execution"):
+        id: Serial
+        title: String
+        counter: Int = 0
+        created_time: CreatedTime
+
+    class RetNone(Entity, registry=reg, schema="execution", returning="none"):
+        id: Int = PrimaryKey()
+        title: String
+
+    await conn.execute(await sync(conn, reg))
+
+    # generated (default): primary key, defaults
+    doc = RetDoc(title="Doc")
+    assert await conn.insert(doc) is True
+    assert doc.id == 1
+    assert doc.counter == 0
+    assert isinstance(doc.created_time, datetime)
+    assert doc.__state__.is_dirty is False
+
+    doc = RetDoc(title="Doc")
+    assert await conn.insert(doc, returning="none") is True
+    assert doc.id is None
+    assert doc.created_time is None
+    assert doc.__state__.exists is True
+    assert doc.__state__.is_dirty is False
+
+    doc = RetDoc(title="Doc")
+    assert await conn.save(doc, returning=["created_time"]) is True
+    assert doc.id == 3
+    assert isinstance(doc.created_time, datetime)
+
+    doc = RetDoc(title="Doc")
+    assert await conn.save(doc, returning=[RetDoc.counter]) is True
+    assert doc.id == 4
+    assert doc.counter == 0
+
+    doc.title = "Changed"
+    assert await conn.update(doc, returning="all") is True
+    assert doc.title == "Changed"
+    assert isinstance(doc.created_time, datetime)
+
+    # entity meta
+    doc = RetNone(id=1, title="None")
+    assert await conn.insert(doc) is True
+    assert doc.__state__.exists is True
+    assert await conn.insert_or_update(RetNone(id=1, title="Changed")) is True
+    assert (await conn.select(Query(RetNone)).first()).title == "Changed"
+
+    with pytest.raises(ValueError, match="Unknown field in returning: 'missing'"):
+        await conn.insert(RetDoc(title="Doc"), returning=["missing"])
+
+
+async def test_upsert_many(conn, pgclean, monkeypatch):
+    reg = Registry()
+
+    class UpsertItem(Entity, registry=reg, schema="execution"):
+        id: Int = PrimaryKey()
+        code: String
+        title: String
+        created_time: CreatedTime
+
+    await conn.execute(await sync(conn, reg))
+
+    items = [UpsertItem(id=i, code=f"C{i}", title=f"Item {i}") for i in range(1, 4)]
+    assert await conn.upsert_many(items) == []
+    for item in items:
+        assert item.__state__.exists is True
+        assert item.__state__.is_dirty is False
+        assert isinstance(item.created_time, datetime)
+
+    # do nothing, report skipped
+    items = [UpsertItem(id=2, code="X", title="Skipped"), UpsertItem(id=4, code="C4", title="Item 4")]
+    skipped = await conn.upsert_many(items, update="none")
+    assert skipped == [items[0]]
+    assert items[0].__state__.exists is False
+    assert items[1].__state__.exists is True
+
+    # update only the given fields, in chunks
+    events = []
+
+    class Observer(QueryObserver):
+        def on_query(self, event):
+            events.append(event)
+
+    import yapic.entity.sql._connection as connection_module
+    monkeypatch.setattr(connection_module, "UPSERT_MAX_PARAMS", 6)
+
+    observer = Observer()
+    conn.add_observer(observer)
+    try:
+        items = [UpsertItem(id=i, code="CHANGED", title=f"Title {i}") for i in range(1, 6)]
+        assert await conn.upsert_many(items, update=["title"]) == []
+    finally:
+        conn.remove_observer(observer)
+
+    assert len(events) == 3
+    assert events[0].sql == (
+        """INSERT INTO "execution"."UpsertItem" ("id", "code", "title") VALUES ($1, $2, $3), ($4, $5, $6)"""
+        """ ON CONFLICT ("id") DO UPDATE SET "title"=EXCLUDED."title\""""
+    )
+
+    rows = await conn.select(Query(UpsertItem).order(UpsertItem.id))
+    assert [(r.id, r.code, r.title) for r in rows] == [
+        (1, "C1", "Title 1"),
+        (2, "C2", "Title 2"),
+        (3, "C3", "Title 3"),
+        (4, "C4", "Title 4"),
+        (5, "CHANGED", "Title 5"),
+    ]
+
+    # expression values use more parameters, than columns
+    events.clear()
+    conn.add_observer(observer)
+    try:
+        items = [UpsertItem(id=i, code="C", title=func.concat("E", "x", str(i))) for i in (1, 2)]
+        assert await conn.upsert_many(items, update=["title"]) == []
+    finally:
+        conn.remove_observer(observer)
+
+    assert [len(event.params) for event in events] == [5, 5]
+    assert [r.title for r in await conn.select(Query(UpsertItem).where(UpsertItem.id <= 2).order(UpsertItem.id))] == ["Ex1", "Ex2"]
+
+    # same conflict key twice, the later one is applied in the next statement
+    monkeypatch.setattr(connection_module, "UPSERT_MAX_PARAMS", 32767)
+    items = [UpsertItem(id=1, code="C1", title="First"), UpsertItem(id=6, code="C6", title="Item 6"),
+             UpsertItem(id=1, code="C1", title="Second")]
+    assert await conn.upsert_many(items) == []
+    assert all(item.__state__.exists for item in items)
+    assert (await conn.select(Query(UpsertItem).where(UpsertItem.id == 1)).one()).title == "Second"
+
+    items = [UpsertItem(id=7, code="C7", title="New"), UpsertItem(id=7, code="C7", title="Duplicate")]
+    assert await conn.upsert_many(items, update="none") == [items[1]]
+    assert (await conn.select(Query(UpsertItem).where(UpsertItem.id == 7)).one()).title == "New"
+
+    # conflict on other columns
+    with pytest.raises(ValueError, match="Missing value of conflict field: 'id'"):
+        await conn.upsert_many([UpsertItem(code="C1")])
+
+
+async def test_query_cache(conn, pgclean):
+    reg = Registry()
+
+    class CacheGroup(Entity, registry=reg, schema="execution"):
+        id: Serial
+        title: String
+
+    class CacheItem(Entity, registry=reg, schema="execution"):
+        id: Serial
+        title: String
+        group_id: Auto = ForeignKey(CacheGroup.id)
+        group: One[CacheGroup]
+
+    await conn.execute(await sync(conn, reg))
+    await conn.save(CacheItem(title="A", group=CacheGroup(title="G")))
+
+    cache = conn.enable_query_cache(size=2)
+    try:
+        q = Query(CacheItem).order(CacheItem.id)
+        first = await conn.select(q, cache=True)
+        second = await conn.select(q, cache=True)
+        assert (cache.misses, cache.hits) == (1, 1)
+        assert [x.title for x in second] == ["A"]
+        assert first[0] is not second[0]
+
+        assert (await conn.select(q, cache=True).first()).title == "A"
+        assert cache.hits == 2
+
+        # not cached
+        await conn.select(q)
+        assert (cache.misses, cache.hits) == (1, 2)
+
+        # write through the connection invalidates
+        await conn.save(CacheItem(title="B"))
+        assert [x.title for x in await conn.select(q, cache=True)] == ["A", "B"]
+        assert (cache.misses, cache.hits) == (2, 2)
+
+        # tagged with the tables of the loaded relations
+        rq = Query(CacheItem).load(CacheItem.group).where(CacheItem.id == 1)
+        assert (await conn.select(rq, cache=True).first()).group.title == "G"
+        assert len(cache) == 2
+        cache.invalidate("execution.CacheGroup")
+        assert len(cache) == 1
+
+        # lru
+        await conn.select(Query(CacheGroup), cache=True)
+        await conn.select(Query(CacheItem).where(CacheItem.id == 2), cache=True)
+        assert len(cache) == 2
+
+        # ttl
+        tq = Query(CacheGroup).where(CacheGroup.id == 1)
+        await conn.select(tq, cache=0.01)
+        await asyncio.sleep(0.02)
+        hits = cache.hits
+        await conn.select(tq, cache=True)
+        assert cache.hits == hits
+
+        # tagged with the tables of the where subqueries
+        cache.clear()
+        sq = Query(CacheItem).where(CacheItem.group_id.in_(Query(CacheGroup).columns(CacheGroup.id).where(CacheGroup.title == "G")))
+        assert [x.title for x in await conn.select(sq, cache=True)] == ["A"]
+        assert len(cache) == 1
+        await conn.save(CacheGroup(title="H"))
+        assert len(cache) == 0
+
+        # not cached in transaction, and invalidated again at the end of the transaction
+        tags = frozenset(["execution.CacheItem"])
+        for commit in (True, False):
+            cache.clear()
+            tx = conn.transaction()
+            await tx.start()
+            await conn.select(q, cache=True)
+            assert len(cache) == 0
+
+            await conn.save(CacheItem(title="T"))
+            # read and cached by an other connection, before the commit
+            cache.set(("stale", ), tags, [])
+            assert len(cache) == 1
+
+            if commit:
+                await tx.commit()
+            else:
+                await tx.rollback()
+            assert len(cache) == 0
+    finally:
+        conn.disable_query_cache()
+
+
+async def test_select_many(conn, pgclean):
+    reg = Registry()
+
+    class ManyGroup(Entity, registry=reg, schema="execution"):
+        id: Serial
+        title: String
+
+    class ManyItem(Entity, registry=reg, schema="execution"):
+        id: Serial
+        title: String
+        group_id: Auto = ForeignKey(ManyGroup.id)
+        group: One[ManyGroup]
+
+    await conn.execute(await sync(conn, reg))
+    await conn.save(ManyItem(title="A", group=ManyGroup(title="G1")))
+    await conn.save(ManyItem(title="B", group=ManyGroup(title="G2")))
+
+    events = []
+
+    class Observer(QueryObserver):
+        def on_query(self, event):
+            events.append(event)
+
+    observer = Observer()
+    conn.add_observer(observer)
+    try:
+        items, groups, empty, columns = await conn.select_many(
+            Query(ManyItem).load(ManyItem.group).order(ManyItem.id.desc()),
+            Query(ManyGroup).where(ManyGroup.title == "G1"),
+            Query(ManyGroup).where(ManyGroup.id > 10),
+            Query().select_from(ManyItem).columns(ManyItem.id, ManyItem.title).where(ManyItem.id == 1),
+        )
+    finally:
+        conn.remove_observer(observer)
+
+    assert len(events) == 1
+    assert events[0].sql.startswith('SELECT ARRAY(SELECT "q0" FROM (SELECT')
+    assert events[0].params == ["G1", 10, 1]
+
+    assert [(x.title, x.group.title) for x in items] == [("B", "G2"), ("A", "G1")]
+    assert [x.title for x in groups] == ["G1"]
+    assert isinstance(groups[0], ManyGroup)
+    assert empty == []
+    assert columns == [(1, "A")]
+
+    assert await conn.select_many() == []
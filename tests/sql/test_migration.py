@@ -0,0 +1,101 @@
+# flake8: noqa: E501
+
+import pytest
+from yapic.entity import Check, DateTimeTz, Entity, Field, ForeignKey, Index, Int, Registry, Serial, String, func
+from yapic.entity.sql import plan_migration, sync
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_online_migration(conn, pgclean):
+    reg = Registry()
+
+    class MigGroup(Entity, schema="_migration", registry=reg):
+        id: Serial
+        title: String
+
+    class MigItem(Entity, schema="_migration", registry=reg):
+        id: Serial
+        title: String
+        group_id: Int
+
+    await conn.execute(await sync(conn, reg))
+    await conn.execute("""INSERT INTO "_migration"."MigGroup" ("title") VALUES ('G')""")
+    await conn.execute("""INSERT INTO "_migration"."MigItem" ("title", "group_id") SELECT 'I' || i, 1 FROM generate_series(1, 25) i""")
+
+    new_reg = Registry()
+
+    class MigGroup(Entity, schema="_migration", registry=new_reg):
+        id: Serial
+        title: String
+
+    class MigItem(Entity, schema="_migration", registry=new_reg):
+        id: Serial
+        title: String = Index()
+        group_id: Int = ForeignKey(MigGroup.id)
+        qty: Int = Field(default=1) // Check("qty >= 0")
+        created_time: DateTimeTz = Field(nullable=False, default=func.now())
+
+    plan = await plan_migration(conn, new_reg)
+    kinds = [step.kind for step in plan]
+    assert "blocking" not in kinds
+    assert "backfill" in kinds
+
+    sqls = [step.sql for step in plan]
+    assert """ALTER TABLE "_migration"."MigItem" ADD COLUMN "created_time" TIMESTAMPTZ;""" in sqls
+    assert """ALTER TABLE "_migration"."MigItem" ALTER COLUMN "created_time" SET DEFAULT now();""" in sqls
+    assert any(sql.startswith("CREATE INDEX CONCURRENTLY") for sql in sqls)
+    assert any(sql.endswith("NOT VALID;") and "FOREIGN KEY" in sql for sql in sqls)
+    assert sum(1 for step in plan if step.kind == "validate") == 3
+    backfill = [step for step in plan if step.kind == "backfill"][0]
+    assert 'WHERE "id" > $1 ORDER BY "id" LIMIT $2' in backfill.sql
+    assert 'SELECT "id" FROM "_migration"."MigItem" ORDER BY "id" LIMIT $1' in backfill.batch_sql(True)
+
+    await plan.execute(conn, batch_size=10, throttle=0, lock_timeout="1s")
+
+    assert await conn.fetchval("""SELECT COUNT(*) FROM "_migration"."MigItem" WHERE "created_time" IS NULL""") == 0
+    assert await conn.fetchval("""SELECT COUNT(*) FROM "_migration"."MigItem" WHERE "qty" = 1""") == 25
+    assert await sync(conn, new_reg) is None
+    assert not await plan_migration(conn, new_reg)
+
+    # type change rewrites the table
+    type_reg = Registry()
+
+    class MigGroup(Entity, schema="_migration", registry=type_reg):
+        id: Serial
+        title: Int
+
+    plan = await plan_migration(conn, type_reg)
+    assert plan.is_blocking
+    with pytest.raises(RuntimeError, match="allow_blocking"):
+        await plan.execute(conn)
+
+
+class NullRemainsConnection:
+    """ Every batch is empty, but NULL remains, like as the writers insert NULL continuously """
+
+    def __init__(self):
+        self.checks = 0
+
+    async def fetchrow(self, sql, *args):
+        return None
+
+    async def fetchval(self, sql, *args):
+        self.checks += 1
+        return True
+
+
+async def test_backfill_passes():
+    from yapic.entity.sql.pgsql._migration import BackfillStep, _backfill
+
+    step = BackfillStep('"T"', '"col"', "now()", ['"id"'])
+    conn = NullRemainsConnection()
+    await _backfill(conn, step, 10, 0, 10)
+    assert step.passes == 2
+    assert step.skip_locked is False
+
+    step = BackfillStep('"T"', '"col"', "now()", ['"id"'], not_null=True)
+    conn = NullRemainsConnection()
+    with pytest.raises(RuntimeError, match="after 3 passes"):
+        await _backfill(conn, step, 10, 0, 3)
+    assert conn.checks == 3
@@ -672,3 +672,70 @@ async def test_reduce_children(conn, pgclean):
     q = Query().select_from(Base).reduce_children(set())
     sql, params = conn.dialect.create_query_compiler().compile_select(q)
     assert sql == '''SELECT "t0"."id", "t0"."type" FROM "reduce_children"."Base" "t0"'''
+
+
+async def test_polymorph_loading(conn, pgclean):
+    R = Registry()
+
+    class Event(Entity, registry=R, schema="poly_loading", polymorph="type", polymorph_loading="select-in"):
+        id: Serial
+        type: String
+
+    class Created(Event, polymorph_id="created"):
+        created_field: String
+
+    class Updated(Event, polymorph_id="updated"):
+        updated_field: String
+
+    class Renamed(Updated, polymorph_id="renamed"):
+        renamed_field: String
+
+    diff = await sync(conn, R)
+    await conn.execute(diff)
+
+    await conn.save(Event())
+    await conn.save(Created(created_field="C"))
+    await conn.save(Renamed(updated_field="U", renamed_field="R"))
+
+    q = Query().select_from(Event).order(Event.id)
+    sql, params = conn.dialect.create_query_compiler().compile_select(q)
+    assert sql == '''SELECT "t0"."id", "t0"."type" FROM "poly_loading"."Event" "t0" ORDER BY "t0"."id" ASC'''
+
+    result = await conn.select(q)
+    assert type(result[0]) is Event
+    assert type(result[1]) is Created
+    assert result[1].created_field == "C"
+    assert type(result[2]) is Renamed
+    assert result[2].updated_field == "U"
+    assert result[2].renamed_field == "R"
+
+    result = await conn.select(q).first()
+    assert type(result) is Event
+
+    result = await conn.select(Query().select_from(Event).where(Event.type == "renamed")).one()
+    assert type(result) is Renamed
+    assert result.renamed_field == "R"
+
+    # override per query
+    q = Query().select_from(Event).order(Event.id).polymorph_loading("joined")
+    sql, params = conn.dialect.create_query_compiler().compile_select(q)
+    assert sql == '''SELECT "t0"."id", "t0"."type", "t1"."created_field", "t2"."updated_field", "t3"."renamed_field" FROM "poly_loading"."Event" "t0" LEFT JOIN "poly_loading"."Created" "t1" ON "t1"."id" = "t0"."id" LEFT JOIN "poly_loading"."Updated" "t2" ON "t2"."id" = "t0"."id" LEFT JOIN "poly_loading"."Renamed" "t3" ON "t3"."id" = "t2"."id" ORDER BY "t0"."id" ASC'''
+    result = await conn.select(q)
+    assert [type(r) for r in result] == [Event, Created, Renamed]
+
+    q = Query().select_from(Event).order(Event.id).polymorph_loading("lazy-subtype")
+    result = await conn.select(q)
+    assert [type(r) for r in result] == [Event, Event, Event]
+
+    result = await conn.load_polymorph(result)
+    assert [type(r) for r in result] == [Event, Created, Renamed]
+    assert result[2].renamed_field == "R"
+
+    with pytest.raises(ValueError):
+        Query().select_from(Event).polymorph_loading("unknown")
+
+    # typo in the meta
+    with pytest.raises(ValueError, match="Invalid polymorph loading strategy: 'select_in'"):
+        class Typo(Entity, registry=Registry(), schema="poly_loading", polymorph="type", polymorph_loading="select_in"):
+            id: Serial
+            type: String
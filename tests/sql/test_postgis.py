@@ -105,3 +105,35 @@ async def test_latlng_isu(conn):
     res = await conn.select(q).first()
     assert res.location.lat == 47.5135873
     assert res.location.lng == 19.0424536
+
+
+async def test_binary_codecs(conn):
+    assert await conn.register_postgis_codecs() is True
+
+    q = Query().select_from(Point).where(Point.id == 1)
+    sql, params = conn.dialect.create_query_compiler().compile_select(q)
+    assert sql == 'SELECT "t0"."id", "t0"."location" FROM "postgis"."Point" "t0" WHERE "t0"."id" = $1'
+
+    p = Point(location=[19.0424536, 47.5135873])
+    assert await conn.insert(p) is True
+    assert p.location.x == 19.0424536
+    assert p.location.srid == 4326
+
+    res = await conn.select(Query().select_from(Point).where(Point.id == p.id)).first()
+    assert res.location.x == 19.0424536
+    assert res.location.y == 47.5135873
+    assert res.location.srid == 4326
+
+    res.location.x = 19.0433738
+    assert await conn.save(res) is True
+    res = await conn.select(Query().select_from(Point).where(Point.id == p.id)).first()
+    assert res.location.x == 19.0433738
+
+    p = LatLng(location=[47.5135873, 19.0424536])
+    assert await conn.insert(p) is True
+
+    res = await conn.select(Query().select_from(LatLng).where(LatLng.id == p.id)).first()
+    assert res.location.lat == 47.5135873
+    assert res.location.lng == 19.0424536
+
+    assert await conn.fetchval("SELECT ST_AsText(location) FROM postgis.\"LatLng\" WHERE id=$1", p.id) == "POINT(19.0424536 47.5135873)"
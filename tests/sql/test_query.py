@@ -172,8 +172,13 @@ def test_in():
     sql, params = dialect.create_query_compiler().compile_select(q)
 
     # assert sql == 'SELECT "t0"."id", "t0"."name", "t0"."email", "t0"."created_time", "t0"."address_id" FROM "User" "t0" WHERE "t0"."id" IN ($1, $2, $3) AND "t0"."id" IN ($1, $2, $3) AND "t0"."id" IN ($1, "t0"."email", $3) AND "t0"."id" IN ($1, "t0"."email", $3)'
-    assert sql == """SELECT "t0"."id", "t0"."name", "t0"."email", "t0"."created_time", "t0"."address_id" FROM "User" "t0" WHERE "t0"."id" IN ($1, $2, $3) AND "t0"."id" NOT IN ($1, $2, $3) AND "t0"."id" IN ($1, $2, $3) AND "t0"."id" IN ($1, "t0"."email", $3) AND "t0"."id" IN ($1, "t0"."email", $3)"""
-    assert params == (1, 2, 3)
+    assert sql == """SELECT "t0"."id", "t0"."name", "t0"."email", "t0"."created_time", "t0"."address_id" FROM "User" "t0" WHERE "t0"."id" = ANY($1::INT4[]) AND "t0"."id" <> ALL($2::INT4[]) AND "t0"."id" = ANY($3::INT4[]) AND "t0"."id" IN ($4, "t0"."email", $5) AND "t0"."id" IN ($4, "t0"."email", $5)"""
+    assert params == ([1, 2, 3], [1, 2, 3], [1, 2, 3], 1, 3)
+
+    q = Query().select_from(User).where(User.id.in_(list(range(10000))))
+    sql, params = dialect.create_query_compiler().compile_select(q)
+    assert sql.endswith('WHERE "t0"."id" = ANY($1::INT4[])')
+    assert params == (list(range(10000)), )
 
 
 def test_in_eq():
@@ -183,8 +188,8 @@ def test_in_eq():
 
     sql, params = dialect.create_query_compiler().compile_select(q)
 
-    assert sql == 'SELECT "t0"."id", "t0"."name", "t0"."email", "t0"."created_time", "t0"."address_id" FROM "User" "t0" WHERE "t0"."id" IN ($1, $2, $3) IS TRUE'
-    assert params == (1, 2, 3)
+    assert sql == 'SELECT "t0"."id", "t0"."name", "t0"."email", "t0"."created_time", "t0"."address_id" FROM "User" "t0" WHERE "t0"."id" = ANY($1::INT4[]) IS TRUE'
+    assert params == ([1, 2, 3], )
 
 
 def test_is_true():
@@ -884,3 +889,56 @@ def test_query_without_from():
     sql, params = dialect.create_query_compiler().compile_select(q)
     assert sql == 'SELECT coalesce((SELECT "t0"."email" FROM "User" "t0" WHERE "t0"."id" = $1), (SELECT "t1"."email" FROM "User" "t1" WHERE "t1"."id" = $2))'
     assert params == (42, 56)
+
+
+def test_frozen_query():
+    base = Query(User).where(User.id > 10).freeze()
+    assert base.frozen is True
+    assert base.freeze() is base
+
+    q1 = base.where(User.name == "A").order(User.id).limit(10)
+    q2 = base.join(User.address).where(Address.title == "B")
+
+    assert q1 is not base
+    assert q1.frozen is True
+    assert len(base._where) == 1
+    assert base._order is None
+    assert base._joins is None
+    assert len(q1._where) == 2
+    assert q1._joins is None
+    assert len(q2._where) == 2
+    assert len(q2._joins) == 1
+
+    sql, params = dialect.create_query_compiler().compile_select(base)
+    assert sql == 'SELECT "t0"."id", "t0"."name", "t0"."email", "t0"."created_time", "t0"."address_id" FROM "User" "t0" WHERE "t0"."id" > $1'
+    assert params == (10, )
+
+    sql, params = dialect.create_query_compiler().compile_select(q1)
+    assert sql == 'SELECT "t0"."id", "t0"."name", "t0"."email", "t0"."created_time", "t0"."address_id" FROM "User" "t0" WHERE "t0"."id" > $1 AND "t0"."name" = $2 ORDER BY "t0"."id" ASC FETCH FIRST 10 ROWS ONLY'
+    assert params == (10, "A")
+
+    sql, params = dialect.create_query_compiler().compile_select(q2)
+    assert sql == 'SELECT "t0"."id", "t0"."name", "t0"."email", "t0"."created_time", "t0"."address_id" FROM "User" "t0" INNER JOIN "Address" "t1" ON "t0"."address_id" = "t1"."id" WHERE "t0"."id" > $1 AND "t1"."title" = $2'
+    assert params == (10, "B")
+
+    # finalized query is memoized on the frozen node
+    qc = dialect.create_query_compiler()
+    sql, _ = qc.compile_select(q1)
+    finalized = qc.query
+    qc = dialect.create_query_compiler()
+    sql2, params = qc.compile_select(q1)
+    assert qc.query is finalized
+    assert sql2 == sql
+    assert params == (10, "A")
+
+    # every connection has its own dialect instance
+    qc = PostgreDialect().create_query_compiler()
+    sql3, _ = qc.compile_select(q1)
+    assert qc.query is finalized
+    assert sql3 == sql
+
+    # clone returns a mutable query
+    mutable = q1.clone()
+    assert mutable.frozen is False
+    assert mutable.where(User.email == "x") is mutable
+    assert len(q1._where) == 2
@@ -416,3 +416,39 @@ async def test_clear_relation(conn, pgclean):
     await conn.save(user)
     user = await conn.select(Query(User).load(User, User.address).where(User.id == user.id)).first()
     assert user.address is None
+
+
+async def test_explain(conn, pgclean):
+    await conn.execute(await sync(conn, _registry))
+
+    q = Query(User).load(User, User.address, User.children, User.tags).where(User.id == 1)
+    result = await conn.explain(q)
+
+    assert result.plan.node_type
+    assert result.plan.relation is None
+    assert result.execution_time is None
+    assert result.sql.startswith("SELECT")
+    assert result.relation_nodes(User.children)
+    assert result.relation_nodes(User.tags)
+
+    result = await conn.explain(q, analyze=True, buffers=True)
+    assert result.execution_time is not None
+    assert result.plan.actual_loops == 1
+
+    auto_explain = conn.enable_auto_explain(0, size=2)
+    try:
+        await conn.select(q)
+        await conn.select(Query(User)).first()
+        await conn.select(Query(Address)).first()
+    finally:
+        conn.disable_auto_explain()
+
+    await conn.select(Query(Tag)).first()
+
+    assert conn._observers is None
+    assert len(auto_explain.entries) == 2
+    first, second = auto_explain.entries
+    assert first.error is None
+    assert first.event.entities == (User, )
+    assert first.result.plan.relation is None
+    assert second.event.entities == (Address, )
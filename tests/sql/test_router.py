@@ -0,0 +1,81 @@
+# flake8: noqa: E501
+
+import asyncio
+
+import pytest
+from yapic.entity import Entity, Registry, Serial, String, func
+from yapic.entity.sql import Query, QueryObserver, Router, sync
+
+pytestmark = pytest.mark.asyncio
+REGISTRY = Registry()
+
+
+class RoutedItem(Entity, schema="_router", registry=REGISTRY):
+    id: Serial
+    title: String
+
+
+class Observer(QueryObserver):
+    def __init__(self, name, events):
+        self.name = name
+        self.events = events
+
+    def on_query(self, event):
+        self.events.append((self.name, event.kind))
+
+
+async def test_routing(conn, pgsql_replica, pgclean):
+    await conn.execute(await sync(conn, REGISTRY))
+
+    events = []
+    conn.add_observer(Observer("primary", events))
+    pgsql_replica.add_observer(Observer("replica", events))
+    router = Router(conn, [pgsql_replica], sticky=0.2)
+
+    assert await router.select(Query(RoutedItem)) == []
+    assert events == [("replica", "select")]
+
+    # write, then read your writes
+    events.clear()
+    assert await router.save(RoutedItem(title="A")) is True
+    assert (await router.select(Query(RoutedItem)).first()).title == "A"
+    assert events == [("primary", "insert"), ("primary", "select")]
+    assert router.is_sticky() is True
+
+    events.clear()
+    await asyncio.sleep(0.25)
+    assert [x.title async for x in router.select(Query(RoutedItem))] == ["A"]
+    assert events == [("replica", "select")]
+
+    # locking select
+    events.clear()
+    await router.select(Query(RoutedItem).for_update())
+    assert events == [("primary", "select")]
+
+    # everything in transaction goes to the primary
+    await asyncio.sleep(0.25)
+    events.clear()
+    async with router.transaction() as tconn:
+        assert tconn is conn
+        item = await router.select(Query(RoutedItem)).one()
+        item.title = "B"
+        await router.save(item)
+    assert events == [("primary", "select"), ("primary", "update")]
+
+    # stickiness is bound to the task, what wrote
+    await asyncio.sleep(0.25)
+    events.clear()
+    await asyncio.create_task(router.save(RoutedItem(title="C")))
+    assert router.is_sticky() is False
+    await router.select(Query(RoutedItem))
+    assert events == [("primary", "insert"), ("replica", "select")]
+
+
+async def test_replica_isolation(conn, pgsql_replica):
+    q = Query().columns(func.current_setting("transaction_isolation"))
+    router = Router(conn, [pgsql_replica])
+
+    # hot standby does not support serializable transactions
+    assert await router.select(q).fetchval() == "repeatable read"
+    assert pgsql_replica.read_isolation == "repeatable_read"
+    assert await conn.select(q).fetchval() == "serializable"
@@ -1,7 +1,11 @@
 # flake8: noqa: E501
 
+import uuid
+from datetime import date
+from decimal import Decimal
+
 import pytest
-from yapic.entity import DateTimeTz, Entity, Registry, Serial
+from yapic.entity import UUID, Date, DateTimeTz, Entity, Numeric, PrimaryKey, Registry, Serial, String
 from yapic.entity.sql import PostgreTrigger, sync
 
 pytestmark = pytest.mark.asyncio
@@ -151,3 +155,67 @@ CREATE TRIGGER "update_time"
 
     result = await sync(conn, r)
     assert not result
+
+
+async def test_change_notify(conn, pgclean):
+    r = Registry()
+
+    class NotifyX(Entity, schema="_trigger", registry=r, notify=True):
+        id: Serial
+        name: String
+
+    class NotifyY(Entity, schema="_trigger", registry=r, notify=True):
+        id: Serial
+
+    result = await sync(conn, r)
+    assert """CREATE OR REPLACE FUNCTION "_trigger"."YT-NotifyX-notify-dd509e"() RETURNS TRIGGER AS $$""" in result
+    assert """CREATE TRIGGER "notify"
+  AFTER INSERT OR UPDATE OR DELETE ON "_trigger"."NotifyX"
+  FOR EACH ROW
+  EXECUTE FUNCTION "_trigger"."YT-NotifyX-notify-dd509e"();""" in result
+    await conn.execute(result)
+
+    result = await sync(conn, r)
+    assert not result
+
+    async with conn.listen_changes(NotifyX, coalesce=0.1) as feed:
+        await conn.execute("""INSERT INTO "_trigger"."NotifyX" ("name") VALUES ('A'), ('B')""")
+        await conn.execute("""INSERT INTO "_trigger"."NotifyY" DEFAULT VALUES""")
+        await conn.execute("""UPDATE "_trigger"."NotifyX" SET "name"='C' WHERE "id"=1""")
+        await conn.execute("""UPDATE "_trigger"."NotifyX" SET "id"=10 WHERE "id"=2""")
+
+        changes = []
+        async for change in feed:
+            changes.append(change)
+            if len(changes) == 3:
+                break
+
+    # the burst is coalesced by primary key, the last operation wins
+    assert changes == [
+        (NotifyX, "update", (1,)),
+        (NotifyX, "delete", (2,)),
+        (NotifyX, "update", (10,)),
+    ]
+
+    with pytest.raises(ValueError, match="Change notification is not enabled"):
+        conn.listen_changes(TriggerTable)
+
+
+async def test_change_notify_pk_types(conn, pgclean):
+    r = Registry()
+
+    class NotifyTyped(Entity, schema="_trigger", registry=r, notify=True):
+        uid: UUID = PrimaryKey()
+        day: Date = PrimaryKey()
+        amount: Numeric = PrimaryKey()
+
+    await conn.execute(await sync(conn, r))
+
+    entity = NotifyTyped(uid=uuid.uuid4(), day=date(2020, 2, 29), amount=Decimal("10.10"))
+    async with conn.listen_changes(NotifyTyped, coalesce=0) as feed:
+        await conn.insert(entity)
+        change = await feed.__anext__()
+
+    # same as the primary key of the entity, e.g. for cache invalidation
+    assert change == (NotifyTyped, "insert", entity.__pk__)
+    assert type(change[2][0]) is uuid.UUID